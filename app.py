@@ -1,362 +1,86 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from datetime import datetime, date
-from functools import wraps
-
-from models import db, User, Event, Resource, EventResourceAllocation
-app = Flask(__name__)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///events.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = "simple-secret-key"
-
-db.init_app(app)
-
-@app.route('/')
-def home():
-  
-        return redirect(url_for('events'))
-
-
-
-@app.route('/events')
-
-def events():
-    events = Event.query.all()
-    return render_template('events.html', events=events)
-
-
-@app.route('/profile')
-
-def profile():
-    username = session.get('user')
-    user = User.query.filter_by(username=username).first()
-
-    user_events = []
-   
-    user_events = []
-    user_allocations = []
-    try:
-        if user and hasattr(user, 'user_id'):
-            user_events = Event.query.filter_by(user_id=user.user_id).all()
-            user_allocations = EventResourceAllocation.query.join(Event).filter(Event.user_id == user.user_id).all()
-        else:
-          
-            user_events = []
-            user_allocations = []
-    except Exception:
-        user_events = []
-        user_allocations = []
-
-    return render_template('profile.html', user=user, events=user_events, allocations=user_allocations)
-
-
-@app.route('/events/add', methods=['GET', 'POST'])
-
-def add_event():
-    if request.method == 'POST':
-  
-        username = session.get('user')
-        user = User.query.filter_by(username=username).first()
-        
-        event = Event(
-            title=request.form['title'],
-            start_time=datetime.fromisoformat(request.form['start_time']),
-            end_time=datetime.fromisoformat(request.form['end_time']),
-            description=request.form['description'],
-            user_id=user.user_id if user else None 
-        )
-        db.session.add(event)
-        db.session.commit()
-        flash("Event created successfully!", "success")
-        return redirect(url_for('events'))
-
-    return render_template('add_event.html')
-
-
-
-@app.route('/events/edit/<int:event_id>', methods=['POST'])
-def edit_event(event_id):
-    event = Event.query.get_or_404(event_id)
-    
-    username = session.get('user')
-    user = User.query.filter_by(username=username).first()
-   
-    if hasattr(event, 'user_id') and event.user_id is not None:
-        if not user or event.user_id != user.user_id:
-            return {"message": "You can only edit your own events!"}, 403
-
-    try:
-        event.title = request.form['title']
-        event.description = request.form['description']
-        event.start_time = datetime.fromisoformat(request.form['start_time'])
-        event.end_time = datetime.fromisoformat(request.form['end_time'])
-        
-        db.session.commit()
-        return {"message": "Event updated successfully!"}, 200
-    except Exception as e:
-        db.session.rollback()
-        return {"message": f"Error updating event: {str(e)}"}, 500
-
-
-@app.route('/events/delete/<int:event_id>', methods=['POST'])
-
-def delete_event_web(event_id):
-    """Delete event via web form (session-based auth)"""
-    event = Event.query.get_or_404(event_id)
-    
-  
-    username = session.get('user')
-    user = User.query.filter_by(username=username).first()
-    
- 
-    event_owner = getattr(event, 'user_id', None)
-    if event_owner is None or (user and event_owner == getattr(user, 'user_id', None)):
-        try:
-            EventResourceAllocation.query.filter_by(event_id=event.event_id).delete()
-            db.session.delete(event)
-            db.session.commit()
-            flash("Event deleted successfully!", "success")
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Error deleting event: {str(e)}", "danger")
-    else:
-        flash("You can only delete your own events!", "danger")
-    
-    return redirect(url_for('events'))
-
-
-
-@app.route('/resources/')
-
-def resources():
-    resources = Resource.query.all()
-    return render_template('resources.html', resources=resources)
-
-
-@app.route('/resources/add', methods=['GET', 'POST'])
-
-def add_resource():
-    if request.method == 'POST':
-        resource = Resource(
-            resource_name=request.form['name'],
-            resource_type=request.form['type']
-        )
-        db.session.add(resource)
-        db.session.commit()
-        flash("Resource added successfully!", "success")
-        return redirect(url_for('resources'))
-
-    return render_template('add_resource.html')
-
-
-@app.route('/resources/edit/<int:resource_id>', methods=['POST'])
-
-def edit_resource(resource_id):
-    resource = Resource.query.get_or_404(resource_id)
-    resource.resource_name = request.form.get('name', resource.resource_name)
-    resource.resource_type = request.form.get('type', resource.resource_type)
-    db.session.commit()
-    flash("Resource updated successfully!", "success")
-    return redirect(url_for('resources'))
-
-
-@app.route('/resources/delete/<int:resource_id>', methods=['POST'])
-
-def delete_resource(resource_id):
-    resource = Resource.query.get_or_404(resource_id)
-    db.session.delete(resource)
-    db.session.commit()
-    flash("Resource deleted successfully!", "success")
-    return redirect(url_for('resources'))
-
-
-
-@app.route('/allocate', methods=['GET', 'POST'])
-
-def allocate_resource():
-    events = Event.query.all()
-    resources = Resource.query.all()
-    allocations = EventResourceAllocation.query.all()
-    error = None
-
-    if request.method == 'POST':
-        event_id = int(request.form['event_id'])
-        resource_id = int(request.form['resource_id'])
-        event = Event.query.get(event_id)
-
-        conflict = (
-            EventResourceAllocation.query
-            .join(Event)
-            .filter(
-                EventResourceAllocation.resource_id == resource_id,
-                Event.start_time < event.end_time,
-                Event.end_time > event.start_time
-            ).first()
-        )
-
-        if conflict:
-            error = "This resource is already booked for another event during this time."
-        else:
-            allocation = EventResourceAllocation(
-                event_id=event_id,
-                resource_id=resource_id
-            )
-            db.session.add(allocation)
-            db.session.commit()
-          
-            allocations = EventResourceAllocation.query.all()
-            error = None  
-            flash("Resource allocated successfully!", "success")
-
-    return render_template(
-        'allocate.html',
-        events=events,
-        resources=resources,
-        allocations=allocations,
-        error=error
-    )
-
-
-@app.route('/allocations')
-
-def view_allocations():
-   
-    return redirect(url_for('allocate_resource'))
-
-
-@app.route('/allocations/remove/<int:alloc_id>', methods=['POST'])
-
-def remove_allocation(alloc_id):
-    allocation = EventResourceAllocation.query.get_or_404(alloc_id)
-    event = Event.query.get(allocation.event_id)
-
-   
-    username = session.get('user')
-    user = None
-    if username:
-        user = User.query.filter_by(username=username).first()
-
-   
-    if event:
-      
-        if hasattr(event, 'user_id'):
-            event_owner_id = getattr(event, 'user_id')
-            current_user_id = getattr(user, 'user_id', None) if user else None
-
-           
-            if event_owner_id is not None and current_user_id != event_owner_id:
-                flash('You are not authorized to remove this allocation.')
-                return redirect(url_for('view_allocations'))
-
-    try:
-        db.session.delete(allocation)
-        db.session.commit()
-        flash('Allocation removed successfully!')
-    except Exception as e:
-        db.session.rollback()
-        flash('Error removing allocation: ' + str(e))
-
-    return redirect(url_for('view_allocations'))
-
-
-
-@app.route('/report', methods=['GET', 'POST'])
-
-def utilization_report():
-    report_data = []
-    start_date = end_date = None
-    totals = {'hours': 0.0, 'bookings': 0, 'upcoming': 0}
-
-    if request.method == 'POST':
-        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
-
-       
-        range_days = (end_date - start_date).days + 1
-        total_range_hours = max(range_days * 24, 1)
-
-        for resource in Resource.query.all():
-            total_hours = bookings = upcoming = 0
-
-            for alloc in resource.allocations:
-                event = alloc.event
-               
-                if not getattr(event, 'start_time', None) or not getattr(event, 'end_time', None):
-                    continue
-
-                event_date = event.start_time.date()
-
-                if start_date <= event_date <= end_date:
-                    total_hours += (event.end_time - event.start_time).total_seconds() / 3600
-                    bookings += 1
-
-                if event.start_time.date() > date.today():
-                    upcoming += 1
-
-            hours_rounded = round(total_hours, 2)
-            percent_util = round((hours_rounded / total_range_hours) * 100, 2)
-
-            report_data.append({
-                'name': resource.resource_name,
-                'type': resource.resource_type,
-                'hours': hours_rounded,
-                'bookings': bookings,
-                'upcoming': upcoming,
-                'percent': percent_util
-            })
-
-            totals['hours'] += hours_rounded
-            totals['bookings'] += bookings
-            totals['upcoming'] += upcoming
-
-    return render_template('report.html', report_data=report_data, totals=totals, start_date=start_date, end_date=end_date)
-
-
-@app.route('/report/export', methods=['POST'])
-def export_report_csv():
-   
-    try:
-        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
-    except Exception:
-        return redirect(url_for('utilization_report'))
-
-    import io, csv
-    si = io.StringIO()
-    writer = csv.writer(si)
-    writer.writerow(['Resource', 'Type', 'Total Hours Used', 'Percent of Range', 'Bookings', 'Upcoming'])
-
-    range_days = (end_date - start_date).days + 1
-    total_range_hours = max(range_days * 24, 1)
-
-    for resource in Resource.query.all():
-        total_hours = bookings = upcoming = 0
-        for alloc in resource.allocations:
-            event = alloc.event
-            if not getattr(event, 'start_time', None) or not getattr(event, 'end_time', None):
-                continue
-            event_date = event.start_time.date()
-            if start_date <= event_date <= end_date:
-                total_hours += (event.end_time - event.start_time).total_seconds() / 3600
-                bookings += 1
-            if event.start_time.date() > date.today():
-                upcoming += 1
-
-        hours_rounded = round(total_hours, 2)
-        percent_util = round((hours_rounded / total_range_hours) * 100, 2)
-        writer.writerow([resource.resource_name, resource.resource_type, hours_rounded, percent_util, bookings, upcoming])
-
-    output = si.getvalue()
-    from flask import make_response
-    resp = make_response(output)
-    resp.headers['Content-Disposition'] = f'attachment; filename=resource_report_{start_date}_{end_date}.csv'
-    resp.headers['Content-Type'] = 'text/csv'
-    return resp
-
+import os
+import weakref
+
+from flask import Flask
+
+from config import Config
+from models import db
+
+# Per-process state a forked worker must not inherit: thread pools (their
+# threads stay behind in the parent) and the parent's metrics.
+PER_PROCESS_EXTENSIONS = ('job_queue', 'password_checker', 'metrics')
+
+
+def create_app(config=Config):
+    """Build the app: config, database, instrumentation and every blueprint.
+
+    Route modules are imported here rather than at module level, so
+    importing app (scripts, `flask` CLI, a pre-fork server's master) only
+    pays for them when an app is actually built. Safe to call in a
+    pre-fork master: each forked worker drops the inherited connection
+    pools and per-process thread pools and builds its own.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    from utils.database import init_database
+    from utils.instrumentation import init_instrumentation
+    init_database(app, db)
+    init_instrumentation(app, db)
+
+    from routes.web import web_bp
+    from routes.events import events_bp
+    from routes.resources import resource_bp
+    from routes.auth import auth_bp
+    from routes.changes import changes_bp
+    app.register_blueprint(web_bp)
+    app.register_blueprint(events_bp, url_prefix='/api/events')
+    app.register_blueprint(resource_bp, url_prefix='/api/resources')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(changes_bp, url_prefix='/api/changes')
+
+    if hasattr(os, 'register_at_fork'):
+        app_ref = weakref.ref(app)
+        os.register_at_fork(after_in_child=lambda: _reset_after_fork(app_ref))
+    return app
+
+
+def _reset_after_fork(app_ref):
+    app = app_ref()
+    if app is not None:
+        for name in PER_PROCESS_EXTENSIONS:
+            app.extensions.pop(name, None)
+
+
+def preload(app):
+    """Work worth doing once before serving: the booking snapshot.
+
+    Called by the production entry point in the server's master, so with
+    preloading the workers share its pages instead of each loading one.
+    """
+    if app.config['CONFLICT_INDEX_ENABLED'] and app.config['CONFLICT_INDEX_PRELOAD']:
+        from utils.conflict_checker import get_conflict_index
+        with app.app_context():
+            get_conflict_index().load()
+            db.session.remove()
+            # Fork with no open connections; each worker opens its own.
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def __getattr__(name):
+    # `from app import app` in scripts builds the app on first use.
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 if __name__ == '__main__':
+    from utils.migrations import upgrade
+    app = create_app()
     with app.app_context():
         db.create_all()
+        upgrade()
+    preload(app)
     app.run(debug=True)
-
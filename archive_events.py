@@ -0,0 +1,19 @@
+import argparse
+from datetime import datetime, timedelta
+
+from app import app
+from utils.archive import archive_events
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move past events and their allocations to the archive tables.')
+    parser.add_argument('--days', type=int, help='archive events that ended more than this many days ago '
+                                                 '(default ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--batch-size', type=int, help='events moved per transaction (default ARCHIVE_BATCH_SIZE)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        days = args.days if args.days is not None else app.config['ARCHIVE_AFTER_DAYS']
+        batch_size = args.batch_size or app.config['ARCHIVE_BATCH_SIZE']
+        before = datetime.now() - timedelta(days=days)
+        events, allocations = archive_events(before, batch_size)
+        print(f'Archived {events} events and {allocations} allocations that ended before {before:%Y-%m-%d %H:%M}.')
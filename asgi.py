@@ -0,0 +1,11 @@
+"""Entry point for the async JSON API.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8001
+
+Serves the /api/events and /api/resources JSON routes from one event loop
+(routes/async_api.py); the Flask app behind wsgi.py keeps serving the
+HTML pages and everything else.
+"""
+from routes.async_api import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,127 @@
+"""Hammer resource allocation from many processes and count double bookings.
+
+    python benchmarks/allocation_stress.py --workers 8 --attempts 300
+    python benchmarks/allocation_stress.py --unsafe   # old check-then-insert path
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from models import db, Event, Resource, EventResourceAllocation
+from utils.allocations import book_resource
+from utils.conflict_checker import find_conflict_sql
+
+DOUBLE_BOOKINGS_SQL = '''
+SELECT COUNT(*) FROM event_resource_allocation a
+JOIN event ea ON ea.event_id = a.event_id
+JOIN event_resource_allocation b ON b.resource_id = a.resource_id AND b.allocation_id > a.allocation_id
+JOIN event eb ON eb.event_id = b.event_id
+WHERE ea.start_time < eb.end_time AND eb.start_time < ea.end_time
+'''
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Each process has its own in-memory index, so rely on SQL checks only.
+    app.config['CONFLICT_INDEX_ENABLED'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(db_path, resources, events):
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(Resource(resource_name=f'Room {i}', resource_type='room') for i in range(resources))
+        base = datetime(2030, 1, 1, 8)
+        rng = random.Random(42)
+        for i in range(events):
+            start = base + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 7))
+            db.session.add(Event(title=f'Event {i}', start_time=start, end_time=start + timedelta(minutes=rng.choice([30, 60, 90, 120]))))
+        db.session.commit()
+
+
+def unsafe_book(event, resource_id):
+    conflict = find_conflict_sql(resource_id, event.start_time, event.end_time)
+    if conflict:
+        return None, conflict
+    allocation = EventResourceAllocation(event_id=event.event_id, resource_id=resource_id)
+    db.session.add(allocation)
+    db.session.commit()
+    return allocation, None
+
+
+def worker(db_path, seed_value, attempts, resources, events, unsafe, results):
+    app = make_app(db_path)
+    rng = random.Random(seed_value)
+    counts = {'allocated': 0, 'conflicts': 0, 'errors': 0}
+    book = unsafe_book if unsafe else book_resource
+    with app.app_context():
+        for _ in range(attempts):
+            event = db.session.get(Event, rng.randrange(1, events + 1))
+            try:
+                allocation, _ = book(event, rng.randrange(1, resources + 1))
+                counts['allocated' if allocation else 'conflicts'] += 1
+            except Exception:
+                db.session.rollback()
+                counts['errors'] += 1
+            db.session.remove()
+    results.put(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=300, help='allocation attempts per worker')
+    parser.add_argument('--resources', type=int, default=5)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--unsafe', action='store_true', help='use an unlocked check-then-insert for comparison')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stress.db')
+        seed(db_path, args.resources, args.events)
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_path, i, args.attempts, args.resources, args.events, args.unsafe, results))
+            for i in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = {'allocated': 0, 'conflicts': 0, 'errors': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        app = make_app(db_path)
+        with app.app_context():
+            double_bookings = db.session.execute(text(DOUBLE_BOOKINGS_SQL)).scalar()
+
+    attempts = args.workers * args.attempts
+    print(f"mode:            {'unsafe check-then-insert' if args.unsafe else 'locked'}")
+    print(f'attempts:        {attempts} from {args.workers} processes in {elapsed:.2f}s ({attempts / elapsed:.0f}/s)')
+    print(f"allocated:       {totals['allocated']}")
+    print(f"conflicts:       {totals['conflicts']}")
+    print(f"errors:          {totals['errors']}")
+    print(f'double bookings: {double_bookings}')
+    return 1 if double_bookings else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
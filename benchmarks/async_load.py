@@ -0,0 +1,173 @@
+"""Sync (gunicorn threads) vs async (uvicorn, asgi.py) under many slow clients.
+
+    python benchmarks/async_load.py --clients 200 --client-delay 0.5
+
+Seeds a temporary database (same generator as suite.py), then starts each
+server in turn on --path and runs two phases against it:
+
+* slow clients: --clients connections open at once, each sends its request
+  line, stalls --client-delay seconds (a slow mobile upload), then finishes
+  the request. A thread-per-request server holds a thread per stalled
+  client; the event loop holds a coroutine.
+* fast clients: --concurrency clients sending complete requests back to
+  back for --duration seconds, the per-request cost of each stack.
+
+The sync server is one gunicorn worker with --threads threads and the
+async one is one uvicorn process, so both get a single core. Needs
+gunicorn and requirements-async.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from workers import ROOT, free_port, seed_database, wait_until_serving
+
+
+def server_command(kind, port, args):
+    if kind == 'sync':
+        return [shutil.which('gunicorn'), '-c', 'gunicorn.conf.py', 'wsgi:app'], {
+            'WEB_CONCURRENCY': '1', 'WEB_THREADS': str(args.threads), 'BIND': f'127.0.0.1:{port}'}
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning', '--backlog', str(max(2048, args.clients))], {}
+
+
+async def request(port, path, delay, timeout):
+    """Status and seconds of one GET, stalling delay seconds mid-request."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\n'.encode())
+        await writer.drain()
+        if delay:
+            await asyncio.sleep(delay)
+        writer.write(b'Host: 127.0.0.1\r\nConnection: close\r\n\r\n')
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        status = int(response.split(b' ', 2)[1]) if response else 0
+        return status, time.perf_counter() - started
+    finally:
+        writer.close()
+
+
+def summarize(results, elapsed):
+    latencies = sorted(seconds for status, seconds in results if status == 200)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else None
+
+    return {
+        'requests': len(latencies),
+        'errors': len(results) - len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+    }
+
+
+async def slow_clients(port, args):
+    async def one():
+        try:
+            return await request(port, args.path, args.client_delay, args.timeout)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            return 0, 0.0
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(args.clients)])
+    return summarize(results, time.perf_counter() - started)
+
+
+async def fast_clients(port, args):
+    stop = time.perf_counter() + args.duration
+    results = []
+
+    async def client():
+        while time.perf_counter() < stop:
+            try:
+                results.append(await request(port, args.path, 0, args.timeout))
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                results.append((0, 0.0))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(args.concurrency)])
+    return summarize(results, time.perf_counter() - started)
+
+
+def serve_and_load(kind, env, args):
+    port = free_port()
+    command, extra_env = server_command(kind, port, args)
+    process = subprocess.Popen(command, cwd=ROOT, env=dict(env, **extra_env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(process, port, args.path)
+        return {
+            'slow': asyncio.run(slow_clients(port, args)),
+            'fast': asyncio.run(fast_clients(port, args)),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['sync', 'async'], action='append', help='servers to compare (repeatable)')
+    parser.add_argument('--clients', type=int, default=200, help='slow clients connected at once')
+    parser.add_argument('--client-delay', type=float, default=0.5, help='seconds each slow client stalls')
+    parser.add_argument('--concurrency', type=int, default=16, help='fast clients')
+    parser.add_argument('--duration', type=float, default=5, help='seconds of fast-client load')
+    parser.add_argument('--threads', type=int, default=8, help='threads of the sync worker')
+    parser.add_argument('--timeout', type=float, default=120, help='per-request client timeout')
+    parser.add_argument('--path', default='/api/events/?per_page=20', help='request to load')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--resources', type=int, default=50)
+    parser.add_argument('--allocations', type=int, default=8000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    servers = args.server or ['sync', 'async']
+
+    if 'sync' in servers and shutil.which('gunicorn') is None:
+        parser.error('gunicorn is not installed (pip install gunicorn)')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'async_load.db')
+        seed_database(path, args)
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + path, CACHE_BACKEND='none',
+                   PYTHONPATH=ROOT, INSTRUMENTATION_ENABLED='false')
+
+        results = {'path': args.path, 'clients': args.clients, 'client_delay': args.client_delay,
+                   'concurrency': args.concurrency, 'threads': args.threads, 'servers': {}}
+        for kind in servers:
+            result = serve_and_load(kind, env, args)
+            results['servers'][kind] = result
+            for phase in ('slow', 'fast'):
+                r = result[phase]
+                print(f"{kind:5} {phase}: {r['requests']:6} ok, {r['errors']} errors in {r['seconds']:6.1f} s, "
+                      f"{r['requests_per_second']:8.1f} req/s, p50 {r['p50_ms'] or 0:.1f} ms, "
+                      f"p95 {r['p95_ms'] or 0:.1f} ms")
+
+        if len(servers) == 2:
+            base, other = (results['servers'][kind] for kind in servers)
+            for phase in ('slow', 'fast'):
+                print(f"{servers[1]} vs {servers[0]}, {phase} clients: "
+                      f"{other[phase]['requests_per_second'] / base[phase]['requests_per_second']:.2f}x throughput")
+            print('median slow-client latency: ' + ', '.join(
+                f"{kind} {results['servers'][kind]['slow']['p50_ms'] or 0:.0f} ms" for kind in servers))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Mixed read/write throughput on SQLite, default settings vs the tuned profile.
+
+    python benchmarks/mixed_load.py --workers 8 --seconds 10 --write-ratio 0.2
+    python benchmarks/mixed_load.py --profile tuned
+
+Each worker process loops for --seconds doing either a write (insert an
+event and commit, as add_event does) or a read (a week of events plus a
+count, as the list pages do). Reads run as a GET handler would, so the
+tuned profile sends them through the read-only pool.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, g
+from sqlalchemy.exc import OperationalError
+from models import db, Event
+from utils.database import init_database, sqlite_settings
+
+PROFILES = ('default', 'tuned')
+BASE = datetime(2030, 1, 1, 8)
+
+
+def make_app(db_path, profile):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if profile == 'tuned':
+        init_database(app, db)
+    else:
+        db.init_app(app)
+    return app
+
+
+def seed(db_path, events):
+    app = make_app(db_path, 'default')
+    with app.app_context():
+        db.create_all()
+        rng = random.Random(7)
+        for i in range(events):
+            start = BASE + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 365))
+            db.session.add(Event(title=f'Event {i}', start_time=start, end_time=start + timedelta(hours=1)))
+        db.session.commit()
+
+
+def read_op(rng):
+    g.read_only_db = True
+    window_start = BASE + timedelta(days=rng.randrange(0, 358))
+    window_end = window_start + timedelta(days=7)
+    query = Event.query.filter(Event.start_time < window_end, Event.end_time > window_start)
+    query.order_by(Event.start_time).limit(50).all()
+    query.count()
+
+
+def write_op(rng):
+    g.read_only_db = False
+    start = BASE + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 365))
+    db.session.add(Event(title='load', start_time=start, end_time=start + timedelta(hours=1)))
+    db.session.commit()
+
+
+def worker(db_path, profile, seed_value, seconds, write_ratio, results):
+    app = make_app(db_path, profile)
+    rng = random.Random(seed_value)
+    latencies = {'read': [], 'write': []}
+    errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            kind = 'write' if rng.random() < write_ratio else 'read'
+            started = time.perf_counter()
+            try:
+                with app.test_request_context(method='GET' if kind == 'read' else 'POST'):
+                    (write_op if kind == 'write' else read_op)(rng)
+                    db.session.remove()
+            except OperationalError:
+                errors += 1
+                db.session.rollback()
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+    results.put((latencies, errors))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'mixed.db')
+        seed(db_path, args.events)
+
+        app = make_app(db_path, profile)
+        with app.app_context():
+            settings = sqlite_settings(db.engine)
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_path, profile, i, args.seconds, args.write_ratio, results))
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        latencies = {'read': [], 'write': []}
+        errors = 0
+        for _ in processes:
+            worker_latencies, worker_errors = results.get()
+            errors += worker_errors
+            for kind, values in worker_latencies.items():
+                latencies[kind].extend(values)
+        for process in processes:
+            process.join()
+
+    print(f'profile: {profile}  (journal_mode={settings["journal_mode"]}, synchronous={settings["synchronous"]}, '
+          f'busy_timeout={settings["busy_timeout"]})')
+    for kind in ('read', 'write'):
+        values = latencies[kind]
+        print(f'  {kind:5}  {len(values) / args.seconds:8.0f} ops/s   '
+              f'p50 {percentile(values, 0.5) * 1000:7.2f} ms   p95 {percentile(values, 0.95) * 1000:7.2f} ms   '
+              f'p99 {percentile(values, 0.99) * 1000:7.2f} ms')
+    print(f'  lock errors: {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--events', type=int, default=20000, help='events seeded before the run')
+    parser.add_argument('--profile', choices=PROFILES, help='run one profile instead of both')
+    args = parser.parse_args()
+
+    for profile in [args.profile] if args.profile else PROFILES:
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Memory and lookup cost of the in-process booking snapshot.
+
+    python benchmarks/snapshot_memory.py --bookings 100000 --resources 50
+
+Seeds --bookings allocations over --resources, then measures with
+tracemalloc what it takes to hold them three ways: the snapshot's int64
+arrays, lists of (start, end, event_id) datetime tuples (what the index
+used to keep), and ORM Event objects. Memory is reported per 100k
+bookings. It then times conflict checks, free-slot windows and
+booked-time sums on the snapshot against the SQL path.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from models import db, Event, Resource, EventResourceAllocation
+from utils.conflict_checker import ResourceIntervalIndex, bookings_in_window, find_conflict_sql
+
+BASE = datetime(2030, 1, 1, 8)
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(bookings, resources):
+    db.create_all()
+    rng = random.Random(7)
+    db.session.execute(insert(Resource), [
+        {'resource_name': f'Resource {i}', 'resource_type': 'room'} for i in range(resources)
+    ])
+    # Back to back per resource, so the data has no conflicts.
+    cursor = [BASE] * resources
+    events, allocations = [], []
+    for i in range(bookings):
+        resource = i % resources
+        start = cursor[resource] + timedelta(minutes=15 * rng.randrange(0, 8))
+        end = start + timedelta(minutes=rng.choice((30, 60, 90, 120)))
+        cursor[resource] = end
+        events.append({'title': f'Event {i}', 'start_time': start, 'end_time': end})
+        allocations.append({'event_id': i + 1, 'resource_id': resource + 1})
+    db.session.execute(insert(Event), events)
+    db.session.execute(insert(EventResourceAllocation), allocations)
+    db.session.commit()
+    return max(cursor)
+
+
+def traced(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def tuple_lists():
+    rows = (
+        db.session.query(EventResourceAllocation.resource_id, Event.start_time, Event.end_time, Event.event_id)
+        .join(Event, Event.event_id == EventResourceAllocation.event_id)
+        .order_by(EventResourceAllocation.resource_id, Event.start_time)
+    )
+    lists = {}
+    for resource_id, start_time, end_time, event_id in rows:
+        lists.setdefault(resource_id, []).append((start_time, end_time, event_id))
+    return lists
+
+
+def orm_events():
+    return Event.query.join(EventResourceAllocation, EventResourceAllocation.event_id == Event.event_id).all()
+
+
+def timed(label, func, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - started
+    print(f'  {label:34} {elapsed / calls * 1e6:9.1f} us/call')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--resources', type=int, default=50)
+    parser.add_argument('--calls', type=int, default=2000, help='lookups timed per operation')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'snapshot.db'))
+        with app.app_context():
+            last_end = seed(args.bookings, args.resources)
+            per_100k = 100000 / args.bookings
+
+            index = ResourceIntervalIndex()
+            _, index_bytes = traced(index.load)
+            _, tuple_bytes = traced(tuple_lists)
+            db.session.expunge_all()
+            _, orm_bytes = traced(orm_events)
+            db.session.expunge_all()
+
+            print(f'{args.bookings} bookings over {args.resources} resources')
+            print(f'  snapshot (int64 arrays)      {index_bytes * per_100k / 2**20:8.2f} MiB per 100k bookings')
+            print(f'  datetime tuple lists         {tuple_bytes * per_100k / 2**20:8.2f} MiB per 100k bookings')
+            print(f'  ORM Event objects            {orm_bytes * per_100k / 2**20:8.2f} MiB per 100k bookings')
+            print(f'  index.stats(): {index.stats()}')
+
+            rng = random.Random(11)
+            span = int((last_end - BASE).total_seconds() // 60)
+            probes = [
+                (rng.randint(1, args.resources), BASE + timedelta(minutes=rng.randrange(span)))
+                for _ in range(args.calls)
+            ]
+            month = timedelta(days=30)
+
+            timed('conflict check, snapshot', lambda i: index.find_conflict(
+                probes[i][0], probes[i][1], probes[i][1] + timedelta(hours=1)), args.calls)
+            timed('conflict check, SQL', lambda i: find_conflict_sql(
+                probes[i][0], probes[i][1], probes[i][1] + timedelta(hours=1)), args.calls)
+            timed('30-day window, snapshot', lambda i: index.window(
+                [probes[i][0]], probes[i][1], probes[i][1] + month), args.calls)
+            timed('30-day window, SQL', lambda i: bookings_in_window(
+                [probes[i][0]], probes[i][1], probes[i][1] + month), args.calls)
+            timed('30-day booked seconds, snapshot', lambda i: index.booked_seconds(
+                [probes[i][0]], probes[i][1], probes[i][1] + month), args.calls)
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""Seed a synthetic dataset and time the scheduler's hot paths.
+
+    python benchmarks/suite.py --events 20000 --resources 50 --allocations 15000
+    python benchmarks/suite.py --json results.json
+    python benchmarks/suite.py --compare results.json --threshold 0.2
+
+Everything runs against a temporary database through the real app (test
+client) or the real helper, so numbers include routing, templates and
+serialization. For every scenario the report holds latency percentiles
+and SQL statements per call. --json writes it as JSON; --compare checks
+it against an earlier file and exits 1 when p95 latency or queries per
+call grew by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESOURCE_TYPES = ('room', 'projector', 'vehicle', 'staff', 'equipment')
+# Minutes and relative weights: most meetings are an hour or less.
+DURATIONS = ((30, 30), (60, 35), (90, 12), (120, 12), (240, 8), (480, 3))
+SCENARIOS = (
+    'events_page',
+    'allocate_post',
+    'report',
+    'report_export',
+    'api_events',
+    'has_resource_conflict',
+    'has_resource_conflict_sql',
+)
+
+
+def random_start(rng, now, days):
+    """Weekday business-hours starts, two thirds in the past."""
+    while True:
+        day = now.date() + timedelta(days=rng.randrange(-2 * days // 3, days // 3))
+        if day.weekday() < 5 or rng.random() < 0.1:
+            break
+    hour = min(max(int(rng.gauss(12.5, 2.5)), 7), 19)
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=15 * rng.randrange(4))
+
+
+def seed(db, args, rng):
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from models import User, Event, Resource, EventResourceAllocation
+    from utils.rollup import rebuild_rollup
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    password_hash = generate_password_hash('benchmark')
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'password_hash': password_hash} for i in range(args.users)
+    ])
+    db.session.execute(insert(Resource), [
+        {'resource_name': f'Resource {i}', 'resource_type': RESOURCE_TYPES[i % len(RESOURCE_TYPES)]}
+        for i in range(args.resources)
+    ])
+    minutes, weights = zip(*DURATIONS)
+    events = []
+    for i in range(args.events):
+        start = random_start(rng, now, args.days)
+        end = start + timedelta(minutes=rng.choices(minutes, weights)[0])
+        events.append({
+            'title': f'Event {i}',
+            'description': 'Synthetic benchmark event',
+            'start_time': start,
+            'end_time': end,
+            'user_id': rng.randint(1, args.users) if args.users else None,
+        })
+    events.sort(key=lambda e: e['start_time'])
+    db.session.execute(insert(Event), events)
+
+    # Walk events in start order and give each a resource that is free by
+    # then, so the dataset has no double bookings.
+    last_end = {}
+    allocations = []
+    for event_id, event in enumerate(events, start=1):
+        if len(allocations) >= args.allocations:
+            break
+        resource_id = rng.randint(1, args.resources)
+        if last_end.get(resource_id, datetime.min) <= event['start_time']:
+            last_end[resource_id] = event['end_time']
+            allocations.append({'event_id': event_id, 'resource_id': resource_id})
+    if allocations:
+        db.session.execute(insert(EventResourceAllocation), allocations)
+    db.session.commit()
+
+    with db.engine.begin() as conn:
+        rebuild_rollup(conn)
+    return now, len(allocations)
+
+
+class QueryCounter:
+    def __init__(self, engines):
+        from sqlalchemy import event
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def summarize(latencies, queries, statuses):
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+
+    return {
+        'calls': len(latencies),
+        'status': {str(k): v for k, v in sorted(statuses.items())},
+        'latency_ms': {
+            'min': round(ordered[0] * 1000, 3),
+            'mean': round(statistics.fmean(ordered) * 1000, 3),
+            'p50': pct(0.50),
+            'p90': pct(0.90),
+            'p95': pct(0.95),
+            'p99': pct(0.99),
+            'max': round(ordered[-1] * 1000, 3),
+        },
+        'queries_per_call': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+def build_scenarios(app, now, args, rng):
+    from utils.conflict_checker import has_resource_conflict
+
+    client = app.test_client()
+    report_form = {
+        'start_date': (now - timedelta(days=30)).strftime('%Y-%m-%d'),
+        'end_date': now.strftime('%Y-%m-%d'),
+    }
+
+    def allocate_post():
+        return client.post('/allocate', data={
+            'event_id': rng.randint(1, args.events),
+            'resource_id': rng.randint(1, args.resources),
+        }).status_code
+
+    def report_export():
+        response = client.post('/report/export', data=report_form)
+        response.get_data()
+        return response.status_code
+
+    def conflict_check():
+        start = random_start(rng, now, args.days)
+        has_resource_conflict(rng.randint(1, args.resources), start, start + timedelta(hours=1))
+        return 'ok'
+
+    def conflict_check_sql():
+        app.config['CONFLICT_INDEX_ENABLED'] = False
+        try:
+            return conflict_check()
+        finally:
+            app.config['CONFLICT_INDEX_ENABLED'] = True
+
+    pages = max(1, min(args.events // 10, 100))
+    scenarios = {
+        'events_page': lambda: client.get('/events').status_code,
+        'allocate_post': allocate_post,
+        'report': lambda: client.post('/report', data=report_form).status_code,
+        'report_export': report_export,
+        'has_resource_conflict': conflict_check,
+        'has_resource_conflict_sql': conflict_check_sql,
+        'api_events': lambda: client.get(f'/api/events/?page={rng.randint(1, pages)}').status_code,
+    }
+    return scenarios
+
+
+def run_scenario(app, counter, func, iterations, warmup):
+    latencies, queries, statuses = [], [], {}
+    for i in range(warmup + iterations):
+        with app.app_context():
+            before = counter.count
+            started = time.perf_counter()
+            status = func()
+            elapsed = time.perf_counter() - started
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(counter.count - before)
+            statuses[status] = statuses.get(status, 0) + 1
+    return summarize(latencies, queries, statuses)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Print per-scenario changes; return the names that regressed."""
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not isinstance(current, dict) or not isinstance(previous, dict):
+            continue
+        p95_now, p95_then = current['latency_ms']['p95'], previous['latency_ms']['p95']
+        q_now, q_then = current['queries_per_call']['mean'], previous['queries_per_call']['mean']
+        latency_change = (p95_now - p95_then) / p95_then if p95_then else 0.0
+        query_change = (q_now - q_then) / q_then if q_then else float(q_now > 0)
+        flag = ''
+        if latency_change > threshold or query_change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'  {name:26} p95 {p95_then:9.2f} -> {p95_now:9.2f} ms ({latency_change:+.0%})   '
+              f'queries {q_then:6.1f} -> {q_now:6.1f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--resources', type=int, default=50)
+    parser.add_argument('--allocations', type=int, default=8000)
+    parser.add_argument('--days', type=int, default=180, help='span of event start times')
+    parser.add_argument('--iterations', type=int, default=50, help='timed calls per scenario')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='run only these (repeatable)')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='baseline report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative growth before flagging')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # config.Config reads these when app is first imported.
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp.name, 'benchmark.db')
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+
+    from app import app
+    from models import db
+    from utils.migrations import upgrade
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        started = time.perf_counter()
+        now, allocations = seed(db, args, rng)
+        seed_seconds = time.perf_counter() - started
+        counter = QueryCounter(db.engines.values())
+
+    scenarios = build_scenarios(app, now, args, rng)
+    selected = args.scenario or SCENARIOS
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': {
+                'users': args.users, 'events': args.events, 'resources': args.resources,
+                'allocations': allocations, 'days': args.days, 'seed': args.seed,
+            },
+            'iterations': args.iterations,
+            'cache': args.cache,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'scenarios': {},
+    }
+
+    for name in selected:
+        result = run_scenario(app, counter, scenarios[name], args.iterations, args.warmup)
+        report['scenarios'][name] = result
+        latency = result['latency_ms']
+        print(f"{name:26} p50 {latency['p50']:9.2f} ms  p95 {latency['p95']:9.2f} ms  p99 {latency['p99']:9.2f} ms  "
+              f"queries/call {result['queries_per_call']['mean']:6.1f}  status {result['status']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    tmp.cleanup()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {baseline.get('meta', {}).get('commit')}:")
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
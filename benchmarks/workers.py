@@ -0,0 +1,224 @@
+"""Cold start and throughput of the production server, one worker vs many.
+
+    python benchmarks/workers.py --workers 1 --workers 4 --duration 10
+
+Seeds a temporary database (same generator as suite.py), then:
+
+* cold start: in fresh interpreters, the time to import app, to build an
+  app with create_app(), and to serve the first request (median of --runs);
+* throughput: for each --workers count, starts gunicorn with
+  gunicorn.conf.py and wsgi:app, records how long it takes until the first
+  response, then keeps --concurrency client threads on --path for
+  --duration seconds and reports requests per second and latency.
+
+The client runs on the same machine and competes for the same cores, so
+compare worker counts with each other rather than with other hosts.
+Needs gunicorn (POSIX only): pip install gunicorn.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLD_START = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get('/api/events/?per_page=1')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created}))
+"""
+
+
+def seed_database(path, args):
+    from suite import seed
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    from app import create_app
+    from models import db
+    from utils.migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        seed(db, args, random.Random(args.seed))
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def cold_start(env, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(port, path, timeout=10):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def wait_until_serving(process, port, path, deadline=60):
+    started = time.perf_counter()
+    while time.perf_counter() - started < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            if get(port, path, timeout=1) == 200:
+                return time.perf_counter() - started
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError('gunicorn did not start serving in time')
+
+
+def load(port, path, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine, failed = [], 0
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            mine.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else None
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': len(latencies) / duration,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+    }
+
+
+def serve_and_load(workers, env, args):
+    port = free_port()
+    env = dict(env, WEB_CONCURRENCY=str(workers), WEB_THREADS=str(args.threads), BIND=f'127.0.0.1:{port}')
+    process = subprocess.Popen(
+        [shutil.which('gunicorn'), '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = wait_until_serving(process, port, args.path)
+        load(port, args.path, args.concurrency, min(1.0, args.duration))  # warm every worker
+        result = load(port, args.path, args.concurrency, args.duration)
+        result['ready_ms'] = ready * 1000
+        return result
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, action='append', help='worker counts to compare (repeatable)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per worker count')
+    parser.add_argument('--path', default='/api/events/?per_page=20', help='request to load')
+    parser.add_argument('--runs', type=int, default=5, help='cold starts to take the median of')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--resources', type=int, default=50)
+    parser.add_argument('--allocations', type=int, default=8000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    worker_counts = args.workers or sorted({1, os.cpu_count() or 1})
+
+    if shutil.which('gunicorn') is None:
+        parser.error('gunicorn is not installed (pip install gunicorn)')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'workers.db')
+        seed_database(path, args)
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + path, CACHE_BACKEND='none',
+                   PYTHONPATH=ROOT, INSTRUMENTATION_ENABLED='false')
+
+        results = {'cpus': os.cpu_count(), 'path': args.path, 'concurrency': args.concurrency}
+        results['cold_start_ms'] = cold_start(env, args.runs)
+        print('cold start (median of {}): '.format(args.runs) + ', '.join(
+            f'{key} {value:.0f} ms' for key, value in results['cold_start_ms'].items()))
+
+        results['workers'] = {}
+        for workers in worker_counts:
+            result = serve_and_load(workers, env, args)
+            results['workers'][workers] = result
+            print(f"{workers:3} worker(s): ready in {result['ready_ms']:6.0f} ms, "
+                  f"{result['requests_per_second']:8.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+                  f"p95 {result['p95_ms']:.1f} ms, errors {result['errors']}")
+
+        base = results['workers'][worker_counts[0]]['requests_per_second']
+        for workers in worker_counts[1:]:
+            rate = results['workers'][workers]['requests_per_second']
+            print(f'{workers} vs {worker_counts[0]} worker(s): {rate / base:.2f}x throughput')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
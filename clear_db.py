@@ -1,11 +1,22 @@
+from sqlalchemy import MetaData, text
+
 from app import app, db
+from utils.migrations import upgrade
 
 if __name__ == '__main__':
     with app.app_context():
         confirm = input('This will DROP ALL TABLES and recreate them (data will be lost). Proceed? (yes/no): ')
         if confirm.lower() == 'yes':
             db.drop_all()
+            # Tables that only the migrations create, schema_migrations included,
+            # must go too or upgrade() would think they are still in place.
+            with db.engine.begin() as conn:
+                conn.execute(text('DROP TABLE IF EXISTS event_search'))
+                leftovers = MetaData()
+                leftovers.reflect(conn)
+                leftovers.drop_all(conn)
             db.create_all()
+            upgrade()
             print('Database cleared and schema recreated.')
         else:
             print('Aborted.')
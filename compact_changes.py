@@ -0,0 +1,9 @@
+from app import app, db
+from utils.changes import compact_changes
+
+if __name__ == '__main__':
+    with app.app_context():
+        days = app.config['CHANGE_LOG_TOMBSTONE_DAYS']
+        with db.engine.begin() as conn:
+            removed = compact_changes(conn, days)
+        print(f'Compacted change log: {removed} entries removed, tombstones kept for {days} days.')
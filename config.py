@@ -5,10 +5,81 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
-        'sqlite:///' + os.path.join(basedir, 'events.db')
+    # Relative SQLite paths resolve inside the instance folder.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///events.db'
+    # Optional read replica for GET requests; file-based SQLite defaults to a
+    # query_only pool on the primary file.
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')
+    DB_READ_ROUTING = os.environ.get('DB_READ_ROUTING', 'true').lower() == 'true'
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    # Connections of the async API (asgi.py); requests beyond them wait up to the timeout.
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+    ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 0))
+    ASYNC_DB_POOL_TIMEOUT = int(os.environ.get('ASYNC_DB_POOL_TIMEOUT', 30))
+    # Applied to every new SQLite connection by utils.database.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+    }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Verified bearer tokens kept in memory; entries also expire with the token.
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+    # How often the cache checks the database for deleted users.
+    TOKEN_REVALIDATE_SECONDS = float(os.environ.get('TOKEN_REVALIDATE_SECONDS', 1))
+    # Password hashing runs on its own pool; logins beyond LOGIN_MAX_PENDING get a 503.
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 2))
+    LOGIN_MAX_PENDING = int(os.environ.get('LOGIN_MAX_PENDING', 16))
+    LOGIN_HASH_TIMEOUT = float(os.environ.get('LOGIN_HASH_TIMEOUT', 10))
+    # Failed logins allowed per username and per client within the window (seconds).
+    LOGIN_MAX_FAILURES = int(os.environ.get('LOGIN_MAX_FAILURES', 5))
+    LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 300))
+    CONFLICT_INDEX_ENABLED = os.environ.get('CONFLICT_INDEX_ENABLED', 'true').lower() == 'true'
+    # Load every resource's bookings into the index at startup instead of on first use.
+    CONFLICT_INDEX_PRELOAD = os.environ.get('CONFLICT_INDEX_PRELOAD', 'true').lower() == 'true'
+    # With several worker processes, how often (seconds) the index checks for
+    # other workers' writes; 0 trusts it to see every write (one process).
+    CONFLICT_INDEX_SYNC_SECONDS = float(os.environ.get('CONFLICT_INDEX_SYNC_SECONDS', 0))
+    # Change feed streams (/api/changes/stream): how often each polls the log,
+    # the keepalive interval and how long before the client must reconnect.
+    CHANGE_STREAM_POLL_SECONDS = float(os.environ.get('CHANGE_STREAM_POLL_SECONDS', 1))
+    CHANGE_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('CHANGE_STREAM_HEARTBEAT_SECONDS', 15))
+    CHANGE_STREAM_MAX_SECONDS = float(os.environ.get('CHANGE_STREAM_MAX_SECONDS', 300))
+    # compact_changes.py keeps tombstones (deleted rows) this long.
+    CHANGE_LOG_TOMBSTONE_DAYS = int(os.environ.get('CHANGE_LOG_TOMBSTONE_DAYS', 30))
+    # archive_events.py moves events that ended this many days ago out of the
+    # live tables, ARCHIVE_BATCH_SIZE events per transaction.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    UTILIZATION_ROLLUP_ENABLED = os.environ.get('UTILIZATION_ROLLUP_ENABLED', 'true').lower() == 'true'
+    # Response cache for hot GET views: 'memory' (per process), 'redis' (shared) or 'none'.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    # Per-request query counting, Server-Timing headers and /metrics.
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    # /metrics and /metrics/queries (SQL text) are off unless enabled; with
+    # METRICS_TOKEN set they also need it as a bearer token.
+    METRICS_ENDPOINT_ENABLED = os.environ.get('METRICS_ENDPOINT_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    # Statements allowed per request (0 = unlimited); 'log' or 'raise' when exceeded.
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 0))
+    QUERY_BUDGET_ACTION = os.environ.get('QUERY_BUDGET_ACTION', 'log')
+    # Background report/export jobs.
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 300))
+    JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', 24))
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 3600))
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:5000').split(',')
\ No newline at end of file
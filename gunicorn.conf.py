@@ -0,0 +1,33 @@
+"""gunicorn settings for serving wsgi:app with one worker per core.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment: WEB_CONCURRENCY (workers, default one per CPU), WEB_THREADS
+(threads per worker, default 4) and BIND (default 0.0.0.0:8000).
+"""
+import logging
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY') or os.cpu_count() or 1)
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# Build the app and load the booking snapshot once in the master; workers
+# share those pages copy-on-write and each opens its own connections.
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+accesslog = os.environ.get('ACCESS_LOG')
+
+if workers > 1:
+    # Set before the app (and config) is imported: each worker's booking
+    # snapshot has to notice the other workers' writes.
+    os.environ.setdefault('CONFLICT_INDEX_SYNC_SECONDS', '1')
+
+
+def when_ready(server):
+    if workers > 1 and os.environ.get('CACHE_BACKEND', 'memory') == 'memory':
+        logging.getLogger('gunicorn.error').warning(
+            'CACHE_BACKEND=memory with %d workers: a write invalidates cached pages in its own '
+            'worker only, others may serve them for up to CACHE_TTL. Use redis to share the cache.',
+            workers)
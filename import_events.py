@@ -0,0 +1,43 @@
+import argparse
+
+from app import app, db
+from models import User
+from utils.migrations import upgrade
+from utils.importer import FORMATS, DEFAULT_BATCH_SIZE, detect_format, import_events, parse_records
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import events from CSV, JSON/NDJSON or iCalendar.')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--user', help='username that will own the imported events')
+    parser.add_argument('--allocate', action='store_true', help='allocate each row\'s resource_ids, rejecting conflicts')
+    parser.add_argument('--resource', type=int, action='append', default=[], help='resource id for rows without resource_ids')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    file_format = args.format or detect_format(args.path)
+    if not file_format:
+        parser.error('cannot tell the file format, pass --format')
+
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        user_id = None
+        if args.user:
+            user = User.query.filter_by(username=args.user).first()
+            if not user:
+                parser.error(f'unknown user {args.user}')
+            user_id = user.user_id
+
+        with open(args.path, 'rb') as stream:
+            report = import_events(
+                parse_records(stream, file_format),
+                user_id=user_id,
+                allocate=args.allocate or bool(args.resource),
+                default_resource_ids=args.resource,
+                batch_size=args.batch_size
+            )
+
+        print(f"Imported {report['imported']} events, {report['allocated']} allocations.")
+        for failure in report['failed']:
+            print(f"  row {failure['row']}: {failure['error']}")
@@ -0,0 +1,39 @@
+import sys
+
+from app import app, db
+from utils.migrations import MIGRATIONS, DuplicateAllocations, current_version, pending_migrations, upgrade, query_plans
+
+
+def print_plans(title):
+    print(title)
+    for label, plan in query_plans().items():
+        print(f'  {label}:')
+        for step in plan:
+            print(f'    {step}')
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+
+    with app.app_context():
+        db.create_all()
+
+        if command == 'status':
+            print(f'Schema version: {current_version()} (latest {MIGRATIONS[-1][0]})')
+            for version, name, _ in pending_migrations():
+                print(f'  pending {version}: {name}')
+        elif command == 'plans':
+            print_plans('Query plans:')
+        elif command == 'upgrade':
+            if not pending_migrations():
+                print(f'Schema is up to date (version {current_version()}).')
+            else:
+                print_plans('Query plans before upgrade:')
+                try:
+                    for version, name in upgrade():
+                        print(f'Applied migration {version}: {name}')
+                except DuplicateAllocations as e:
+                    sys.exit(f'Upgrade stopped at version {current_version()}: {e}')
+                print_plans('Query plans after upgrade:')
+        else:
+            print('Usage: python migrate.py [upgrade|status|plans]')
@@ -1,7 +1,11 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     user_id = db.Column(db.Integer, primary_key=True)
@@ -14,27 +18,176 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def auth_token_stamp(self):
+        """Changes with the password, so setting a new one revokes older tokens."""
+        return hashlib.sha256(self.password_hash.encode()).hexdigest()[:16]
+
+    def generate_auth_token(self, secret, expires_in=timedelta(hours=1)):
+        import jwt
+        now = datetime.now(timezone.utc)
+        payload = {'sub': str(self.user_id), 'pwd': self.auth_token_stamp(), 'iat': now, 'exp': now + expires_in}
+        return jwt.encode(payload, secret, algorithm='HS256')
+
+    @staticmethod
+    def decode_auth_token(token, secret):
+        """The token's claims if the signature and expiry check out, else None."""
+        import jwt
+        try:
+            return jwt.decode(token, secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            return None
+
+    @staticmethod
+    def verify_auth_token(token, secret):
+        payload = User.decode_auth_token(token, secret)
+        if payload is None:
+            return None
+        user = db.session.get(User, int(payload['sub']))
+        if user is None or payload.get('pwd') != user.auth_token_stamp():
+            return None
+        return user
+
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_start_end', 'start_time', 'end_time'),
+        # Ids are never handed out again, so none can clash with the archive.
+        {'sqlite_autoincrement': True},
+    )
+
     event_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'))
-    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), index=True)
+    # RRULE subset (FREQ/INTERVAL/COUNT/UNTIL); start/end are the first occurrence.
+    recurrence_rule = db.Column(db.String(200))
+    # End of the last occurrence, NULL for single events and open-ended series.
+    recurrence_end = db.Column(db.DateTime, index=True)
+    # Comma-separated ISO start times of cancelled occurrences.
+    recurrence_exceptions = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     allocations = db.relationship('EventResourceAllocation', backref='event', lazy=True)
 
+    def to_dict(self):
+        return {
+            'event_id': self.event_id,
+            'title': self.title,
+            'description': self.description,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'user_id': self.user_id,
+            'recurrence_rule': self.recurrence_rule,
+            'recurrence_exceptions': self.recurrence_exceptions,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
 class Resource(db.Model):
     resource_id = db.Column(db.Integer, primary_key=True)
     resource_name = db.Column(db.String(150), nullable=False)
     resource_type = db.Column(db.String(100), nullable=False)
-    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     allocations = db.relationship('EventResourceAllocation', backref='resource', lazy=True)
 
+    def to_dict(self):
+        return {
+            'resource_id': self.resource_id,
+            'resource_name': self.resource_name,
+            'resource_type': self.resource_type,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
 class EventResourceAllocation(db.Model):
+    __table_args__ = (
+        db.Index('ix_allocation_resource_event', 'resource_id', 'event_id'),
+        db.Index('uq_allocation_event_resource', 'event_id', 'resource_id', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
     allocation_id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('event.event_id'), nullable=False)
 
     resource_id = db.Column(db.Integer, db.ForeignKey('resource.resource_id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'allocation_id': self.allocation_id,
+            'event_id': self.event_id,
+            'resource_id': self.resource_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class EventArchive(db.Model):
+    """Events moved out of event by utils.archive, with the same columns.
+
+    No foreign keys: an archived row outlives its owner and resources.
+    """
+    __table_args__ = (
+        db.Index('ix_event_archive_start_end', 'start_time', 'end_time'),
+    )
+
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(150), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    description = db.Column(db.Text)
+    user_id = db.Column(db.Integer, index=True)
+    recurrence_rule = db.Column(db.String(200))
+    recurrence_end = db.Column(db.DateTime)
+    recurrence_exceptions = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class EventResourceAllocationArchive(db.Model):
+    __table_args__ = (
+        db.Index('ix_allocation_archive_resource_event', 'resource_id', 'event_id'),
+        db.Index('ix_allocation_archive_event', 'event_id'),
+    )
+
+    allocation_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    resource_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class ResourceDailyUsage(db.Model):
+    resource_id = db.Column(db.Integer, db.ForeignKey('resource.resource_id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    booked_seconds = db.Column(db.Integer, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    job_id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # JSON with sorted keys, so equal requests compare equal.
+    params = db.Column(db.Text, nullable=False)
+    # kind + params + data version the result was computed against.
+    cache_key = db.Column(db.String(64), index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    content_type = db.Column(db.String(100))
+    filename = db.Column(db.String(200))
+    result = db.Column(db.LargeBinary)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime, index=True)
+
+class ChangeLog(db.Model):
+    """One row per write to an event, resource or allocation; see utils.changes.
+
+    Filled by triggers. seq only grows (AUTOINCREMENT never reuses a value),
+    and a row that no longer exists in its table is a tombstone.
+    """
+    __table_args__ = (
+        db.Index('ix_change_log_row', 'table_name', 'row_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
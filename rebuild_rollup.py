@@ -0,0 +1,11 @@
+from app import app, db
+from utils.migrations import upgrade
+from utils.rollup import rebuild_rollup
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        with db.engine.begin() as conn:
+            count = rebuild_rollup(conn)
+        print(f'Rebuilt daily utilization rollup: {count} resource-day rows.')
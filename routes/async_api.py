@@ -0,0 +1,186 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+try:
+    from starlette.applications import Starlette
+    from starlette.exceptions import HTTPException
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+except ImportError:
+    raise RuntimeError('The async API needs starlette, uvicorn and aiosqlite (pip install -r requirements-async.txt)')
+
+from config import Config
+from routes.changes import SSE_HEADERS
+from utils.api import (
+    allocate_event_resource, allocation_params, availability, availability_params, change_feed,
+    change_feed_params, change_stream, event_detail, event_list_params, list_events, login_params, login_refused,
+    login_result, login_user, report_params, utilization_report,
+)
+from utils.async_db import AsyncDatabase
+from utils.auth import LoginBusy, authenticate_token, get_password_checker
+from utils.helpers import bearer_token
+
+
+def _message(message, status):
+    return JSONResponse({'message': message}, status)
+
+
+async def _answer(request, func, *args):
+    body, status = await request.app.state.db.run(func, *args)
+    return JSONResponse(body, status)
+
+
+async def get_events(request):
+    try:
+        params = event_list_params(request.query_params)
+    except ValueError as e:
+        return _message(str(e), 400)
+    return await _answer(request, list_events, params)
+
+
+async def get_event(request):
+    return await _answer(request, event_detail, request.path_params['event_id'])
+
+
+async def allocate_resource(request):
+    try:
+        token = bearer_token(request.headers.get('Authorization'))
+    except ValueError as e:
+        return _message(str(e), 401)
+    if not token:
+        return _message('Token is missing!', 401)
+    if await request.app.state.db.run(authenticate_token, token) is None:
+        return _message('Invalid token!', 401)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        resource_id = allocation_params(data)
+    except ValueError as e:
+        return _message(str(e), 400)
+
+    return await _answer(request, allocate_event_resource, request.path_params['event_id'], resource_id)
+
+
+async def login(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        # JSON only: form bodies would need python-multipart.
+        username, password = login_params(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return _message(str(e), 400)
+
+    database = request.app.state.db
+    remote_addr = request.client.host if request.client else None
+    refused = await database.run(login_refused, username, remote_addr)
+    if refused:
+        return JSONResponse(*refused)
+
+    user = await database.run(login_user, username)
+    checker = await database.run(get_password_checker)
+    try:
+        # Awaits the hashing pool, so other requests run meanwhile.
+        valid = await checker.check_async(user, password)
+    except LoginBusy as e:
+        return JSONResponse({'message': str(e)}, 503, {'Retry-After': '1'})
+    return JSONResponse(*await database.run(login_result, username, remote_addr, user, valid))
+
+
+async def resource_availability(request):
+    try:
+        params = availability_params(request.query_params)
+    except ValueError as e:
+        return _message(str(e), 400)
+    return await _answer(request, availability, params)
+
+
+async def resource_utilization_report(request):
+    try:
+        start, end = report_params(request.query_params)
+    except ValueError as e:
+        return _message(str(e), 400)
+    return await _answer(request, utilization_report, start, end)
+
+
+async def get_changes(request):
+    try:
+        params = change_feed_params(request.query_params)
+    except ValueError as e:
+        return _message(str(e), 400)
+    return await _answer(request, change_feed, params)
+
+
+async def stream_changes(request):
+    try:
+        params = change_feed_params(request.query_params, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return _message(str(e), 400)
+    database = request.app.state.db
+    stream, status = await database.run(change_stream, params)
+    if status != 200:
+        return JSONResponse(stream, status)
+
+    async def messages():
+        while not await request.is_disconnected():
+            chunk = await database.run(stream.poll)
+            if chunk:
+                yield chunk
+            if stream.done:
+                return
+            await asyncio.sleep(stream.interval)
+
+    return StreamingResponse(messages(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def _http_error(request, exc):
+    return _message(exc.detail, exc.status_code)
+
+
+async def _server_error(request, exc):
+    return _message(str(exc), 500)
+
+
+routes = [
+    Route('/api/events/', get_events, methods=['GET']),
+    Route('/api/events/{event_id:int}', get_event, methods=['GET']),
+    Route('/api/events/{event_id:int}/allocate-resource', allocate_resource, methods=['POST']),
+    Route('/api/auth/login', login, methods=['POST']),
+    Route('/api/resources/availability', resource_availability, methods=['GET']),
+    Route('/api/resources/utilization-report', resource_utilization_report, methods=['GET']),
+    Route('/api/changes/', get_changes, methods=['GET']),
+    Route('/api/changes/stream', stream_changes, methods=['GET']),
+]
+
+
+def create_asgi_app(config=Config):
+    """The JSON API of events_bp, resource_bp and changes_bp as an ASGI app.
+
+    Same parameters, messages and bodies as the Flask routes (both call
+    utils.api), served from one event loop over an async engine, so slow
+    clients and slow queries cost a coroutine each rather than a thread.
+    """
+    from app import create_app
+
+    flask_app = create_app(config)
+    # The booking snapshot's lock is held per thread, and every request here
+    # shares the loop's thread; check conflicts against the database instead.
+    flask_app.config['CONFLICT_INDEX_ENABLED'] = False
+    database = AsyncDatabase(flask_app)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await database.dispose()
+
+    app = Starlette(
+        routes=routes,
+        exception_handlers={HTTPException: _http_error, Exception: _server_error},
+        lifespan=lifespan,
+    )
+    app.state.db = database
+    return app
@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, request
+from utils.api import login_params, login_refused, login_result, login_user
+from utils.auth import LoginBusy, get_password_checker
+
+auth_bp = Blueprint('auth', __name__)
+
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    try:
+        username, password = login_params(request.get_json(silent=True) or request.form)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    refused = login_refused(username, request.remote_addr)
+    if refused:
+        body, status, headers = refused
+        return jsonify(body), status, headers
+
+    user = login_user(username)
+    try:
+        # Blocks this worker thread until the hash is done; the async API awaits it instead.
+        valid = get_password_checker().check(user, password)
+    except LoginBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
+    body, status, headers = login_result(username, request.remote_addr, user, valid)
+    return jsonify(body), status, headers
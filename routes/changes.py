@@ -0,0 +1,50 @@
+import time
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from models import db
+from utils.api import change_feed, change_feed_params, change_stream
+
+changes_bp = Blueprint('changes', __name__)
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+@changes_bp.route('/', methods=['GET'])
+def get_changes():
+    """Events, resources and allocations changed since ?since=<cursor>."""
+    try:
+        params = change_feed_params(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    body, status = change_feed(params)
+    return jsonify(body), status
+
+
+@changes_bp.route('/stream', methods=['GET'])
+def stream_changes():
+    """The same changes as Server-Sent Events, for CHANGE_STREAM_MAX_SECONDS.
+
+    Holds a worker thread while open; asgi.py serves the same stream for
+    the cost of a coroutine.
+    """
+    try:
+        params = change_feed_params(request.args, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    stream, status = change_stream(params)
+    if status != 200:
+        return jsonify(stream), status
+
+    @stream_with_context
+    def messages():
+        while True:
+            chunk = stream.poll()
+            # End the read transaction, or the next poll sees the same snapshot.
+            db.session.remove()
+            if chunk:
+                yield chunk
+            if stream.done:
+                return
+            time.sleep(stream.interval)
+
+    return Response(messages(), mimetype='text/event-stream', headers=SSE_HEADERS)
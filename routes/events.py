@@ -1,93 +1,73 @@
 from flask import Blueprint, request, jsonify, g
-from datetime import datetime
 from models import (
     db,
     Event,
-    EventAttendee,
-    Resource,
     EventResourceAllocation
 )
 from utils.helpers import token_required
-from utils.conflict_checker import has_resource_conflict
+from utils.rollup import record_allocation, record_event_move
+from utils.allocations import allocation_page, allocation_to_dict, allocate_many, DEFAULT_PAGE_SIZE
+from utils.importer import FORMATS, detect_format, import_events, parse_records
+from utils.recurrence import apply_recurrence, event_occurrences
+from utils.calendar_view import longest_single_event
+from utils.cache import cached_view, invalidate
+from utils.api import (
+    allocate_event_resource, allocation_params, event_detail, event_list_params, list_events, parse_datetime
+)
+from utils.conflict_checker import (
+    unindex_allocation,
+    unindex_event,
+    reindex_event
+)
 
 events_bp = Blueprint('events', __name__)
 
 @events_bp.route('/', methods=['GET'])
+@cached_view('events')
 def get_events():
     try:
-        category = request.args.get('category')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        location = request.args.get('location')
-        organizer = request.args.get('organizer')
-        active_only = request.args.get('active_only', 'true').lower() == 'true'
-
-        query = Event.query
-
-        if active_only:
-            query = query.filter_by(is_active=True)
-
-        if category:
-            query = query.filter_by(category=category)
-
-        if location:
-            query = query.filter(Event.location.ilike(f'%{location}%'))
-
-        if organizer:
-            from models import User
-            query = query.join(User).filter(User.username.ilike(f'%{organizer}%'))
-
-        if start_date:
-            try:
-                start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(Event.start_time >= start)
-            except ValueError:
-                pass
-
-        if end_date:
-            try:
-                end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(Event.start_time <= end)
-            except ValueError:
-                pass
-
-        sort_by = request.args.get('sort_by', 'start_time')
-        sort_order = request.args.get('sort_order', 'asc')
-
-        if sort_by == 'created_at':
-            sort_column = Event.created_at
-        elif sort_by == 'title':
-            sort_column = Event.title
-        else:
-            sort_column = Event.start_time
-
-        query = query.order_by(
-            sort_column.desc() if sort_order.lower() == 'desc' else sort_column.asc()
-        )
+        params = event_list_params(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        body, status = list_events(params)
+        return jsonify(body), status
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
 
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 10)), 100)
 
-        paginated_events = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+@events_bp.route('/occurrences', methods=['GET'])
+def list_occurrences():
+    """Single events and expanded series occurrences between start and end."""
+    try:
+        window_start = parse_datetime(request.args['start'])
+        window_end = parse_datetime(request.args['end'])
+    except (KeyError, ValueError):
+        return jsonify({'message': 'start and end must be ISO datetimes!'}), 400
+    if window_start >= window_end:
+        return jsonify({'message': 'end must be after start!'}), 400
 
-        return jsonify({
-            'events': [event.to_dict() for event in paginated_events.items],
-            'total': paginated_events.total,
-            'page': paginated_events.page,
-            'per_page': paginated_events.per_page,
-            'pages': paginated_events.pages
-        }), 200
+    try:
+        occurrences = event_occurrences(window_start, window_end, longest=longest_single_event())
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    except Exception as e:
-        return jsonify({'message': str(e)}), 500
+    return jsonify({
+        'occurrences': [{
+            'event_id': event.event_id,
+            'title': event.title,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'recurring': bool(event.recurrence_rule)
+        } for start_time, end_time, event in occurrences]
+    }), 200
 
 
 @events_bp.route('/<int:event_id>', methods=['GET'])
+@cached_view('event:{event_id}')
 def get_event(event_id):
-    event = Event.query.get_or_404(event_id)
-    return jsonify(event.to_dict()), 200
+    body, status = event_detail(event_id)
+    return jsonify(body), status
 
 
 @events_bp.route('/', methods=['POST'])
@@ -99,8 +79,8 @@ def create_event():
         if not data.get('title') or not data.get('start_time') or not data.get('end_time'):
             return jsonify({'message': 'Missing required fields!'}), 400
 
-        start_time = datetime.fromisoformat(data['start_time'].replace('Z', '+00:00'))
-        end_time = datetime.fromisoformat(data['end_time'].replace('Z', '+00:00'))
+        start_time = parse_datetime(data['start_time'])
+        end_time = parse_datetime(data['end_time'])
 
         if start_time >= end_time:
             return jsonify({'message': 'End time must be after start time!'}), 400
@@ -110,14 +90,16 @@ def create_event():
             description=data.get('description', ''),
             start_time=start_time,
             end_time=end_time,
-            location=data.get('location'),
-            category=data.get('category'),
-            max_attendees=data.get('max_attendees'),
             user_id=g.current_user.id
         )
+        try:
+            apply_recurrence(event, data.get('recurrence_rule'), data.get('recurrence_exceptions'))
+        except ValueError as e:
+            return jsonify({'message': f'Invalid recurrence: {e}'}), 400
 
         db.session.add(event)
         db.session.commit()
+        invalidate('events')
 
         return jsonify({
             'message': 'Event created successfully!',
@@ -130,6 +112,32 @@ def create_event():
 
 
 
+@events_bp.route('/import', methods=['POST'])
+@token_required
+def import_events_api():
+    upload = request.files.get('file')
+    if upload:
+        file_format = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        stream = upload.stream
+    else:
+        file_format = request.args.get('format') or detect_format(content_type=request.mimetype)
+        stream = request.stream
+
+    if file_format not in FORMATS:
+        return jsonify({'message': f'Unsupported format! Use one of: {", ".join(FORMATS)}'}), 400
+
+    report = import_events(
+        parse_records(stream, file_format),
+        user_id=g.current_user.id,
+        allocate=request.args.get('allocate', 'false').lower() == 'true',
+        default_resource_ids=request.args.getlist('resource_id', type=int)
+    )
+    if report['imported']:
+        invalidate('events')
+    return jsonify(report), 200
+
+
+
 @events_bp.route('/<int:event_id>', methods=['PUT'])
 @token_required
 def update_event(event_id):
@@ -138,22 +146,33 @@ def update_event(event_id):
     if event.user_id != g.current_user.id:
         return jsonify({'message': 'You can only update your own events!'}), 403
 
+    old_start, old_end = event.start_time, event.end_time
+    was_recurring = bool(event.recurrence_rule)
     try:
         data = request.json
 
-        for field in ['title', 'description', 'location', 'category', 'max_attendees', 'is_active']:
+        for field in ['title', 'description']:
             if field in data:
                 setattr(event, field, data[field])
 
         if 'start_time' in data:
-            event.start_time = datetime.fromisoformat(data['start_time'].replace('Z', '+00:00'))
+            event.start_time = parse_datetime(data['start_time'])
         if 'end_time' in data:
-            event.end_time = datetime.fromisoformat(data['end_time'].replace('Z', '+00:00'))
+            event.end_time = parse_datetime(data['end_time'])
 
         if event.start_time >= event.end_time:
             return jsonify({'message': 'End time must be after start time!'}), 400
-
+        try:
+            apply_recurrence(event, data.get('recurrence_rule'), data.get('recurrence_exceptions'))
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'message': f'Invalid recurrence: {e}'}), 400
+
+        resource_ids = [a.resource_id for a in event.allocations]
+        record_event_move(event, old_start, old_end, resource_ids, was_recurring)
         db.session.commit()
+        reindex_event(event, old_start, old_end, resource_ids)
+        invalidate('events', f'event:{event_id}')
 
         return jsonify({
             'message': 'Event updated successfully!',
@@ -174,11 +193,16 @@ def delete_event(event_id):
         return jsonify({'message': 'You can only delete your own events!'}), 403
 
     try:
-       
+        event_id, start_time, end_time = event.event_id, event.start_time, event.end_time
+        resource_ids = [r for (r,) in db.session.query(EventResourceAllocation.resource_id).filter_by(event_id=event.event_id)]
+        for resource_id in resource_ids:
+            record_allocation(resource_id, event, -1)
         EventResourceAllocation.query.filter_by(event_id=event.event_id).delete()
 
         db.session.delete(event)
         db.session.commit()
+        unindex_event(event_id, start_time, end_time, resource_ids)
+        invalidate('events', f'event:{event_id}')
         return jsonify({'message': 'Event deleted successfully!'}), 200
 
     except Exception as e:
@@ -187,121 +211,61 @@ def delete_event(event_id):
 
 
 
-@events_bp.route('/<int:event_id>/register', methods=['POST'])
-@token_required
-def register_for_event(event_id):
-    event = Event.query.get_or_404(event_id)
-
-    if not event.is_active or not event.check_availability():
-        return jsonify({'message': 'Event unavailable!'}), 400
-
-    existing = EventAttendee.query.filter_by(
-        user_id=g.current_user.id,
-        event_id=event_id
-    ).first()
-
-    if existing:
-        return jsonify({'message': 'Already registered!'}), 400
-
-    registration = EventAttendee(
-        user_id=g.current_user.id,
-        event_id=event_id
-    )
-
-    event.current_attendees += 1
-
-    db.session.add(registration)
-    db.session.commit()
-
-    return jsonify({'message': 'Registered successfully!'}), 201
-
-
-@events_bp.route('/<int:event_id>/unregister', methods=['POST'])
-@token_required
-def unregister_from_event(event_id):
-    registration = EventAttendee.query.filter_by(
-        user_id=g.current_user.id,
-        event_id=event_id
-    ).first_or_404()
-
-    event = Event.query.get(event_id)
-    if event:
-        event.current_attendees = max(0, event.current_attendees - 1)
-
-    db.session.delete(registration)
-    db.session.commit()
-
-    return jsonify({'message': 'Unregistered successfully!'}), 200
-
-
 @events_bp.route('/<int:event_id>/allocate-resource', methods=['POST'])
 @token_required
 def allocate_resource(event_id):
-    data = request.json
-    resource_id = data.get('resource_id')
-
-    if not resource_id:
-        return jsonify({'message': 'Resource ID required'}), 400
+    try:
+        resource_id = allocation_params(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    body, status = allocate_event_resource(event_id, resource_id)
+    return jsonify(body), status
 
-    event = Event.query.get_or_404(event_id)
-    resource = Resource.query.get_or_404(resource_id)
 
-    conflict_event = has_resource_conflict(
-        resource_id,
-        event.start_time,
-        event.end_time
-    )
+@events_bp.route('/allocations', methods=['GET'])
+@token_required
+def list_allocations():
+    try:
+        after = request.args.get('after', type=int)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        allocations, next_cursor = allocation_page(g.current_user.id, after, limit)
 
-    if conflict_event:
         return jsonify({
-            'message': 'Resource conflict detected!',
-            'resource': resource.name,
-            'conflicting_event': conflict_event.title,
-            'conflict_time': f'{conflict_event.start_time} - {conflict_event.end_time}'
-        }), 400
-
-    allocation = EventResourceAllocation(
-        event_id=event.event_id,
-        resource_id=resource.resource_id
-    )
+            'allocations': [allocation_to_dict(alloc) for alloc in allocations],
+            'next_cursor': next_cursor
+        }), 200
 
-    db.session.add(allocation)
-    db.session.commit()
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
 
-    return jsonify({
-        'message': 'Resource allocated successfully!',
-        'event': event.title,
-        'resource': resource.name
-    }), 200
+@events_bp.route('/allocations/batch', methods=['POST'])
+@token_required
+def allocate_resources_batch():
+    data = request.json or {}
+    items = data.get('allocations')
 
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'A non-empty allocations list is required'}), 400
 
-@events_bp.route('/allocations', methods=['GET'])
-@token_required
-def list_allocations():
     try:
-        allocations = EventResourceAllocation.query.join(Event).filter(Event.user_id == g.current_user.id).all()
-
-        data = []
-        for alloc in allocations:
-            event = Event.query.get(alloc.event_id)
-            resource = Resource.query.get(alloc.resource_id)
-            data.append({
-                'allocation_id': alloc.allocation_id,
-                'event_id': event.event_id if event else None,
-                'event_title': event.title if event else 'Deleted event',
-                'event_start': event.start_time.isoformat() if event and getattr(event, 'start_time', None) else None,
-                'event_end': event.end_time.isoformat() if event and getattr(event, 'end_time', None) else None,
-                'event_description': event.description if event and getattr(event, 'description', None) else None,
-                'resource_id': resource.resource_id if resource else None,
-                'resource_name': resource.resource_name if resource else 'Deleted resource',
-                'resource_type': resource.resource_type if resource and getattr(resource, 'resource_type', None) else None
-            })
-
-        return jsonify({'allocations': data}), 200
+        pairs = [(int(item['event_id']), int(item['resource_id'])) for item in items]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'Each allocation needs an integer event_id and resource_id'}), 400
 
+    try:
+        results = allocate_many(pairs)
     except Exception as e:
+        db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
+    invalidate(*{f"event:{result['event_id']}" for result in results if result['status'] == 'allocated'})
+    allocated = sum(1 for result in results if result['status'] == 'allocated')
+    return jsonify({
+        'allocated': allocated,
+        'rejected': len(results) - allocated,
+        'results': results
+    }), 200
+
 @events_bp.route('/allocations/<int:alloc_id>', methods=['DELETE'])
 @token_required
 def delete_allocation(alloc_id):
@@ -312,8 +276,14 @@ def delete_allocation(alloc_id):
         return jsonify({'message': 'You are not authorized to remove this allocation.'}), 403
 
     try:
+        resource_id = allocation.resource_id
         db.session.delete(allocation)
+        if event:
+            record_allocation(resource_id, event, -1)
         db.session.commit()
+        if event:
+            unindex_allocation(resource_id, event)
+            invalidate(f'event:{event.event_id}')
         return jsonify({'message': 'Allocation removed successfully!'}), 200
     except Exception as e:
         db.session.rollback()
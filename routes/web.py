@@ -0,0 +1,484 @@
+from flask import Blueprint, Response, abort, jsonify, render_template, request, redirect, url_for, session, flash, stream_with_context
+import json
+from datetime import date, datetime, timedelta
+
+from models import db, User, Event, EventArchive, Resource, EventResourceAllocation, Job
+from utils.conflict_checker import (
+    get_conflict_index,
+    unindex_allocation,
+    unindex_event,
+    reindex_event
+)
+from utils.rollup import record_allocation, record_event_move, forget_resource
+from utils.allocations import allocation_page, count_allocations, book_resource
+from utils.reporting import iter_resource_utilization, report_chunks
+from utils.exporting import gzip_chunks
+from utils.jobs import submit_job
+from utils.calendar_view import calendar_window
+from utils.search import search_events
+from utils.recurrence import apply_recurrence, format_rule
+from utils.cache import cached_view, invalidate
+from utils.api import parse_datetime
+
+web_bp = Blueprint('web', __name__)
+
+@web_bp.route('/')
+def home():
+  
+        return redirect(url_for('web.events'))
+
+
+
+@web_bp.route('/events')
+@cached_view('events')
+def events():
+    q = request.args.get('q', '').strip()
+    if q:
+        results = search_events(q, limit=100)
+        events = [event for event, _ in results]
+        snippets = {event.event_id: snippet for event, snippet in results}
+        return render_template('events.html', events=events, q=q, snippets=snippets)
+    if request.args.get('archived'):
+        # Read-only: archived events can no longer be edited or deleted.
+        events = EventArchive.query.order_by(EventArchive.start_time).all()
+        return render_template('events.html', events=events, archived=True)
+    events = Event.query.all()
+    return render_template('events.html', events=events)
+
+
+@web_bp.route('/events/search')
+@cached_view('events')
+def search_events_api():
+    try:
+        window_start = parse_datetime(request.args['start']) if request.args.get('start') else None
+        window_end = parse_datetime(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'message': 'start and end must be ISO dates or datetimes'}), 400
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    results = search_events(request.args.get('q', ''), window_start, window_end, limit, offset)
+    return jsonify({
+        'results': [{
+            'event_id': event.event_id,
+            'title': event.title,
+            'start_time': event.start_time.isoformat(),
+            'end_time': event.end_time.isoformat(),
+            'recurring': bool(event.recurrence_rule),
+            'snippet': snippet
+        } for event, snippet in results],
+        'limit': limit,
+        'offset': offset
+    })
+
+
+@web_bp.route('/calendar')
+def calendar():
+    try:
+        month = datetime.strptime(request.args['month'], '%Y-%m').date()
+    except (KeyError, ValueError):
+        month = date.today().replace(day=1)
+    next_month = (month + timedelta(days=31)).replace(day=1)
+    # Whole Monday-to-Sunday weeks around the month.
+    grid_start = month - timedelta(days=month.weekday())
+    grid_end = next_month + timedelta(days=(7 - next_month.weekday()) % 7)
+    return render_template(
+        'calendar.html',
+        month=month,
+        prev_month=(month - timedelta(days=1)).replace(day=1),
+        next_month=next_month,
+        grid_start=grid_start,
+        grid_end=grid_end,
+        days=[grid_start + timedelta(days=i) for i in range((grid_end - grid_start).days)]
+    )
+
+
+@web_bp.route('/calendar/data')
+@cached_view('events')
+def calendar_data():
+    try:
+        window_start = parse_datetime(request.args['start'])
+        window_end = parse_datetime(request.args['end'])
+        return jsonify(calendar_window(window_start, window_end, request.args.get('bucket', 'day')))
+    except KeyError:
+        return jsonify({'message': 'start and end are required'}), 400
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+
+@web_bp.route('/profile')
+
+def profile():
+    username = session.get('user')
+    user = User.query.filter_by(username=username).first()
+
+    user_events = []
+   
+    user_events = []
+    user_allocations = []
+    next_cursor = None
+    try:
+        if user and hasattr(user, 'user_id'):
+            user_events = Event.query.filter_by(user_id=user.user_id).all()
+            user_allocations, next_cursor = allocation_page(user.user_id, request.args.get('after', type=int))
+        else:
+          
+            user_events = []
+            user_allocations = []
+    except Exception:
+        user_events = []
+        user_allocations = []
+
+    return render_template('profile.html', user=user, events=user_events, allocations=user_allocations, next_cursor=next_cursor)
+
+
+@web_bp.route('/events/add', methods=['GET', 'POST'])
+
+def add_event():
+    if request.method == 'POST':
+  
+        username = session.get('user')
+        user = User.query.filter_by(username=username).first()
+        
+        event = Event(
+            title=request.form['title'],
+            start_time=datetime.fromisoformat(request.form['start_time']),
+            end_time=datetime.fromisoformat(request.form['end_time']),
+            description=request.form['description'],
+            user_id=user.user_id if user else None 
+        )
+        try:
+            apply_recurrence(event, _form_recurrence_rule(request.form), request.form.get('exceptions', ''))
+        except ValueError as e:
+            flash(f"Invalid repeat settings: {e}", "danger")
+            return render_template('add_event.html')
+        db.session.add(event)
+        db.session.commit()
+        invalidate('events')
+        flash("Event created successfully!", "success")
+        return redirect(url_for('web.events'))
+
+    return render_template('add_event.html')
+
+
+def _form_recurrence_rule(form):
+    freq = form.get('repeat', '')
+    if not freq:
+        return ''
+    until = form.get('repeat_until')
+    return format_rule(
+        freq,
+        interval=int(form.get('repeat_interval') or 1),
+        count=int(form['repeat_count']) if form.get('repeat_count') else None,
+        until=datetime.fromisoformat(until).replace(hour=23, minute=59, second=59) if until else None
+    )
+
+
+
+@web_bp.route('/events/edit/<int:event_id>', methods=['POST'])
+def edit_event(event_id):
+    event = Event.query.get_or_404(event_id)
+    
+    username = session.get('user')
+    user = User.query.filter_by(username=username).first()
+   
+    if hasattr(event, 'user_id') and event.user_id is not None:
+        if not user or event.user_id != user.user_id:
+            return {"message": "You can only edit your own events!"}, 403
+
+    old_start, old_end = event.start_time, event.end_time
+    was_recurring = bool(event.recurrence_rule)
+    try:
+        event.title = request.form['title']
+        event.description = request.form['description']
+        event.start_time = datetime.fromisoformat(request.form['start_time'])
+        event.end_time = datetime.fromisoformat(request.form['end_time'])
+        apply_recurrence(event)
+        resource_ids = [a.resource_id for a in event.allocations]
+        record_event_move(event, old_start, old_end, resource_ids, was_recurring)
+        
+        db.session.commit()
+        reindex_event(event, old_start, old_end, resource_ids)
+        invalidate('events', f'event:{event_id}')
+        return {"message": "Event updated successfully!"}, 200
+    except Exception as e:
+        db.session.rollback()
+        return {"message": f"Error updating event: {str(e)}"}, 500
+
+
+@web_bp.route('/events/delete/<int:event_id>', methods=['POST'])
+
+def delete_event_web(event_id):
+    """Delete event via web form (session-based auth)"""
+    event = Event.query.get_or_404(event_id)
+    
+  
+    username = session.get('user')
+    user = User.query.filter_by(username=username).first()
+    
+ 
+    event_owner = getattr(event, 'user_id', None)
+    if event_owner is None or (user and event_owner == getattr(user, 'user_id', None)):
+        try:
+            event_id, start_time, end_time = event.event_id, event.start_time, event.end_time
+            resource_ids = [r for (r,) in db.session.query(EventResourceAllocation.resource_id).filter_by(event_id=event.event_id)]
+            for resource_id in resource_ids:
+                record_allocation(resource_id, event, -1)
+            EventResourceAllocation.query.filter_by(event_id=event.event_id).delete()
+            db.session.delete(event)
+            db.session.commit()
+            unindex_event(event_id, start_time, end_time, resource_ids)
+            invalidate('events', f'event:{event_id}')
+            flash("Event deleted successfully!", "success")
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error deleting event: {str(e)}", "danger")
+    else:
+        flash("You can only delete your own events!", "danger")
+    
+    return redirect(url_for('web.events'))
+
+
+
+@web_bp.route('/resources/')
+@cached_view('resources')
+def resources():
+    resources = Resource.query.all()
+    return render_template('resources.html', resources=resources)
+
+
+@web_bp.route('/resources/add', methods=['GET', 'POST'])
+
+def add_resource():
+    if request.method == 'POST':
+        resource = Resource(
+            resource_name=request.form['name'],
+            resource_type=request.form['type']
+        )
+        db.session.add(resource)
+        db.session.commit()
+        invalidate('resources')
+        flash("Resource added successfully!", "success")
+        return redirect(url_for('web.resources'))
+
+    return render_template('add_resource.html')
+
+
+@web_bp.route('/resources/edit/<int:resource_id>', methods=['POST'])
+
+def edit_resource(resource_id):
+    resource = Resource.query.get_or_404(resource_id)
+    resource.resource_name = request.form.get('name', resource.resource_name)
+    resource.resource_type = request.form.get('type', resource.resource_type)
+    db.session.commit()
+    invalidate('resources')
+    flash("Resource updated successfully!", "success")
+    return redirect(url_for('web.resources'))
+
+
+@web_bp.route('/resources/delete/<int:resource_id>', methods=['POST'])
+
+def delete_resource(resource_id):
+    resource = Resource.query.get_or_404(resource_id)
+    forget_resource(resource_id)
+    db.session.delete(resource)
+    db.session.commit()
+    get_conflict_index().invalidate(resource_id)
+    invalidate('resources')
+    flash("Resource deleted successfully!", "success")
+    return redirect(url_for('web.resources'))
+
+
+
+@web_bp.route('/allocate', methods=['GET', 'POST'])
+
+def allocate_resource():
+    events = Event.query.all()
+    resources = Resource.query.all()
+    after = request.args.get('after', type=int)
+    allocations, next_cursor = allocation_page(after_id=after)
+    error = None
+
+    if request.method == 'POST':
+        event_id = int(request.form['event_id'])
+        resource_id = int(request.form['resource_id'])
+        event = Event.query.get(event_id)
+
+        _, conflict = book_resource(event, resource_id)
+
+        if conflict:
+            error = "This resource is already booked for another event during this time."
+        else:
+            invalidate(f'event:{event_id}')
+            allocations, next_cursor = allocation_page(after_id=after)
+            error = None  
+            flash("Resource allocated successfully!", "success")
+
+    return render_template(
+        'allocate.html',
+        events=events,
+        resources=resources,
+        allocations=allocations,
+        allocation_count=count_allocations(),
+        next_cursor=next_cursor,
+        error=error
+    )
+
+
+@web_bp.route('/allocations')
+
+def view_allocations():
+   
+    return redirect(url_for('web.allocate_resource'))
+
+
+@web_bp.route('/allocations/remove/<int:alloc_id>', methods=['POST'])
+
+def remove_allocation(alloc_id):
+    allocation = EventResourceAllocation.query.get_or_404(alloc_id)
+    event = Event.query.get(allocation.event_id)
+
+   
+    username = session.get('user')
+    user = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+
+   
+    if event:
+      
+        if hasattr(event, 'user_id'):
+            event_owner_id = getattr(event, 'user_id')
+            current_user_id = getattr(user, 'user_id', None) if user else None
+
+           
+            if event_owner_id is not None and current_user_id != event_owner_id:
+                flash('You are not authorized to remove this allocation.')
+                return redirect(url_for('web.view_allocations'))
+
+    try:
+        resource_id = allocation.resource_id
+        db.session.delete(allocation)
+        if event:
+            record_allocation(resource_id, event, -1)
+        db.session.commit()
+        if event:
+            unindex_allocation(resource_id, event)
+            invalidate(f'event:{event.event_id}')
+        flash('Allocation removed successfully!')
+    except Exception as e:
+        db.session.rollback()
+        flash('Error removing allocation: ' + str(e))
+
+    return redirect(url_for('web.view_allocations'))
+
+
+
+@web_bp.route('/report', methods=['GET', 'POST'])
+
+def utilization_report():
+    report_data = []
+    start_date = end_date = None
+    totals = {'hours': 0.0, 'bookings': 0, 'upcoming': 0}
+
+    if request.method == 'POST':
+        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
+
+        # Runs inline and writes nothing, but reuses a cached background result.
+        job = submit_job('report', {'start_date': start_date, 'end_date': end_date}, wait=True)
+        if job.status == 'done':
+            result = json.loads(job.result)
+            report_data, totals = result['rows'], result['totals']
+        else:
+            flash('Report failed: ' + job.error)
+
+    return render_template('report.html', report_data=report_data, totals=totals, start_date=start_date, end_date=end_date)
+
+
+@web_bp.route('/report/export', methods=['POST'])
+def export_report_csv():
+   
+    try:
+        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
+    except Exception:
+        return redirect(url_for('web.utilization_report'))
+
+    export_format = request.form.get('format', 'csv')
+    rows = iter_resource_utilization(start_date, end_date)
+
+    chunks, mimetype, extension = report_chunks(rows, export_format)
+    filename = f'resource_report_{start_date}_{end_date}.{extension}'
+
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if request.form.get('gzip') and request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+@web_bp.route('/report/jobs', methods=['POST'])
+def submit_report_job():
+    try:
+        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
+    except Exception:
+        flash('Choose a start and end date')
+        return redirect(url_for('web.utilization_report'))
+
+    params = {'start_date': start_date, 'end_date': end_date}
+    kind = request.form.get('kind', 'report')
+    if kind == 'export':
+        params['format'] = request.form.get('format', 'csv')
+    try:
+        job = submit_job(kind, params)
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('web.utilization_report'))
+    return redirect(url_for('web.report_job', job_id=job.job_id))
+
+
+def _job_status(job):
+    return {
+        'job_id': job.job_id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': url_for('web.download_report_job', job_id=job.job_id) if job.status == 'done' else None
+    }
+
+
+@web_bp.route('/report/jobs/<job_id>')
+def report_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status == 'done' and job.kind == 'report':
+        result = json.loads(job.result)
+        params = json.loads(job.params)
+        return render_template(
+            'report.html', report_data=result['rows'], totals=result['totals'],
+            start_date=params['start_date'], end_date=params['end_date']
+        )
+    return render_template('report_job.html', job=_job_status(job))
+
+
+@web_bp.route('/report/jobs/<job_id>/status')
+def report_job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    return jsonify(_job_status(job))
+
+
+@web_bp.route('/report/jobs/<job_id>/download')
+def download_report_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'done':
+        abort(404)
+    return Response(
+        job.result, mimetype=job.content_type,
+        headers={'Content-Disposition': f'attachment; filename={job.filename}'}
+    )
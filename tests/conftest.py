@@ -0,0 +1,85 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from models import db, Event, EventResourceAllocation, Resource, User
+from utils.migrations import upgrade
+
+
+class TestConfig(Config):
+    TESTING = True
+    CACHE_BACKEND = 'none'
+    CONFLICT_INDEX_PRELOAD = False
+    CONFLICT_INDEX_SYNC_SECONDS = 0
+
+
+@pytest.fixture
+def settings():
+    """Config overrides for the app fixture; a test module can redefine it."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, settings):
+    config = type('config', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}', **settings})
+
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='alice')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def token(app, user):
+    return user.generate_auth_token(app.config['JWT_SECRET_KEY'])
+
+
+def add_event(title, start_time, end_time, user=None, **columns):
+    event = Event(title=title, start_time=start_time, end_time=end_time,
+                  user_id=user.user_id if user else None, **columns)
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def add_resource(name='Room', resource_type='room'):
+    resource = Resource(resource_name=name, resource_type=resource_type)
+    db.session.add(resource)
+    db.session.commit()
+    return resource
+
+
+def allocate(event, resource):
+    allocation = EventResourceAllocation(event_id=event.event_id, resource_id=resource.resource_id)
+    db.session.add(allocation)
+    db.session.commit()
+    return allocation
+
+
+def at(day, hour, minute=0):
+    return datetime(2030, 1, day, hour, minute)
@@ -0,0 +1,65 @@
+from conftest import add_event, add_resource, allocate, at
+from models import db, Event, EventArchive
+from utils.archive import archive_events
+from utils.recurrence import apply_recurrence
+
+READS = [
+    '/api/events/?per_page=50',
+    '/api/events/?cursor=&per_page=50&total=exact',
+    '/api/events/?start_date=2030-01-01T00:00:00&per_page=50',
+    '/api/events/occurrences?start=2030-01-01T00:00&end=2030-03-01T00:00',
+]
+
+
+def reads(client, event_ids):
+    bodies = [client.get(url).json for url in READS]
+    return bodies + [client.get(f'/api/events/{event_id}').json for event_id in event_ids]
+
+
+def test_reads_are_unchanged_by_archiving(client, user):
+    resource = add_resource()
+    events = [add_event(f'Event {day}', at(day, 9), at(day, 10), user) for day in range(1, 11)]
+    series = add_event('Weekly', at(1, 14), at(1, 15), user)
+    apply_recurrence(series, 'FREQ=WEEKLY;COUNT=2')
+    db.session.commit()
+    for event in events[:5] + events[-1:]:
+        allocate(event, resource)
+    event_ids = [event.event_id for event in events + [series]]
+    before = reads(client, event_ids)
+
+    moved, _ = archive_events(at(6, 0))
+    assert moved == 5
+    assert EventArchive.query.count() == 5
+    assert Event.query.count() == 6
+    assert reads(client, event_ids) == before
+
+
+def test_archived_ids_are_not_handed_out_again(client, user):
+    resource = add_resource()
+    for day in (1, 2):
+        allocate(add_event(f'Event {day}', at(day, 9), at(day, 10), user), resource)
+
+    assert archive_events(at(3, 0)) == (2, 2)
+    assert Event.query.count() == 0
+    event = add_event('New', at(4, 9), at(4, 10), user)
+    allocation = allocate(event, resource)
+    assert event.event_id == 3
+    assert allocation.allocation_id == 3
+    assert client.get('/api/events/1').json['title'] == 'Event 1'
+
+
+def test_reads_take_offset_dates_once_something_is_archived(client, user):
+    add_event('Old', at(1, 9), at(1, 10), user)
+    add_event('New', at(5, 9), at(5, 10), user)
+    archive_events(at(3, 0))
+
+    response = client.get('/api/events/', query_string={'start_date': '2030-01-01T10:00:00+02:00'})
+    assert [event['title'] for event in response.json['events']] == ['Old', 'New']
+    response = client.get('/api/events/', query_string={'start_date': '2030-01-01T09:00:00-01:00'})
+    assert [event['title'] for event in response.json['events']] == ['New']
+    response = client.get('/api/events/occurrences', query_string={
+        'start': '2030-01-01T00:00:00Z', 'end': '2030-01-02T00:00:00+00:00'})
+    assert [o['title'] for o in response.json['occurrences']] == ['Old']
+    response = client.get('/calendar/data', query_string={
+        'start': '2030-01-01T00:00:00+01:00', 'end': '2030-01-08T00:00:00+01:00'})
+    assert response.status_code == 200
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from utils.auth import LoginBusy, PasswordChecker
+
+
+def test_login_issues_a_token_and_throttles_failures(app, client, user):
+    app.config['LOGIN_MAX_FAILURES'] = 2
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 200
+    token = response.json['token']
+    assert client.get('/api/events/allocations', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+
+    assert client.post('/api/auth/login', json={'username': 'alice'}).status_code == 400
+    statuses = [client.post('/api/auth/login', data={'username': 'alice', 'password': 'wrong'}).status_code
+                for _ in range(3)]
+    assert statuses[0] == 401 and statuses[-1] == 429
+
+
+def test_check_async_leaves_the_loop_free(user):
+    checker = PasswordChecker(workers=1)
+
+    async def login_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        results = [await checker.check_async(user, 'secret'), await checker.check_async(None, 'secret')]
+        ticker.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(login_while_ticking())
+    assert results == [True, False]
+    assert ticks > 0
+
+
+def test_check_async_refuses_when_the_queue_is_full(user):
+    checker = PasswordChecker(workers=1, max_pending=1)
+    blocked = checker._submit(user, 'secret')
+    with pytest.raises(LoginBusy):
+        asyncio.run(checker.check_async(user, 'secret'))
+    assert blocked.result()
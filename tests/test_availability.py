@@ -0,0 +1,41 @@
+from conftest import add_event, add_resource, allocate, at
+
+URL = '/api/resources/availability'
+
+
+def test_free_slots_skip_short_gaps_and_find_a_common_slot(client):
+    first, second = add_resource('First'), add_resource('Second')
+    allocate(add_event('Early', at(1, 8, 30), at(1, 9)), first)
+    allocate(add_event('Long', at(1, 9, 30), at(1, 12)), first)
+    allocate(add_event('Middle', at(1, 10), at(1, 11)), second)
+    add_resource('Projector', resource_type='equipment')
+
+    response = client.get(URL, query_string={
+        'start': '2030-01-01T08:00', 'end': '2030-01-01T13:00', 'duration': 60, 'resource_type': 'room', 'count': 2})
+    assert response.status_code == 200
+    resources = {resource['resource_id']: resource for resource in response.json['resources']}
+    assert set(resources) == {first.resource_id, second.resource_id}
+    assert resources[first.resource_id]['free'] == [['2030-01-01T12:00:00', '2030-01-01T13:00:00']]
+    assert resources[first.resource_id]['booked_hours'] == 3.0
+    assert resources[second.resource_id]['free'] == [
+        ['2030-01-01T08:00:00', '2030-01-01T10:00:00'], ['2030-01-01T11:00:00', '2030-01-01T13:00:00']]
+    assert response.json['earliest_slot'] == {
+        'start': '2030-01-01T12:00:00', 'end': '2030-01-01T13:00:00',
+        'resource_ids': [first.resource_id, second.resource_id]}
+
+
+def test_no_common_slot(client):
+    resource = add_resource()
+    allocate(add_event('All day', at(1, 0), at(2, 0)), resource)
+
+    response = client.get(URL, query_string={
+        'start': '2030-01-01T08:00', 'end': '2030-01-01T18:00', 'resource_ids': resource.resource_id, 'count': 1})
+    assert response.json['resources'][0]['free'] == []
+    assert response.json['earliest_slot'] is None
+
+
+def test_bad_parameters(client):
+    assert client.get(URL, query_string={'start': 'soon', 'end': '2030-01-01T18:00'}).status_code == 400
+    assert client.get(URL, query_string={
+        'start': '2030-01-01T18:00', 'end': '2030-01-01T08:00', 'resource_type': 'room'}).status_code == 400
+    assert client.get(URL, query_string={'start': '2030-01-01T08:00', 'end': '2030-01-01T18:00'}).status_code == 400
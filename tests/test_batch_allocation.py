@@ -0,0 +1,49 @@
+from conftest import add_event, add_resource, allocate, at
+from models import EventResourceAllocation
+
+
+def allocations(resource):
+    return EventResourceAllocation.query.filter_by(resource_id=resource.resource_id).count()
+
+
+def test_batch_rejects_pairs_that_overlap_each_other(client, user, token):
+    resource = add_resource()
+    first = add_event('First', at(1, 9), at(1, 10), user)
+    second = add_event('Second', at(1, 9, 30), at(1, 10, 30), user)
+    third = add_event('Third', at(1, 11), at(1, 12), user)
+
+    response = client.post('/api/events/allocations/batch', headers={'Authorization': f'Bearer {token}'}, json={
+        'allocations': [{'event_id': event.event_id, 'resource_id': resource.resource_id}
+                        for event in (second, first, third)]})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['results']] == ['conflict', 'allocated', 'allocated']
+    assert allocations(resource) == 2
+
+
+def test_batch_reports_bad_pairs_and_existing_bookings(client, user, token):
+    resource = add_resource()
+    booked = add_event('Booked', at(1, 9), at(1, 10), user)
+    allocate(booked, resource)
+    clashing = add_event('Clashing', at(1, 9, 30), at(1, 10, 30), user)
+
+    response = client.post('/api/events/allocations/batch', headers={'Authorization': f'Bearer {token}'}, json={
+        'allocations': [
+            {'event_id': 999, 'resource_id': resource.resource_id},
+            {'event_id': clashing.event_id, 'resource_id': 999},
+            {'event_id': booked.event_id, 'resource_id': resource.resource_id},
+            {'event_id': clashing.event_id, 'resource_id': resource.resource_id},
+        ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['status'] for result in results] == ['error', 'error', 'error', 'conflict']
+    assert results[3]['conflicting_event_id'] == booked.event_id
+    assert response.json['allocated'] == 0
+    assert allocations(resource) == 1
+
+
+def test_batch_rejects_malformed_bodies(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.post('/api/events/allocations/batch', headers=headers, json={}).status_code == 400
+    response = client.post('/api/events/allocations/batch', headers=headers,
+                           json={'allocations': [{'event_id': 'x', 'resource_id': 1}]})
+    assert response.status_code == 400
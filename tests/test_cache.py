@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import add_event, at
+from models import db
+
+
+@pytest.fixture
+def settings():
+    return {'CACHE_BACKEND': 'memory'}
+
+
+def test_etag_and_cache_hit(client, user):
+    add_event('Cached', at(1, 9), at(1, 10), user)
+
+    first = client.get('/api/events/')
+    assert first.headers['X-Cache'] == 'MISS'
+    second = client.get('/api/events/')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+
+    not_modified = client.get('/api/events/', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304
+
+
+def test_api_write_invalidates(client, user, token):
+    event = add_event('Before', at(1, 9), at(1, 10), user)
+    client.get(f'/api/events/{event.event_id}')
+
+    response = client.put(f'/api/events/{event.event_id}', json={'title': 'After'},
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    response = client.get(f'/api/events/{event.event_id}')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json['title'] == 'After'
+
+
+def test_write_outside_the_app_invalidates(client, user):
+    add_event('Before', at(1, 9), at(1, 10), user)
+    assert client.get('/api/events/').headers['X-Cache'] == 'MISS'
+
+    # As the archive and import scripts do: straight to the database, no invalidate().
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE event SET title = 'After'"))
+
+    response = client.get('/api/events/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'After' in response.get_data(as_text=True)
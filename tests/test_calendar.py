@@ -0,0 +1,44 @@
+from conftest import add_event, at
+
+HOUR = 3600
+
+
+def calendar(client, start, end, **params):
+    return client.get('/calendar/data', query_string={'start': start, 'end': end, **params})
+
+
+def test_day_buckets_split_events_at_midnight(client):
+    late = add_event('Late', at(1, 22), at(2, 2))
+    daily = add_event('Daily', at(1, 9), at(1, 10), recurrence_rule='FREQ=DAILY;COUNT=2')
+    add_event('Outside', at(5, 9), at(5, 10))
+
+    response = calendar(client, '2030-01-01T00:00', '2030-01-03T00:00')
+    assert response.status_code == 200
+    data = response.json
+    assert data['buckets'] == [0, 24 * HOUR]
+    assert sorted(data['events']['event_id']) == sorted([late.event_id, daily.event_id])
+    assert len(data['occurrences']['event']) == 3
+
+    titles = [data['events']['title'][data['occurrences']['event'][o]] for o in data['segments']['occurrence']]
+    assert list(zip(data['segments']['bucket'], titles, data['segments']['start'], data['segments']['end'])) == [
+        (0, 'Daily', 9 * HOUR, 10 * HOUR),
+        (0, 'Late', 22 * HOUR, 24 * HOUR),
+        (1, 'Late', 24 * HOUR, 26 * HOUR),
+        (1, 'Daily', 33 * HOUR, 34 * HOUR),
+    ]
+
+
+def test_week_buckets_start_on_mondays(client):
+    add_event('Weekend', at(5, 20), at(7, 8))
+
+    data = calendar(client, '2030-01-01T00:00', '2030-01-15T00:00', bucket='week').json
+    # 2030-01-01 is a Tuesday.
+    assert data['buckets'] == [0, 6 * 24 * HOUR, 13 * 24 * HOUR]
+    assert data['segments']['bucket'] == [0, 1]
+
+
+def test_bad_windows(client):
+    assert calendar(client, '2030-01-02T00:00', '2030-01-01T00:00').status_code == 400
+    assert calendar(client, '2030-01-01T00:00', '2030-01-02T00:00', bucket='year').status_code == 400
+    assert client.get('/calendar/data').status_code == 400
+    assert client.get('/calendar', query_string={'month': '2030-01'}).status_code == 200
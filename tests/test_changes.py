@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from conftest import add_event, add_resource, allocate, at
+from models import db
+from utils.changes import compact_changes
+
+
+@pytest.fixture
+def settings():
+    return {'CHANGE_STREAM_POLL_SECONDS': 0.05, 'CHANGE_STREAM_MAX_SECONDS': 0.3}
+
+
+def feed(client, cursor=None, **params):
+    response = client.get('/api/changes/', query_string={'since': cursor or '', **params})
+    assert response.status_code == 200
+    return response.json
+
+
+def test_delta_sync_with_tombstones(client):
+    kept = add_event('Kept', at(1, 9), at(1, 10))
+    dropped = add_event('Dropped', at(2, 9), at(2, 10))
+    resource = add_resource()
+    allocation = allocate(kept, resource)
+
+    first = feed(client)
+    assert [(change['type'], change['id']) for change in first['changes']] == [
+        ('event', kept.event_id), ('event', dropped.event_id), ('resource', resource.resource_id),
+        ('event_resource_allocation', allocation.allocation_id)]
+    assert feed(client, first['cursor'])['changes'] == []
+
+    kept.title = 'Renamed'
+    db.session.delete(dropped)
+    db.session.commit()
+
+    delta = feed(client, first['cursor'])['changes']
+    assert [(change['id'], change['deleted']) for change in delta] == [
+        (kept.event_id, False), (dropped.event_id, True)]
+    assert delta[0]['data']['title'] == 'Renamed'
+    assert delta[1]['data'] is None and not delta[1]['archived']
+
+
+def test_pages_follow_the_cursor(client):
+    events = [add_event(f'Event {i}', at(1, 9), at(1, 10)) for i in range(3)]
+
+    seen, cursor, has_more = [], None, True
+    while has_more:
+        page = feed(client, cursor, limit=2)
+        seen += [change['id'] for change in page['changes']]
+        cursor, has_more = page['cursor'], page['has_more']
+    assert seen == [event.event_id for event in events]
+
+
+def test_compaction_expires_old_cursors(client):
+    event = add_event('Gone', at(1, 9), at(1, 10))
+    cursor = feed(client)['cursor']
+    add_event('Stays', at(1, 9), at(1, 10))
+    db.session.delete(event)
+    db.session.commit()
+
+    with db.engine.begin() as conn:
+        assert compact_changes(conn, tombstone_days=-1) == 2
+
+    response = client.get('/api/changes/', query_string={'since': cursor})
+    assert response.status_code == 410
+    assert [change['data']['title'] for change in feed(client)['changes']] == ['Stays']
+
+
+def test_bad_cursor_and_limit(client):
+    assert client.get('/api/changes/', query_string={'since': 'garbage'}).status_code == 400
+    assert client.get('/api/changes/', query_string={'limit': 0}).status_code == 400
+
+
+def messages(response):
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+def test_stream_resumes_from_last_event_id(client):
+    cursor = feed(client)['cursor']
+    event = add_event('Streamed', at(1, 9), at(1, 10))
+
+    response = client.get('/api/changes/stream', headers={'Last-Event-ID': cursor})
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data(as_text=True).startswith('retry: 50\n\n')
+    [(name, event_id, data)] = messages(response)
+    assert name == 'changes'
+    assert [change['id'] for change in data['changes']] == [event.event_id]
+    assert event_id == data['cursor']
+
+
+def test_stream_without_cursor_starts_at_the_head(client):
+    add_event('Old', at(1, 9), at(1, 10))
+
+    [(name, event_id, data)] = messages(client.get('/api/changes/stream'))
+    assert name == 'ready'
+    assert feed(client, data['cursor'])['changes'] == []
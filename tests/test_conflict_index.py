@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from conftest import add_event, add_resource, allocate, at
+from models import db, EventResourceAllocation
+from utils.conflict_checker import (
+    _ResourceBookings,
+    find_conflict_sql,
+    get_conflict_index,
+    has_resource_conflict,
+    unindex_allocation,
+)
+
+
+def test_max_length_shrinks_when_longest_booking_is_removed():
+    bookings = _ResourceBookings()
+    bookings.add(at(1, 9), at(1, 10), 1)
+    bookings.add(at(1, 0), at(20, 0), 2)
+    bookings.add(at(2, 9), at(2, 11), 3)
+    assert bookings.max_length == timedelta(days=19) // timedelta(microseconds=1)
+
+    bookings.remove(at(1, 0), at(20, 0), 2)
+    assert bookings.max_length == timedelta(hours=2) // timedelta(microseconds=1)
+    assert bookings.overlapping(at(5, 9), at(5, 10)) is None
+    assert bookings.overlapping(at(2, 10), at(2, 12)) == 3
+
+
+def test_loaded_lengths_are_sorted(app):
+    resource = add_resource()
+    for day, hours in [(1, 5), (2, 1), (3, 3)]:
+        allocate(add_event(f'E{day}', at(day, 8), at(day, 8 + hours)), resource)
+
+    get_conflict_index().load()
+    bookings = get_conflict_index()._resources[resource.resource_id]
+    assert list(bookings.lengths) == sorted(bookings.lengths)
+    assert bookings.max_length == timedelta(hours=5) // timedelta(microseconds=1)
+
+
+def test_index_agrees_with_sql_after_removal(app):
+    resource = add_resource()
+    long_event = add_event('Long', at(1, 0), at(10, 0))
+    short_event = add_event('Short', at(11, 9), at(11, 10))
+    allocation = allocate(long_event, resource)
+    allocate(short_event, resource)
+    get_conflict_index().load()
+
+    db.session.delete(db.session.get(EventResourceAllocation, allocation.allocation_id))
+    db.session.commit()
+    unindex_allocation(resource.resource_id, long_event)
+
+    for start, end in [(at(5, 9), at(5, 10)), (at(11, 9, 30), at(11, 11)), (at(11, 10), at(11, 11))]:
+        expected = find_conflict_sql(resource.resource_id, start, end)
+        assert has_resource_conflict(resource.resource_id, start, end) == expected
+
+
+def test_sync_drops_only_the_resources_that_changed(app):
+    index = get_conflict_index()
+    changed, untouched = add_resource('Changed'), add_resource('Untouched')
+    event = add_event('Booked', at(1, 9), at(1, 10))
+    allocate(event, untouched)
+    index.sync(0)
+    index.load()
+    assert has_resource_conflict(untouched.resource_id, at(1, 9), at(1, 10))
+    assert index.find_conflict(changed.resource_id, at(2, 9), at(2, 10)) is None
+
+    # Written behind the index's back, as another worker would.
+    other = add_event('Other worker', at(2, 9), at(2, 10))
+    allocate(other, changed)
+    index.sync(0)
+    assert set(index._resources) == {untouched.resource_id}
+    assert index.find_conflict(changed.resource_id, at(2, 9), at(2, 10)) == other.event_id
+
+    event.end_time = at(1, 12)
+    db.session.commit()
+    index.sync(0)
+    assert untouched.resource_id not in index._resources
+    assert index.find_conflict(untouched.resource_id, at(1, 11), at(1, 12)) == event.event_id
+
+
+def test_booking_rejects_an_overlap_but_not_a_touching_event(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    resource = add_resource()
+    allocate(add_event('Booked', at(1, 9), at(1, 10), user), resource)
+    overlapping = add_event('Overlapping', at(1, 9, 30), at(1, 11), user)
+    touching = add_event('Touching', at(1, 10), at(1, 11), user)
+
+    response = client.post(f'/api/events/{overlapping.event_id}/allocate-resource',
+                           json={'resource_id': resource.resource_id}, headers=headers)
+    assert response.status_code == 400
+    assert response.json['conflicting_event'] == 'Booked'
+    response = client.post(f'/api/events/{touching.event_id}/allocate-resource',
+                           json={'resource_id': resource.resource_id}, headers=headers)
+    assert response.status_code == 200
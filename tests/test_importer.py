@@ -0,0 +1,112 @@
+import io
+
+from conftest import add_event, add_resource, allocate, at
+from models import Event, EventResourceAllocation
+from utils.importer import import_events, parse_records
+
+
+def run_import(data, file_format, **kwargs):
+    return import_events(parse_records(io.BytesIO(data), file_format), **kwargs)
+
+
+def post_import(client, token, data, file_format, **params):
+    return client.post('/api/events/import', query_string={'format': file_format, **params}, data=data,
+                       headers={'Authorization': f'Bearer {token}'})
+
+
+def test_csv_upload(client, user, token):
+    resource = add_resource()
+    response = post_import(client, token, (
+        b'title,start_time,end_time,resource_ids\n'
+        b'Standup,2030-01-01T09:00,2030-01-01T09:15,' + str(resource.resource_id).encode() + b'\n'
+        b'Review,2030-01-01T10:00,2030-01-01T11:00,\n'), 'csv', allocate='true')
+    assert response.status_code == 200
+    assert response.json == {'imported': 2, 'allocated': 1, 'failed': []}
+    assert [event.user_id for event in Event.query.all()] == [user.user_id, user.user_id]
+
+
+def test_json_array_and_ndjson(app, user):
+    assert run_import(
+        b'[{"title": "One", "start_time": "2030-01-01T09:00", "end_time": "2030-01-01T10:00"},'
+        b' {"title": "Two", "start_time": "2030-01-02T09:00", "end_time": "2030-01-02T10:00"}]', 'json',
+    )['imported'] == 2
+
+    result = run_import(
+        b'{"title": "Three", "start_time": "2030-01-03T09:00", "end_time": "2030-01-03T10:00"}\n'
+        b'\n'
+        b'{"title": "Four", "start_time": "2030-01-04T09:00"\n'
+        b'{"title": "Five", "start_time": "2030-01-05T09:00", "end_time": "2030-01-05T10:00"}\n', 'json')
+    assert result['imported'] == 2
+    assert [failure['row'] for failure in result['failed']] == [3]
+    assert Event.query.count() == 4
+
+
+def test_ics(app, user):
+    result = run_import(
+        b'BEGIN:VCALENDAR\r\n'
+        b'BEGIN:VEVENT\r\n'
+        b'SUMMARY:Planning\\, weekly\r\n'
+        b'DESCRIPTION:Line one\\nline\r\n'
+        b'  two\r\n'
+        b'DTSTART:20300107T090000Z\r\n'
+        b'DTEND:20300107T100000Z\r\n'
+        b'RRULE:FREQ=WEEKLY;COUNT=4\r\n'
+        b'EXDATE:20300114T090000Z\r\n'
+        b'END:VEVENT\r\n'
+        b'BEGIN:VEVENT\r\n'
+        b'SUMMARY:Broken\r\n'
+        b'DTSTART:not-a-date\r\n'
+        b'END:VEVENT\r\n'
+        b'END:VCALENDAR\r\n', 'ics', user_id=user.user_id)
+    assert result['imported'] == 1
+    assert result['failed'][0]['row'] == 2 and 'DTSTART' in result['failed'][0]['error']
+
+    event = Event.query.one()
+    assert event.title == 'Planning, weekly'
+    assert event.description == 'Line one\nline two'
+    assert (event.start_time, event.end_time) == (at(7, 9), at(7, 10))
+    assert event.recurrence_rule == 'FREQ=WEEKLY;COUNT=4'
+
+
+def test_malformed_json_array_is_a_failed_row(client, user, token):
+    response = post_import(client, token, b'[{"title": "One"}, {"title": "Two"', 'json')
+    assert response.status_code == 200
+    assert response.json['imported'] == 0
+    assert response.json['failed'][0]['row'] == 1
+    assert 'Invalid JSON array' in response.json['failed'][0]['error']
+
+
+def test_non_string_fields_are_failed_rows(client, user, token):
+    response = post_import(client, token, (
+        b'{"title": 5, "start_time": "2030-01-01T09:00", "end_time": "2030-01-01T10:00"}\n'
+        b'{"title": "Ok", "description": ["x"], "start_time": "2030-01-01T09:00", "end_time": "2030-01-01T10:00"}\n'
+        b'{"title": "Ok", "recurrence_rule": 7, "start_time": "2030-01-01T09:00", "end_time": "2030-01-01T10:00"}\n'
+        b'{"title": "Ok", "start_time": 5, "end_time": "2030-01-01T10:00"}\n'
+        b'"just a string"\n'), 'json')
+    assert response.status_code == 200
+    assert response.json['imported'] == 0
+    assert [failure['error'] for failure in response.json['failed']][:3] == [
+        'title must be a string', 'description must be a string', 'recurrence_rule must be a string']
+    assert len(response.json['failed']) == 5
+
+
+def test_undecodable_input_keeps_earlier_rows(app, user):
+    result = run_import(
+        b'title,start_time,end_time\n'
+        b'Fine,2030-01-01T09:00,2030-01-01T10:00\n' + b'x' * 70000 + b'\xff\n', 'csv', batch_size=1)
+    assert result['imported'] == 1
+    assert 'Unreadable input' in result['failed'][-1]['error']
+
+
+def test_conflicting_rows_are_not_allocated(app, user):
+    resource = add_resource()
+    allocate(add_event('Booked', at(1, 9), at(1, 10), user), resource)
+
+    result = run_import((
+        'title,start_time,end_time,resource_ids\n'
+        'Clash,2030-01-01T09:30,2030-01-01T10:30,{0}\n'
+        'Later,2030-01-01T10:00,2030-01-01T11:00,{0}\n'.format(resource.resource_id)).encode(), 'csv',
+        user_id=user.user_id, allocate=True)
+    assert result['imported'] == 1 and result['allocated'] == 1
+    assert result['failed'][0]['row'] == 1
+    assert EventResourceAllocation.query.count() == 2
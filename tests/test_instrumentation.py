@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import add_event, add_resource, allocate, at
+from utils.instrumentation import QueryBudgetExceeded
+
+BUDGET = 5
+ROUTES = [
+    '/api/events/?per_page=50',
+    '/api/events/?cursor=',
+    '/api/events/1',
+    '/api/events/allocations',
+    '/api/events/occurrences?start=2030-01-01T00:00&end=2030-02-01T00:00',
+    '/api/resources/availability?start=2030-01-01T00:00&end=2030-01-02T00:00&resource_type=room',
+    '/api/changes/',
+    '/events',
+    '/allocate',
+    '/calendar/data?start=2030-01-01&end=2030-02-01',
+]
+
+
+@pytest.fixture
+def settings():
+    return {'QUERY_BUDGET': BUDGET, 'QUERY_BUDGET_ACTION': 'raise', 'METRICS_ENDPOINT_ENABLED': True}
+
+
+def seed(user, count):
+    for i in range(count):
+        allocate(add_event(f'Event {i}', at(1 + i % 20, 9), at(1 + i % 20, 10), user), add_resource(f'Room {i}'))
+
+
+@pytest.mark.parametrize('url', ROUTES)
+def test_routes_stay_within_the_query_budget(client, user, token, url):
+    # Thirty rows with allocations: a per-row query would blow the budget.
+    seed(user, 30)
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    # QUERY_BUDGET_ACTION='raise' fails the request when it goes over.
+    assert response.status_code == 200
+
+
+def test_over_budget_raises(app, client, user):
+    seed(user, 3)
+    app.config['QUERY_BUDGET'] = 1
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/allocate')
+
+
+def test_metrics_endpoints_are_off_by_default(tmp_path):
+    from app import create_app
+    from conftest import TestConfig
+
+    class config(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "off.db"}'
+
+    client = create_app(config).test_client()
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics/queries').status_code == 404
+
+
+def test_metrics_token(app, client):
+    assert client.get('/metrics').status_code == 200
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    for url in ('/metrics', '/metrics/queries'):
+        assert client.get(url).status_code == 401
+        assert client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get(url, headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
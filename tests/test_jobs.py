@@ -0,0 +1,26 @@
+from conftest import add_event, add_resource, allocate, at
+from models import Job
+from utils.jobs import submit_job
+
+PARAMS = {'start_date': '2030-01-01', 'end_date': '2030-01-31'}
+
+
+def test_inline_report_writes_no_job_row(client, user):
+    allocate(add_event('Booked', at(1, 9), at(1, 11), user), add_resource())
+
+    response = client.post('/report', data={'start_date': '2030-01-01', 'end_date': '2030-01-31'})
+    assert response.status_code == 200
+    assert Job.query.count() == 0
+
+    job = submit_job('report', PARAMS, wait=True)
+    assert job.status == 'done'
+    assert b'"upcoming": 1' in job.result
+    assert Job.query.count() == 0
+
+
+def test_inline_report_reuses_a_background_result(app):
+    add_resource()
+    queued = submit_job('report', PARAMS)
+    app.extensions['job_queue'].executor.shutdown(wait=True)
+
+    assert submit_job('report', PARAMS, wait=True).job_id == queued.job_id
@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+
+from conftest import add_event, add_resource, allocate, at
+from models import db, EventResourceAllocation
+from utils.allocations import allocate_many
+
+
+def allocations(resource):
+    return EventResourceAllocation.query.filter_by(resource_id=resource.resource_id).count()
+
+
+def test_concurrent_bookings_of_one_slot(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    resource = add_resource()
+    body = {'resource_id': resource.resource_id}
+    events = [add_event(f'Meeting {i}', at(1, 9), at(1, 10, 30), user).event_id for i in range(6)]
+    barrier = threading.Barrier(len(events))
+    statuses = []
+
+    def book(event_id):
+        barrier.wait()
+        response = client.post(f'/api/events/{event_id}/allocate-resource', json=body, headers=headers)
+        statuses.append(response.status_code)
+
+    workers = [threading.Thread(target=book, args=(event_id,)) for event_id in events]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(statuses) == [200] + [400] * (len(events) - 1)
+    assert allocations(resource) == 1
+
+
+def test_a_fully_rejected_batch_releases_the_write_lock(app, user):
+    resource = add_resource()
+    allocate(add_event('Booked', at(1, 9), at(1, 10), user), resource)
+    clashing = add_event('Clashing', at(1, 9), at(1, 10), user)
+
+    results = allocate_many([(clashing.event_id, resource.resource_id)])
+    assert [result['status'] for result in results] == ['conflict']
+
+    other = sqlite3.connect(db.engine.url.database, timeout=0)
+    try:
+        other.execute('BEGIN IMMEDIATE')
+        other.rollback()
+    finally:
+        other.close()
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import add_event, add_resource, allocate, at
+from models import db
+from utils.migrations import MIGRATIONS, DuplicateAllocations, current_version, pending_migrations, query_plans, upgrade
+
+
+def test_upgrade_applies_every_migration_once(app):
+    assert current_version() == MIGRATIONS[-1][0]
+    assert pending_migrations() == []
+    assert upgrade() == []
+
+    plans = query_plans()
+    assert any('ix_event_start_end' in step for step in plans['events in date range'])
+    assert any('ix_event_user_id' in step for step in plans['events by owner'])
+
+
+def test_duplicate_allocations_stop_the_upgrade(app):
+    resource = add_resource()
+    event = add_event('Event', at(1, 9), at(1, 10))
+    allocate(event, resource)
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP INDEX uq_allocation_event_resource'))
+        conn.execute(text('INSERT INTO event_resource_allocation (event_id, resource_id) VALUES (:e, :r)'),
+                     {'e': event.event_id, 'r': resource.resource_id})
+        conn.execute(text('DELETE FROM schema_migrations'))
+
+    with pytest.raises(DuplicateAllocations) as error:
+        upgrade()
+    assert error.value.pairs == [(event.event_id, resource.resource_id, 2)]
+    assert f'event {event.event_id}/resource {resource.resource_id}' in str(error.value)
+
+    with db.engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM event_resource_allocation')).scalar() == 2
+    assert current_version() == 0
@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import add_event, at
+from utils.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    raw_cursor([{'dt': '2030-01-01T09:00:00'}, 1, 2]),
+    raw_cursor([{'dt': '2030-01-01T09:00:00'}]),
+    raw_cursor([{'when': '2030-01-01T09:00:00'}, 1]),
+    raw_cursor([{'dt': 'yesterday'}, 1]),
+    raw_cursor([{'dt': 5}, 1]),
+    raw_cursor([[1], 1]),
+    raw_cursor({'dt': '2030-01-01T09:00:00'}),
+    raw_cursor(['Title', 1]),
+    raw_cursor([{'dt': '2030-01-01T09:00:00'}, 'x']),
+    raw_cursor([{'dt': '2030-01-01T09:00:00'}, True]),
+    'not base64!',
+    raw_cursor('x')[:-1] + '*',
+])
+def test_malformed_cursor_is_a_400(client, cursor):
+    response = client.get('/api/events/', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'Invalid cursor!'}
+
+
+def test_title_cursor_needs_a_string(client):
+    cursor = encode_cursor([at(1, 9), 1])
+    response = client.get('/api/events/', query_string={'cursor': cursor, 'sort_by': 'title'})
+    assert response.status_code == 400
+
+
+def test_cursor_pages_cover_every_event_once(client):
+    for i in range(7):
+        add_event(f'Event {i}', at(1 + i % 3, 9), at(1 + i % 3, 10))
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        body = client.get('/api/events/', query_string={'cursor': cursor, 'per_page': 3}).get_json()
+        seen.extend(event['event_id'] for event in body['events'])
+        cursor = body['next_cursor']
+    assert sorted(seen) == list(range(1, 8))
+
+
+def test_decode_cursor_checks_length():
+    assert decode_cursor(encode_cursor([5]), length=1) == [5]
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([5]))
+
+
+def test_cursor_datetimes_with_an_offset_are_read_as_utc():
+    (value,) = decode_cursor(raw_cursor([{'dt': '2030-01-01T10:00:00+02:00'}]), length=1)
+    assert value == datetime(2030, 1, 1, 8)
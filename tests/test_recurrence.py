@@ -0,0 +1,156 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_event, add_resource, allocate, at
+from models import db, Event
+from utils.conflict_checker import find_event_conflict
+from utils.importer import import_events, parse_records
+from utils.recurrence import MAX_COUNT, Recurrence, apply_recurrence, parse_rule
+
+
+def weekly_with_exceptions(start, count=52, skipped=20):
+    exceptions = [start + timedelta(weeks=k) for k in range(1, skipped + 1)]
+    return Recurrence(start, start + timedelta(hours=1), f'FREQ=WEEKLY;COUNT={count}', exceptions)
+
+
+def test_series_with_many_exceptions_against_a_single_event():
+    series = weekly_with_exceptions(datetime(2030, 1, 7, 9))
+    clear = Recurrence(datetime(2030, 1, 8, 9), datetime(2030, 1, 8, 10))
+    hit = Recurrence(datetime(2030, 7, 1, 9, 30), datetime(2030, 7, 1, 10))
+    skipped = Recurrence(datetime(2030, 1, 14, 9), datetime(2030, 1, 14, 10))
+
+    assert not series.conflicts_with(clear)
+    assert not clear.conflicts_with(series)
+    assert series.conflicts_with(hit)
+    assert not series.conflicts_with(skipped)
+
+
+def test_open_ended_series_with_a_huge_common_cycle():
+    start = datetime(2030, 1, 1, 9)
+    daily = Recurrence(start, start + timedelta(hours=1), 'FREQ=DAILY;INTERVAL=7919', [start])
+    weekly = Recurrence(start + timedelta(days=1), start + timedelta(days=1, hours=1),
+                        'FREQ=WEEKLY;INTERVAL=7907', [start + timedelta(days=1)])
+    # Must not raise OverflowError; whether they meet before year 9999 is incidental.
+    assert daily.conflicts_with(weekly) in (True, False)
+
+
+def test_occurrences_stop_at_the_end_of_the_calendar():
+    start = datetime(9999, 12, 29, 23)
+    series = Recurrence(start, start + timedelta(hours=2), 'FREQ=DAILY')
+    assert len(list(series.occurrences())) == 2
+
+
+def test_booking_a_series_with_many_exceptions(client, user, token):
+    resource = add_resource()
+    allocate(add_event('Single', at(8, 9), at(8, 10)), resource)
+    start = at(7, 9)
+    series = add_event(
+        'Standup', start, start + timedelta(hours=1), user,
+        recurrence_rule='FREQ=WEEKLY;COUNT=52',
+        recurrence_exceptions=','.join((start + timedelta(weeks=k)).isoformat() for k in range(1, 21)),
+    )
+    series.recurrence_end = Recurrence.for_event(series).series_end()
+    db.session.commit()
+
+    assert find_event_conflict(resource.resource_id, series) is None
+    response = client.post(f'/api/events/{series.event_id}/allocate-resource',
+                           json={'resource_id': resource.resource_id},
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('rule', [
+    'FREQ=WEEKLY;BYDAY=MO,WE',
+    'FREQ=MONTHLY;BYMONTHDAY=15',
+    'FREQ=MONTHLY;BYSETPOS=-1',
+    'FREQ=DAILY;WKST=MO',
+])
+def test_unsupported_rule_parts_are_rejected(rule):
+    with pytest.raises(ValueError, match='Unsupported rule part'):
+        parse_rule(rule)
+
+
+def test_supported_rule_parts_still_parse():
+    assert parse_rule('RRULE:FREQ=WEEKLY;INTERVAL=2;UNTIL=20300630T235959') == (
+        'WEEKLY', 2, None, datetime(2030, 6, 30, 23, 59, 59))
+
+
+def test_api_and_importer_reject_unsupported_rules(client, user, token):
+    response = client.post('/api/events/', json={
+        'title': 'Gym', 'start_time': '2030-01-07T09:00', 'end_time': '2030-01-07T10:00',
+        'recurrence_rule': 'FREQ=WEEKLY;BYDAY=MO,WE',
+    }, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+    assert 'Unsupported rule part BYDAY' in response.get_json()['message']
+
+    records = parse_records(io.BytesIO(
+        b'title,start_time,end_time,recurrence_rule\n'
+        b'Gym,2030-01-07T09:00,2030-01-07T10:00,FREQ=WEEKLY;BYDAY=MO\n'), 'csv')
+    result = import_events(records, user_id=user.user_id)
+    assert result['imported'] == 0
+    assert 'BYDAY' in result['failed'][0]['error']
+    assert Event.query.count() == 0
+
+
+@pytest.mark.parametrize('rule', [f'FREQ=DAILY;COUNT={MAX_COUNT + 1}', 'FREQ=DAILY;COUNT=0', 'FREQ=DAILY;UNTIL=99990101'])
+def test_count_and_until_are_bounded(rule):
+    with pytest.raises(ValueError):
+        parse_rule(rule)
+
+
+@pytest.mark.parametrize('start, rule', [
+    (datetime(2030, 1, 31, 9), f'FREQ=MONTHLY;INTERVAL=100;COUNT={MAX_COUNT}'),
+    (datetime(2030, 1, 15, 9), f'FREQ=MONTHLY;INTERVAL=100;COUNT={MAX_COUNT}'),
+    (datetime(2030, 1, 1, 9), f'FREQ=WEEKLY;INTERVAL=1000;COUNT={MAX_COUNT}'),
+    (datetime(9999, 12, 30, 9), 'FREQ=DAILY;COUNT=3'),
+])
+def test_series_past_the_calendar_are_rejected(start, rule):
+    with pytest.raises(ValueError):
+        Recurrence(start, start + timedelta(hours=1), rule).series_end()
+
+
+def test_series_end_of_the_longest_allowed_series():
+    start = datetime(2030, 1, 31, 9)
+    monthly = Recurrence(start, start + timedelta(hours=1), f'FREQ=MONTHLY;COUNT={MAX_COUNT}')
+    # Only 7 months in 12 have a 31st.
+    assert monthly.series_end().year == 2030 + (MAX_COUNT * 12 // 7) // 12
+    daily = Recurrence(start, start + timedelta(hours=1), f'FREQ=DAILY;COUNT={MAX_COUNT}')
+    assert daily.series_end() == start + timedelta(days=MAX_COUNT - 1, hours=1)
+
+
+def test_monthly_series_end_steps_back_to_a_real_day():
+    start = datetime(2032, 2, 29, 9)
+    leap_days = Recurrence(start, start + timedelta(hours=1), 'FREQ=MONTHLY;INTERVAL=12;UNTIL=20400101')
+    assert leap_days.series_end() == datetime(2036, 2, 29, 10)
+    month_ends = Recurrence(datetime(2030, 1, 31, 9), datetime(2030, 1, 31, 10), 'FREQ=MONTHLY;UNTIL=20300330')
+    assert month_ends.series_end() == datetime(2030, 1, 31, 10)
+
+
+def test_api_rejects_series_past_the_calendar(client, user, token):
+    response = client.post('/api/events/', headers={'Authorization': f'Bearer {token}'}, json={
+        'title': 'Forever', 'start_time': '2030-01-31T09:00:00', 'end_time': '2030-01-31T10:00:00',
+        'recurrence_rule': 'FREQ=MONTHLY;COUNT=100000'})
+    assert response.status_code == 400
+    assert Event.query.count() == 0
+
+
+def test_series_booking_conflicts_with_a_later_occurrence(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    resource = add_resource()
+    allocate(add_event('Offsite', at(15, 8), at(15, 18), user), resource)
+    series = add_event('Standup', at(1, 9), at(1, 9, 15), user)
+    apply_recurrence(series, 'FREQ=DAILY;COUNT=30')
+    db.session.commit()
+
+    response = client.post(f'/api/events/{series.event_id}/allocate-resource',
+                           json={'resource_id': resource.resource_id}, headers=headers)
+    assert response.status_code == 400
+    assert response.json['conflicting_event'] == 'Offsite'
+
+    apply_recurrence(series, exceptions=[at(15, 9).isoformat()])
+    db.session.commit()
+    response = client.post(f'/api/events/{series.event_id}/allocate-resource',
+                           json={'resource_id': resource.resource_id}, headers=headers)
+    assert response.status_code == 200
@@ -0,0 +1,47 @@
+from conftest import add_event, at
+from models import db
+
+
+def search(client, q, **params):
+    response = client.get('/events/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return response.json['results']
+
+
+def test_prefix_terms_and_title_ranking(client):
+    in_description = add_event('Weekly sync', at(1, 9), at(1, 10), description='Project review with the team')
+    in_title = add_event('Project review', at(2, 9), at(2, 10))
+    add_event('Project kickoff', at(3, 9), at(3, 10))
+
+    results = search(client, 'proj rev')
+    assert [result['event_id'] for result in results] == [in_title.event_id, in_description.event_id]
+    assert '<mark>' in results[1]['snippet']
+
+
+def test_index_follows_edits_and_deletes(client):
+    event = add_event('Budget planning', at(1, 9), at(1, 10))
+    assert len(search(client, 'budget')) == 1
+
+    event.title = 'Roadmap planning'
+    db.session.commit()
+    assert search(client, 'budget') == []
+    assert len(search(client, 'roadmap')) == 1
+
+    db.session.delete(event)
+    db.session.commit()
+    assert search(client, 'roadmap') == []
+
+
+def test_window_limits_results_and_markup_is_escaped(client):
+    add_event('<b>Offsite</b>', at(1, 9), at(1, 10))
+    weekly = add_event('Offsite prep', at(1, 11), at(1, 12), recurrence_rule='FREQ=WEEKLY;COUNT=4')
+
+    results = search(client, 'offsite', start='2030-01-15T00:00', end='2030-01-16T00:00')
+    assert [result['event_id'] for result in results] == [weekly.event_id]
+    assert all('<b>' not in result['snippet'] for result in search(client, 'offsite'))
+
+
+def test_queries_without_words_find_nothing(client):
+    add_event('Anything', at(1, 9), at(1, 10))
+    assert search(client, '"*:()') == []
+    assert client.get('/events/search', query_string={'q': 'x', 'start': 'later'}).status_code == 400
@@ -0,0 +1,207 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import contains_eager
+from models import db, Event, Resource, EventResourceAllocation
+from utils.conflict_checker import (
+    find_event_conflict,
+    get_conflict_index,
+    has_resource_conflict,
+    index_allocation,
+    sweep_conflicts
+)
+from utils.locking import lock_resources, with_lock_retry
+from utils.rollup import record_allocation, record_bookings
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def allocation_page(user_id=None, after_id=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page of allocations with their event and resource loaded.
+
+    Pages are keyed on allocation_id: pass the returned next_cursor as
+    after_id to fetch the following page. next_cursor is None on the last
+    page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (
+        EventResourceAllocation.query
+        .outerjoin(Event, Event.event_id == EventResourceAllocation.event_id)
+        .outerjoin(Resource, Resource.resource_id == EventResourceAllocation.resource_id)
+        .options(
+            contains_eager(EventResourceAllocation.event),
+            contains_eager(EventResourceAllocation.resource)
+        )
+    )
+    if user_id is not None:
+        query = query.filter(Event.user_id == user_id)
+    if after_id is not None:
+        query = query.filter(EventResourceAllocation.allocation_id > after_id)
+
+    rows = query.order_by(EventResourceAllocation.allocation_id).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].allocation_id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def count_allocations(user_id=None):
+    query = db.session.query(db.func.count(EventResourceAllocation.allocation_id))
+    if user_id is not None:
+        query = query.join(Event, Event.event_id == EventResourceAllocation.event_id).filter(Event.user_id == user_id)
+    return query.scalar()
+
+
+def allocation_to_dict(alloc):
+    event = alloc.event
+    resource = alloc.resource
+    return {
+        'allocation_id': alloc.allocation_id,
+        'event_id': event.event_id if event else None,
+        'event_title': event.title if event else 'Deleted event',
+        'event_start': event.start_time.isoformat() if event and event.start_time else None,
+        'event_end': event.end_time.isoformat() if event and event.end_time else None,
+        'event_description': event.description if event and event.description else None,
+        'resource_id': resource.resource_id if resource else None,
+        'resource_name': resource.resource_name if resource else 'Deleted resource',
+        'resource_type': resource.resource_type if resource and resource.resource_type else None
+    }
+
+
+def _book_resource(event_id, resource_id):
+    lock_resources([resource_id])
+    event = db.session.get(Event, event_id, populate_existing=True)
+    conflict = find_event_conflict(resource_id, event)
+    if conflict:
+        db.session.rollback()
+        return None, conflict
+
+    allocation = EventResourceAllocation(event_id=event_id, resource_id=resource_id)
+    db.session.add(allocation)
+    record_allocation(resource_id, event)
+    db.session.commit()
+    index_allocation(resource_id, event)
+    return allocation, None
+
+
+def book_resource(event, resource_id):
+    """Allocate resource_id to event unless it is booked at an overlapping time.
+
+    The authoritative conflict check and the insert run in one transaction
+    under lock_resources, so concurrent requests in any worker cannot both
+    book the same slot. Returns (allocation, None) or (None, conflicting_event).
+    """
+    # Series are always checked against the database under the lock.
+    if not event.recurrence_rule:
+        conflict = has_resource_conflict(resource_id, event.start_time, event.end_time)
+        if conflict:
+            return None, conflict
+    return with_lock_retry(_book_resource, event.event_id, resource_id)
+
+
+def allocate_many(pairs):
+    """Allocate many (event_id, resource_id) pairs in one transaction.
+
+    Pairs that overlap an existing booking, or an earlier-starting pair of
+    the same request, are rejected; everything else is committed together.
+    Recurring events are checked one by one after the single events are
+    inserted. Returns one result dict per input pair, in input order.
+    """
+    return with_lock_retry(_allocate_many, pairs)
+
+
+def _allocate_many(pairs):
+    lock_resources({resource_id for _, resource_id in pairs})
+    results = [{'event_id': event_id, 'resource_id': resource_id} for event_id, resource_id in pairs]
+    event_ids = {event_id for event_id, _ in pairs}
+    resource_ids = {resource_id for _, resource_id in pairs}
+
+    events = {}
+    series_ids = set()
+    for event_id, start_time, end_time, rule in (
+        db.session.query(Event.event_id, Event.start_time, Event.end_time, Event.recurrence_rule)
+        .filter(Event.event_id.in_(event_ids))
+    ):
+        events[event_id] = (start_time, end_time)
+        if rule:
+            series_ids.add(event_id)
+    resources = {r for (r,) in db.session.query(Resource.resource_id).filter(Resource.resource_id.in_(resource_ids))}
+    allocated = set(
+        db.session.query(EventResourceAllocation.event_id, EventResourceAllocation.resource_id)
+        .filter(
+            EventResourceAllocation.event_id.in_(event_ids),
+            EventResourceAllocation.resource_id.in_(resource_ids)
+        )
+    )
+
+    requests = []
+    series_requests = []
+    seen = set()
+    for i, (event_id, resource_id) in enumerate(pairs):
+        result = results[i]
+        if event_id not in events:
+            result.update(status='error', message='Event not found')
+        elif resource_id not in resources:
+            result.update(status='error', message='Resource not found')
+        elif (event_id, resource_id) in allocated:
+            result.update(status='error', message='Resource is already allocated to this event')
+        elif (event_id, resource_id) in seen:
+            result.update(status='error', message='Duplicate pair in request')
+        elif event_id in series_ids:
+            seen.add((event_id, resource_id))
+            series_requests.append((i, event_id, resource_id))
+        else:
+            seen.add((event_id, resource_id))
+            requests.append((i, resource_id) + events[event_id])
+
+    conflicts = sweep_conflicts(requests)
+    accepted = []
+    for i, resource_id, start_time, end_time in requests:
+        result = results[i]
+        if i in conflicts:
+            kind, ref = conflicts[i]
+            conflicting_event_id = ref if kind == 'existing' else results[ref]['event_id']
+            result.update(
+                status='conflict',
+                message='Resource is already booked during this time',
+                conflicting_event_id=conflicting_event_id
+            )
+        else:
+            accepted.append((resource_id, result['event_id'], start_time, end_time))
+
+    if accepted:
+        db.session.execute(insert(EventResourceAllocation), [
+            {'event_id': event_id, 'resource_id': resource_id} for resource_id, event_id, _, _ in accepted
+        ])
+        record_bookings((resource_id, start_time, end_time) for resource_id, _, start_time, end_time in accepted)
+
+    # Inserted above but not committed, so these checks see the batch too.
+    series_accepted = []
+    for i, event_id, resource_id in series_requests:
+        event = db.session.get(Event, event_id)
+        conflict = find_event_conflict(resource_id, event)
+        if conflict:
+            results[i].update(
+                status='conflict',
+                message='Resource is already booked during this time',
+                conflicting_event_id=conflict.event_id
+            )
+            continue
+        db.session.execute(insert(EventResourceAllocation), [{'event_id': event_id, 'resource_id': resource_id}])
+        series_accepted.append((i, event, resource_id))
+
+    if accepted or series_accepted:
+        db.session.commit()
+
+        index = get_conflict_index()
+        for resource_id, event_id, start_time, end_time in accepted:
+            index.add(resource_id, event_id, start_time, end_time)
+        for _, event, resource_id in series_accepted:
+            index_allocation(resource_id, event)
+    else:
+        # Release lock_resources' write lock now, not at request teardown.
+        db.session.rollback()
+
+    for i, resource_id, _, _ in requests:
+        if i not in conflicts:
+            results[i].update(status='allocated', message='Resource allocated successfully')
+    for i, _, _ in series_accepted:
+        results[i].update(status='allocated', message='Resource allocated successfully')
+    return results
@@ -0,0 +1,354 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from models import db, Event, Resource, User
+from utils.allocations import book_resource
+from utils.archive import ALL_EVENTS, event_sources, reaches_archive
+from utils.auth import get_login_throttle
+from utils.availability import booked_hours, earliest_common_slot, find_availability
+from utils.cache import invalidate
+from utils.changes import ChangeStream, CursorExpired, change_feed_supported, changes_since
+from utils.pagination import CountCache, decode_cursor, encode_cursor, keyset_filter
+from utils.reporting import resource_utilization
+from utils.search import search_filter
+
+# Parsing and answers shared by the Flask blueprints and the async app
+# (routes/async_api.py), so both reject the same input with the same
+# messages and return the same bodies. Parsers take any query-string
+# mapping and raise ValueError with the 400 message; answers return
+# (body, status).
+
+MAX_PER_PAGE = 100
+CHANGES_PER_PAGE = 500
+MAX_CHANGES_PER_PAGE = 1000
+# Query-string keys that do not change an event list's total.
+_PAGING_KEYS = ('cursor', 'per_page', 'page')
+
+event_counts = CountCache(ttl=60)
+
+
+def parse_datetime(value):
+    """An ISO datetime as naive UTC, the way times are stored; ValueError when malformed."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def event_list_params(args):
+    """Filters, sort and page of the event list; unparseable dates are ignored."""
+    params = {
+        'q': args.get('q'),
+        'organizer': args.get('organizer'),
+        'start': None,
+        'end': None,
+        'sort_by': args.get('sort_by', 'start_time'),
+        'descending': args.get('sort_order', 'asc').lower() == 'desc',
+        # Keyset mode when present, even empty (the first page).
+        'cursor': args.get('cursor'),
+        'after': None,
+        'total': args.get('total', 'none'),
+        'count_key': tuple(sorted((k, v) for k, v in args.items() if k not in _PAGING_KEYS)),
+    }
+    for key, name in (('start', 'start_date'), ('end', 'end_date')):
+        if args.get(name):
+            try:
+                params[key] = parse_datetime(args[name])
+            except ValueError:
+                pass
+    try:
+        params['page'] = int(args.get('page', 1))
+        params['per_page'] = min(int(args.get('per_page', 10)), MAX_PER_PAGE)
+    except ValueError:
+        raise ValueError('page and per_page must be integers!')
+    if params['cursor']:
+        try:
+            sort_value, last_id = params['after'] = decode_cursor(params['cursor'])
+        except ValueError:
+            raise ValueError('Invalid cursor!')
+        # The sort value has to fit the column this request sorts on.
+        sort_type = str if params['sort_by'] == 'title' else datetime
+        if not isinstance(sort_value, sort_type) or not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise ValueError('Invalid cursor!')
+    return params
+
+
+def availability_params(args):
+    try:
+        window_start = parse_datetime(args['start'])
+        window_end = parse_datetime(args['end'])
+        duration = timedelta(minutes=int(args.get('duration', 60)))
+        resource_ids = [int(r) for r in args.get('resource_ids', '').split(',') if r.strip()]
+        count = int(args['count']) if args.get('count') else None
+    except (KeyError, ValueError):
+        raise ValueError('start and end (ISO datetimes) are required; duration is in minutes')
+
+    if window_end <= window_start or duration <= timedelta(0):
+        raise ValueError('end must be after start and duration must be positive')
+
+    resource_type = args.get('resource_type')
+    if not resource_ids and not resource_type:
+        raise ValueError('Pass resource_ids or resource_type')
+    return {
+        'start': window_start,
+        'end': window_end,
+        'duration': duration,
+        'resource_ids': resource_ids,
+        'resource_type': resource_type,
+        'count': count,
+    }
+
+
+def report_params(args):
+    try:
+        start = datetime.fromisoformat(args['start_date']).date() if args.get('start_date') else None
+        end = datetime.fromisoformat(args['end_date']).date() if args.get('end_date') else None
+    except ValueError:
+        raise ValueError('start_date and end_date must be ISO dates')
+    return start, end
+
+
+def allocation_params(data):
+    resource_id = (data or {}).get('resource_id')
+    if not resource_id:
+        raise ValueError('Resource ID required')
+    try:
+        return int(resource_id)
+    except (TypeError, ValueError):
+        raise ValueError('resource_id must be an integer')
+
+
+def login_params(data):
+    username = (data.get('username') or '').strip()
+    password = data.get('password') or ''
+    if not username or not password:
+        raise ValueError('username and password are required')
+    return username, password
+
+
+def _login_keys(username, remote_addr):
+    return f'user:{username.lower()}', f'ip:{remote_addr}'
+
+
+def login_refused(username, remote_addr):
+    """(body, status, headers) when too many logins failed lately, else None."""
+    retry_after = get_login_throttle().retry_after(*_login_keys(username, remote_addr))
+    if retry_after:
+        return {'message': 'Too many failed logins, try again later'}, 429, {'Retry-After': str(retry_after)}
+    return None
+
+
+def login_user(username):
+    return User.query.filter_by(username=username).first()
+
+
+def login_result(username, remote_addr, user, valid):
+    """(body, status, headers) once the password check answered valid."""
+    throttle = get_login_throttle()
+    account, client = _login_keys(username, remote_addr)
+    if not valid:
+        throttle.failure(account, client)
+        return {'message': 'Invalid username or password'}, 401, {}
+
+    throttle.reset(account)
+    expires_in = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    token = user.generate_auth_token(current_app.config['JWT_SECRET_KEY'], expires_in)
+    return {
+        'token': token,
+        'token_type': 'Bearer',
+        'expires_in': int(expires_in.total_seconds()),
+        'user_id': user.user_id
+    }, 200, {}
+
+
+def change_feed_params(args, last_event_id=None):
+    """since (a feed cursor, None when absent) and page size; Last-Event-ID wins over since."""
+    token = last_event_id or args.get('since')
+    try:
+        limit = min(int(args.get('limit', CHANGES_PER_PAGE)), MAX_CHANGES_PER_PAGE)
+    except ValueError:
+        raise ValueError('limit must be an integer!')
+    if limit < 1:
+        raise ValueError('limit must be positive!')
+    since = None
+    if token:
+        try:
+            (since,) = decode_cursor(token, length=1)
+        except ValueError:
+            raise ValueError('Invalid cursor!')
+        if not isinstance(since, int) or isinstance(since, bool) or since < 0:
+            raise ValueError('Invalid cursor!')
+    return {'since': since, 'limit': limit}
+
+
+def _feed_cursor(seq):
+    return encode_cursor([seq])
+
+
+def list_events(params):
+    # Archived events are read only when the range reaches back before the cutoff.
+    events, _ = event_sources(params['start'])
+    query = db.session.query(events)
+
+    if params['q']:
+        matches = search_filter(params['q'], events)
+        if matches is not None:
+            query = query.filter(matches)
+
+    if params['organizer']:
+        query = query.join(User, User.user_id == events.user_id).filter(
+            User.username.ilike(f"%{params['organizer']}%"))
+
+    if params['start'] is not None:
+        query = query.filter(events.start_time >= params['start'])
+    if params['end'] is not None:
+        query = query.filter(events.start_time <= params['end'])
+
+    sort_column = events.title if params['sort_by'] == 'title' else events.start_time
+    descending = params['descending']
+    query = query.order_by(sort_column.desc() if descending else sort_column.asc())
+
+    if params['cursor'] is not None:
+        return _events_by_cursor(query, events, sort_column, params), 200
+
+    paginated_events = query.paginate(page=params['page'], per_page=params['per_page'], error_out=False)
+    return {
+        'events': [event.to_dict() for event in paginated_events.items],
+        'total': paginated_events.total,
+        'page': paginated_events.page,
+        'per_page': paginated_events.per_page,
+        'pages': paginated_events.pages
+    }, 200
+
+
+def _events_by_cursor(query, events, sort_column, params):
+    # Keyset mode: ?cursor= (empty for the first page) returns next_cursor
+    # instead of page numbers, so every page costs the same.
+    base_query = query
+    descending = params['descending']
+    per_page = params['per_page']
+    if params['after'] is not None:
+        sort_value, last_id = params['after']
+        query = query.filter(keyset_filter(sort_column, events.event_id, sort_value, last_id, descending))
+
+    query = query.order_by(events.event_id.desc() if descending else events.event_id.asc())
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, sort_column.key), last.event_id])
+
+    body = {
+        'events': [event.to_dict() for event in rows],
+        'next_cursor': next_cursor,
+        'per_page': per_page
+    }
+
+    if params['total'] == 'exact':
+        body['total'] = base_query.order_by(None).count()
+    elif params['total'] == 'estimate':
+        body['total'] = event_counts.get_or_count(params['count_key'], base_query.order_by(None).count)
+    return body
+
+
+def event_detail(event_id):
+    event = db.session.get(Event, event_id)
+    if event is None and reaches_archive(None):
+        event = db.session.query(ALL_EVENTS).filter(ALL_EVENTS.event_id == event_id).first()
+    if event is None:
+        return {'message': 'Event not found!'}, 404
+    return event.to_dict(), 200
+
+
+def allocate_event_resource(event_id, resource_id):
+    event = db.session.get(Event, event_id)
+    resource = db.session.get(Resource, resource_id)
+    if event is None or resource is None:
+        return {'message': 'Event not found!' if event is None else 'Resource not found!'}, 404
+
+    _, conflict_event = book_resource(event, resource.resource_id)
+
+    if conflict_event:
+        return {
+            'message': 'Resource conflict detected!',
+            'resource': resource.resource_name,
+            'conflicting_event': conflict_event.title,
+            'conflict_time': f'{conflict_event.start_time} - {conflict_event.end_time}'
+        }, 400
+
+    invalidate(f'event:{event_id}')
+    return {
+        'message': 'Resource allocated successfully!',
+        'event': event.title,
+        'resource': resource.resource_name
+    }, 200
+
+
+def availability(params):
+    window_start, window_end, duration = params['start'], params['end'], params['duration']
+    free = find_availability(window_start, window_end, duration, params['resource_ids'], params['resource_type'])
+    booked = booked_hours(list(free), window_start, window_end)
+
+    body = {
+        'start': window_start.isoformat(),
+        'end': window_end.isoformat(),
+        'duration_minutes': int(duration.total_seconds() // 60),
+        'resources': [
+            {
+                'resource_id': resource_id,
+                'booked_hours': booked[resource_id],
+                'free': [[s.isoformat(), e.isoformat()] for s, e in intervals]
+            }
+            for resource_id, intervals in free.items()
+        ]
+    }
+
+    if params['count']:
+        slot = earliest_common_slot(free, params['count'], duration)
+        body['earliest_slot'] = None if slot is None else {
+            'start': slot[0].isoformat(),
+            'end': (slot[0] + duration).isoformat(),
+            'resource_ids': slot[1]
+        }
+    return body, 200
+
+
+def utilization_report(start, end):
+    rows, _ = resource_utilization(start, end)
+    return [{
+        'resource_id': row['resource_id'],
+        'resource_name': row['name'],
+        'resource_type': row['type'],
+        'total_hours_utilized': row['hours'],
+        'total_bookings': row['bookings'],
+        'upcoming_bookings': row['upcoming'],
+        'percent_utilized': row['percent']
+    } for row in rows], 200
+
+
+def change_feed(params):
+    """Rows changed since the cursor; no cursor means everything."""
+    if not change_feed_supported():
+        return {'message': 'The change feed needs a SQLite database'}, 501
+    try:
+        changes, last_seq, has_more = changes_since(params['since'] or 0, params['limit'])
+    except CursorExpired as e:
+        return {'message': str(e)}, 410
+    return {'changes': changes, 'cursor': _feed_cursor(last_seq), 'has_more': has_more}, 200
+
+
+def change_stream(params):
+    """A ChangeStream for the cursor; no cursor streams from the current head."""
+    if not change_feed_supported():
+        return {'message': 'The change feed needs a SQLite database'}, 501
+    config = current_app.config
+    return ChangeStream(
+        params['since'],
+        _feed_cursor,
+        page_size=params['limit'],
+        interval=config.get('CHANGE_STREAM_POLL_SECONDS', 1.0),
+        heartbeat=config.get('CHANGE_STREAM_HEARTBEAT_SECONDS', 15.0),
+        max_seconds=config.get('CHANGE_STREAM_MAX_SECONDS', 300.0),
+    ), 200
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import aliased
+from models import db, Event, EventArchive, EventResourceAllocation, EventResourceAllocationArchive
+from utils.migrations import ARCHIVE_CUTOFF_ID
+
+EPOCH = datetime(1970, 1, 1)
+
+# Rows that may move: single events over before the cutoff, and series
+# whose last occurrence is. Both tables are AUTOINCREMENT (migration 11),
+# so an archived id is never handed out again.
+ARCHIVABLE = """
+    ((recurrence_rule IS NULL AND end_time < :before)
+     OR (recurrence_rule IS NOT NULL AND recurrence_end < :before))
+"""
+
+
+def _union(model, archive_model):
+    # model mapped over model UNION ALL its archive; columns taken by name,
+    # so the archive's own extras (archived_at) are left out.
+    columns = model.__table__.c
+    live = select(*columns)
+    archived = select(*(archive_model.__table__.c[column.key] for column in columns))
+    return aliased(model, live.union_all(archived).subquery(f'{model.__tablename__}_all'))
+
+
+ALL_EVENTS = _union(Event, EventArchive)
+ALL_ALLOCATIONS = _union(EventResourceAllocation, EventResourceAllocationArchive)
+
+
+def archive_cutoff():
+    """Events ending before this may be archived; None until something was."""
+    seconds = db.session.execute(
+        text('SELECT version FROM data_version WHERE id = :id'), {'id': ARCHIVE_CUTOFF_ID}).scalar()
+    return EPOCH + timedelta(seconds=seconds) if seconds else None
+
+
+def reaches_archive(range_start):
+    """Whether a range starting at range_start (None: unbounded) can include archived rows."""
+    cutoff = archive_cutoff()
+    return cutoff is not None and (range_start is None or range_start < cutoff)
+
+
+def event_sources(range_start):
+    """(events, allocations) entities to query for a range starting at range_start.
+
+    Event and EventResourceAllocation while the range is past the archive
+    cutoff; otherwise the same classes mapped over a UNION ALL with their
+    archive tables, so a query written against them reads both. Rows
+    loaded through the union are read-only: archived ones have no row
+    to update.
+    """
+    if reaches_archive(range_start):
+        return ALL_EVENTS, ALL_ALLOCATIONS
+    return Event, EventResourceAllocation
+
+
+def archive_events(before, batch_size=1000):
+    """Move events over before `before`, with their allocations, to the archive tables.
+
+    The cutoff is raised first, so readers start including the archive
+    before any row leaves; then rows move batch_size events at a time,
+    each batch in its own short write transaction. Deletes are logged
+    as 'archive' in the change feed rather than as tombstones. Returns
+    (events, allocations) moved.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'UPDATE data_version SET version = :seconds WHERE id = :id AND version < :seconds'
+        ), {'seconds': int((before - EPOCH).total_seconds()), 'id': ARCHIVE_CUTOFF_ID})
+
+    moved_events = moved_allocations = 0
+    while True:
+        with db.engine.begin() as conn:
+            events, allocations = _archive_batch(conn, before, batch_size)
+        moved_events += events
+        moved_allocations += allocations
+        if events < batch_size:
+            return moved_events, moved_allocations
+
+
+def _in_batch(sql, *params):
+    return text(sql).bindparams(bindparam('ids', expanding=True), *params)
+
+
+def _archive_batch(conn, before, batch_size):
+    sqlite = conn.dialect.name == 'sqlite'
+    if sqlite:
+        # Take the write lock before reading the batch, like lock_resources.
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+    ids = conn.execute(text(
+        f'SELECT event_id FROM event WHERE {ARCHIVABLE} ORDER BY event_id LIMIT :limit'
+    ).bindparams(bindparam('before', type_=db.DateTime)), {'before': before, 'limit': batch_size}).scalars().all()
+    if not ids:
+        return 0, 0
+
+    now = datetime.utcnow()
+    head = conn.execute(text('SELECT MAX(seq) FROM change_log')).scalar() or 0
+    event_columns = ', '.join(column.key for column in Event.__table__.c)
+    allocation_columns = ', '.join(column.key for column in EventResourceAllocation.__table__.c)
+    params = {'ids': ids, 'now': now}
+    stamp = bindparam('now', type_=db.DateTime)
+    conn.execute(_in_batch(
+        f'INSERT INTO event_archive ({event_columns}, archived_at) '
+        f'SELECT {event_columns}, :now FROM event WHERE event_id IN :ids', stamp
+    ), params)
+    allocations = conn.execute(_in_batch(
+        f'INSERT INTO event_resource_allocation_archive ({allocation_columns}, archived_at) '
+        f'SELECT {allocation_columns}, :now FROM event_resource_allocation WHERE event_id IN :ids', stamp
+    ), params).rowcount
+    conn.execute(_in_batch('DELETE FROM event_resource_allocation WHERE event_id IN :ids'), params)
+    conn.execute(_in_batch('DELETE FROM event WHERE event_id IN :ids'), params)
+    if sqlite:
+        conn.execute(text(
+            "UPDATE change_log SET op = 'archive' WHERE seq > :head AND op = 'delete'"
+        ), {'head': head})
+    return len(ids), allocations
@@ -0,0 +1,68 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from models import db
+from utils.database import DEFAULT_SQLITE_PRAGMAS, _set_pragmas
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_url(url):
+    """The same database as url, through its async driver."""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver for {backend} databases (supported: {", ".join(ASYNC_DRIVERS)})')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def async_engine_options(url, config):
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'pool_size': config.get('ASYNC_DB_POOL_SIZE', 20),
+        'max_overflow': config.get('ASYNC_DB_MAX_OVERFLOW', 0),
+        'pool_timeout': config.get('ASYNC_DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+class AsyncDatabase:
+    """The app's database behind an async engine, for the async API.
+
+    run(func, *args) awaits func(*args) on a pooled AsyncSession: func is
+    ordinary sync code (the helpers in utils.api) that sees the session as
+    db.session inside an app context, while every statement it issues goes
+    through the async driver. A request waiting on the database, or on a
+    free connection, yields the event loop instead of holding a thread.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        with app.app_context():
+            # Instance-relative SQLite paths are already resolved here.
+            url = db.engine.url
+        self.engine = create_async_engine(async_url(url), **async_engine_options(url, app.config))
+        if url.get_backend_name() == 'sqlite':
+            pragmas = {**DEFAULT_SQLITE_PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {})}
+            event.listen(self.engine.sync_engine, 'connect', _set_pragmas(pragmas, read_only=False))
+        # Same query class as db.session, so db.session.query(...).paginate() works.
+        self.sessions = async_sessionmaker(self.engine, query_cls=db.Query)
+
+    async def run(self, func, *args):
+        async with self.sessions() as session:
+            return await session.run_sync(self._call, func, args)
+
+    def _call(self, session, func, args):
+        with self.app.app_context():
+            db.session.registry.set(session)
+            try:
+                return func(*args)
+            finally:
+                db.session.registry.clear()
+
+    async def dispose(self):
+        await self.engine.dispose()
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, text
+from werkzeug.security import check_password_hash, generate_password_hash
+from models import db, User
+from utils.migrations import AUTH_VERSION_ID
+
+DEFAULT_TOKEN_CACHE_SIZE = 10000
+DEFAULT_TOKEN_CACHE_TTL = 300
+
+
+class LoginBusy(RuntimeError):
+    """Every password hashing slot is taken; the client should retry shortly."""
+
+
+class TokenIdentity:
+    """The authenticated user as seen by API views, without a database row."""
+
+    __slots__ = ('user_id', 'username')
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+
+    @property
+    def id(self):
+        return self.user_id
+
+
+def token_key(token):
+    # Raw tokens never sit in memory longer than the request that carried them.
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    """LRU of verified tokens, keyed by token hash.
+
+    An entry lives until the token expires or max_ttl passes, whichever
+    is first. Deleting a user or changing their password bumps a counter
+    in data_version (a trigger, so remove_users.py and other processes
+    count too); the cache polls it at most every revalidate seconds and
+    starts over when it moves.
+    """
+
+    def __init__(self, max_entries=DEFAULT_TOKEN_CACHE_SIZE, max_ttl=DEFAULT_TOKEN_CACHE_TTL, revalidate=1.0):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = defaultdict(set)
+        self._version = None
+        self._checked = 0.0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, identity = item
+            if expires <= time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return identity
+
+    def set(self, key, identity, expires):
+        with self._lock:
+            self._entries[key] = (min(expires, time.time() + self.max_ttl), identity)
+            self._entries.move_to_end(key)
+            self._by_user[identity.user_id].add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        _, identity = self._entries.pop(key)
+        keys = self._by_user[identity.user_id]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[identity.user_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in self._by_user.pop(user_id, ()):
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sync(self):
+        """Drop everything if a user was deleted or changed password since the last check."""
+        now = time.monotonic()
+        if now - self._checked < self.revalidate:
+            return
+        self._checked = now
+        version = auth_version()
+        if version != self._version:
+            if self._version is not None:
+                self.clear()
+            self._version = version
+
+
+def auth_version():
+    """Counter bumped by triggers on user deletes and password changes.
+
+    None where the triggers are not installed (non-SQLite databases); the
+    cache then relies on its TTL and on in-process invalidation.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    return db.session.execute(
+        text('SELECT version FROM data_version WHERE id = :id'), {'id': AUTH_VERSION_ID}).scalar()
+
+
+def get_token_cache():
+    extensions = current_app.extensions
+    if 'token_cache' not in extensions:
+        config = current_app.config
+        extensions['token_cache'] = TokenCache(
+            config.get('TOKEN_CACHE_SIZE', DEFAULT_TOKEN_CACHE_SIZE),
+            config.get('TOKEN_CACHE_TTL', DEFAULT_TOKEN_CACHE_TTL),
+            config.get('TOKEN_REVALIDATE_SECONDS', 1.0),
+        )
+    return extensions['token_cache']
+
+
+def authenticate_token(token):
+    """TokenIdentity for a valid bearer token, or None.
+
+    A cache hit costs a hash and a dict lookup; only the first request
+    with a token decodes it and loads the user.
+    """
+    cache = get_token_cache()
+    cache.sync()
+    key = token_key(token)
+    identity = cache.get(key)
+    if identity is not None:
+        return identity
+    payload = User.decode_auth_token(token, current_app.config['JWT_SECRET_KEY'])
+    if payload is None:
+        return None
+    user = db.session.get(User, int(payload['sub']))
+    if user is None or payload.get('pwd') != user.auth_token_stamp():
+        return None
+    identity = TokenIdentity(user.user_id, user.username)
+    cache.set(key, identity, payload['exp'])
+    return identity
+
+
+@event.listens_for(User, 'after_delete')
+def _forget_deleted_user(mapper, connection, target):
+    cache = current_app.extensions.get('token_cache') if has_app_context() else None
+    if cache is not None:
+        cache.invalidate_user(target.user_id)
+
+
+@event.listens_for(User.password_hash, 'set')
+def _forget_changed_password(target, value, oldvalue, initiator):
+    cache = current_app.extensions.get('token_cache') if has_app_context() else None
+    if cache is not None and target.user_id is not None:
+        cache.invalidate_user(target.user_id)
+
+
+class PasswordChecker:
+    """Runs password hash checks on a small pool of their own.
+
+    Hashing is deliberately slow. A burst of logins gets queued behind
+    `workers` threads (hashlib releases the GIL while hashing) instead of
+    occupying every request worker, and past `max_pending` queued checks
+    new logins are refused with LoginBusy rather than waiting. check()
+    still blocks the calling request thread until its hash is done;
+    check_async() awaits it, so the async API's loop keeps serving.
+    """
+
+    def __init__(self, workers=2, max_pending=16, timeout=10.0):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login')
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+        self._dummy_hash = None
+
+    def _submit(self, user, password):
+        if user is not None:
+            password_hash = user.password_hash
+        else:
+            if self._dummy_hash is None:
+                self._dummy_hash = generate_password_hash('')
+            password_hash = self._dummy_hash
+        if not self.slots.acquire(blocking=False):
+            raise LoginBusy('Too many logins in progress')
+        try:
+            future = self.executor.submit(check_password_hash, password_hash, password)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def check(self, user, password):
+        """user.check_password(password); unknown users (None) cost the same."""
+        future = self._submit(user, password)
+        try:
+            return future.result(self.timeout) and user is not None
+        except TimeoutError:
+            raise LoginBusy('Password check timed out')
+
+    async def check_async(self, user, password):
+        """check() for a coroutine: waits on the pool without holding a thread."""
+        future = self._submit(user, password)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout) and user is not None
+        except TimeoutError:
+            raise LoginBusy('Password check timed out')
+
+
+def get_password_checker():
+    extensions = current_app.extensions
+    if 'password_checker' not in extensions:
+        config = current_app.config
+        extensions['password_checker'] = PasswordChecker(
+            config.get('LOGIN_HASH_WORKERS', 2),
+            config.get('LOGIN_MAX_PENDING', 16),
+            config.get('LOGIN_HASH_TIMEOUT', 10.0),
+        )
+    return extensions['password_checker']
+
+
+class LoginThrottle:
+    """Sliding window of failed logins per username and per client address."""
+
+    # Past this many tracked keys, stale ones are swept on the next failure.
+    SWEEP_AT = 10000
+
+    def __init__(self, max_failures=5, window=300):
+        self.max_failures = max_failures
+        self.window = window
+        self._lock = threading.Lock()
+        self._failures = {}
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def retry_after(self, *keys):
+        """Seconds until another attempt is allowed for any of keys, or 0."""
+        now = time.monotonic()
+        wait = 0
+        with self._lock:
+            for key in keys:
+                attempts = self._recent(key, now)
+                if attempts and len(attempts) >= self.max_failures:
+                    wait = max(wait, attempts[0] + self.window - now)
+        return int(wait) + 1 if wait else 0
+
+    def failure(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > self.SWEEP_AT:
+                for stale in list(self._failures):
+                    self._recent(stale, now)
+            for key in keys:
+                self._recent(key, now)
+                self._failures.setdefault(key, deque()).append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+def get_login_throttle():
+    extensions = current_app.extensions
+    if 'login_throttle' not in extensions:
+        config = current_app.config
+        extensions['login_throttle'] = LoginThrottle(
+            config.get('LOGIN_MAX_FAILURES', 5), config.get('LOGIN_FAILURE_WINDOW', 300))
+    return extensions['login_throttle']
@@ -0,0 +1,90 @@
+from flask import current_app
+from models import db, Resource
+from utils.archive import reaches_archive
+from utils.conflict_checker import bookings_in_window, get_conflict_index, merged_bookings
+
+
+def _use_index(window_start):
+    # The snapshot holds live bookings only; windows reaching the archive read the database.
+    return current_app.config.get('CONFLICT_INDEX_ENABLED', True) and not reaches_archive(window_start)
+
+
+def _bookings(resource_ids, window_start, window_end):
+    if _use_index(window_start):
+        return get_conflict_index().window(resource_ids, window_start, window_end)
+    return bookings_in_window(resource_ids, window_start, window_end)
+
+
+def free_intervals(bookings, window_start, window_end, duration):
+    """Gaps of at least duration between start-sorted bookings inside the window."""
+    free = []
+    cursor = window_start
+    for start_time, end_time, _ in merged_bookings(bookings):
+        if start_time - cursor >= duration:
+            free.append((cursor, min(start_time, window_end)))
+        cursor = max(cursor, end_time)
+        if cursor >= window_end:
+            break
+    if window_end - cursor >= duration:
+        free.append((cursor, window_end))
+    return free
+
+
+def earliest_common_slot(free_by_resource, count, duration):
+    """Earliest start at which count resources are all free for duration.
+
+    A resource can host a slot starting at t when one of its free intervals
+    [a, b] has a <= t <= b - duration, so each interval becomes a closed
+    range of valid starts and the ranges are swept in time order.
+    Returns (start, resource_ids) or None.
+    """
+    points = []
+    for resource_id, intervals in free_by_resource.items():
+        for start_time, end_time in intervals:
+            if end_time - start_time >= duration:
+                # Opening (0) sorts before closing (1) at the same instant.
+                points.append((start_time, 0, resource_id))
+                points.append((end_time - duration, 1, resource_id))
+    points.sort()
+
+    active = set()
+    for moment, closing, resource_id in points:
+        if closing:
+            active.discard(resource_id)
+            continue
+        active.add(resource_id)
+        if len(active) >= count:
+            return moment, sorted(active)[:count]
+    return None
+
+
+def find_availability(window_start, window_end, duration, resource_ids=None, resource_type=None):
+    """Free intervals per resource for the given ids and/or type, with one bookings query."""
+    query = db.session.query(Resource.resource_id)
+    if resource_ids:
+        query = query.filter(Resource.resource_id.in_(resource_ids))
+    if resource_type:
+        query = query.filter(Resource.resource_type == resource_type)
+    ids = [resource_id for (resource_id,) in query.order_by(Resource.resource_id)]
+
+    bookings = _bookings(ids, window_start, window_end)
+    return {
+        resource_id: free_intervals(bookings.get(resource_id, []), window_start, window_end, duration)
+        for resource_id in ids
+    }
+
+
+def booked_hours(resource_ids, window_start, window_end):
+    """{resource_id: hours booked inside the window}, bookings clipped to it."""
+    if _use_index(window_start):
+        seconds = get_conflict_index().booked_seconds(resource_ids, window_start, window_end)
+    else:
+        bookings = bookings_in_window(resource_ids, window_start, window_end)
+        seconds = {
+            resource_id: sum(
+                (min(end, window_end) - max(start, window_start)).total_seconds()
+                for start, end, _ in bookings.get(resource_id, [])
+            )
+            for resource_id in resource_ids
+        }
+    return {resource_id: round(value / 3600, 2) for resource_id, value in seconds.items()}
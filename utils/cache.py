@@ -0,0 +1,189 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+from utils.jobs import data_version
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryCache:
+    """Per-process LRU with a TTL on every entry.
+
+    Tag versions live outside the LRU so eviction can never roll one back
+    and bring a stale entry back to life.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache shared by every worker, on a redis-py compatible client.
+
+    Anything with get/set(ex=)/mget/incr works, so a local stand-in such
+    as fakeredis can replace the server in development.
+    """
+
+    def __init__(self, client, prefix='event-scheduler:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package (pip install redis)')
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        header, _, body = raw.partition(b'\n')
+        content_type, etag = json.loads(header)
+        return content_type, etag, body
+
+    def set(self, key, value, ttl):
+        content_type, etag, body = value
+        raw = json.dumps([content_type, etag]).encode() + b'\n' + body
+        self.client.set(self.prefix + key, raw, ex=max(1, int(ttl)))
+
+    def versions(self, tags):
+        if not tags:
+            return []
+        return [int(v or 0) for v in self.client.mget([self.prefix + 'tag:' + tag for tag in tags])]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.incr(self.prefix + 'tag:' + tag)
+
+    def clear(self):
+        # Bumping tags is enough; entries expire on their own.
+        pass
+
+
+def get_cache():
+    """The app's response cache, or None when CACHE_BACKEND is 'none'."""
+    extensions = current_app.extensions
+    if 'response_cache' not in extensions:
+        backend = current_app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'redis':
+            cache = RedisCache.from_url(current_app.config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+        elif backend == 'memory':
+            cache = MemoryCache(current_app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        else:
+            cache = None
+        extensions['response_cache'] = cache
+    return extensions['response_cache']
+
+
+def invalidate(*tags):
+    """Drop every cached response tagged with any of tags."""
+    cache = get_cache()
+    if cache is not None and tags:
+        cache.bump(tags)
+
+
+def _cache_key(tags, versions, view_args, version):
+    raw = json.dumps([
+        request.endpoint,
+        sorted(view_args.items()),
+        sorted(request.args.items(multi=True)),
+        list(zip(tags, versions)),
+        version
+    ], default=str)
+    return 'view:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _conditional(response):
+    if response.status_code == 200 and not response.direct_passthrough:
+        response.add_etag()
+        response = response.make_conditional(request)
+    return response
+
+
+def cached_view(*tags, ttl=None):
+    """Serve a GET view from the response cache, with ETag/If-None-Match.
+
+    Entries are keyed on endpoint, view arguments and query string. Tags
+    may use the view arguments, e.g. 'event:{event_id}'; invalidate() with
+    any of an entry's tags makes it unreachable. The key also holds the
+    data_version counter, which triggers bump on every write, so writes
+    that never call invalidate() (the archive and import CLIs, other
+    workers with their own MemoryCache) still miss. Versions are read
+    before the view runs, so a write that lands mid-render leaves the
+    entry stored under a version nobody asks for again. Pages rendered
+    while flash messages are pending are neither cached nor served from
+    the cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or request.method != 'GET' or '_flashes' in session:
+                return _conditional(make_response(view(*args, **kwargs)))
+
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            key = _cache_key(entry_tags, cache.versions(entry_tags), kwargs, data_version())
+            cached = cache.get(key)
+            if cached is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                response.add_etag()
+                cache.set(
+                    key,
+                    (response.content_type, response.get_etag()[0], response.get_data()),
+                    ttl or current_app.config.get('CACHE_TTL', DEFAULT_TTL)
+                )
+                response.headers['X-Cache'] = 'MISS'
+            else:
+                content_type, etag, body = cached
+                response = Response(body, content_type=content_type)
+                response.set_etag(etag)
+                response.headers['X-Cache'] = 'HIT'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
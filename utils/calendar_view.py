@@ -0,0 +1,109 @@
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
+from models import db, Event, EventArchive
+from utils.archive import event_sources
+from utils.recurrence import event_occurrences
+
+BUCKETS = ('day', 'week')
+
+
+def longest_single_event():
+    """Upper bound on the duration of any non-recurring event, or None.
+
+    On SQLite this is one seek on ix_event_duration; elsewhere None, and
+    windows fall back to an open-ended start_time range.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    days = max((
+        db.session.query(func.max(func.julianday(model.end_time) - func.julianday(model.start_time)))
+        .filter(model.recurrence_rule.is_(None))
+        .scalar() or 0
+    ) for model in (Event, EventArchive))
+    # julianday() is a float; a second of slack covers the rounding.
+    return timedelta(days=days) + timedelta(seconds=1)
+
+
+def bucket_bounds(window_start, window_end, bucket='day'):
+    """Bucket edges from window_start to window_end, at midnights or Mondays."""
+    bounds = [window_start]
+    day = window_start.date() + timedelta(days=1)
+    while True:
+        moment = datetime.combine(day, time.min)
+        if moment >= window_end:
+            break
+        if bucket == 'day' or day.weekday() == 0:
+            bounds.append(moment)
+        day += timedelta(days=1)
+    bounds.append(window_end)
+    return bounds
+
+
+def calendar_window(window_start, window_end, bucket='day'):
+    """Occurrences in [window_start, window_end) split into day or week buckets.
+
+    The payload is columnar. events holds one row per distinct event;
+    occurrences one row per occurrence (index into events, start, end);
+    segments one row per piece of an occurrence inside a bucket, sorted by
+    bucket then start, so an event crossing midnight appears in both days.
+    Times are seconds from window_start, occurrence times may fall outside
+    the window.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(BUCKETS)}')
+    if window_end <= window_start:
+        raise ValueError('end must be after start')
+
+    events, _ = event_sources(window_start)
+    query = db.session.query(events).options(load_only(
+        events.event_id, events.title, events.start_time, events.end_time,
+        events.recurrence_rule, events.recurrence_end, events.recurrence_exceptions
+    ))
+    occurrences = event_occurrences(window_start, window_end, query=query, longest=longest_single_event(),
+                                    events=events)
+    bounds = bucket_bounds(window_start, window_end, bucket)
+
+    def offset(moment):
+        return int((moment - window_start).total_seconds())
+
+    events = {'event_id': [], 'title': [], 'recurring': []}
+    rows = {}
+    occurrence_columns = {'event': [], 'start': [], 'end': []}
+    segments = []
+    for start, end, event in occurrences:
+        row = rows.get(event.event_id)
+        if row is None:
+            row = rows[event.event_id] = len(events['event_id'])
+            events['event_id'].append(event.event_id)
+            events['title'].append(event.title)
+            events['recurring'].append(bool(event.recurrence_rule))
+        occurrence = len(occurrence_columns['event'])
+        occurrence_columns['event'].append(row)
+        occurrence_columns['start'].append(offset(start))
+        occurrence_columns['end'].append(offset(end))
+
+        b = bisect_right(bounds, max(start, window_start)) - 1
+        while True:
+            segments.append((b, offset(max(start, bounds[b])), offset(min(end, bounds[b + 1])), occurrence))
+            b += 1
+            if b >= len(bounds) - 1 or bounds[b] >= end:
+                break
+
+    segments.sort()
+    return {
+        'start': window_start.isoformat(),
+        'end': window_end.isoformat(),
+        'bucket': bucket,
+        'buckets': [offset(moment) for moment in bounds[:-1]],
+        'events': events,
+        'occurrences': occurrence_columns,
+        'segments': {
+            'bucket': [s[0] for s in segments],
+            'start': [s[1] for s in segments],
+            'end': [s[2] for s in segments],
+            'occurrence': [s[3] for s in segments],
+        },
+    }
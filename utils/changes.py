@@ -0,0 +1,163 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+from models import db, ChangeLog, Event, EventResourceAllocation, Resource
+from utils.migrations import CHANGE_HORIZON_ID
+
+FEED_MODELS = {
+    'event': Event,
+    'resource': Resource,
+    'event_resource_allocation': EventResourceAllocation,
+}
+
+
+class CursorExpired(ValueError):
+    """The cursor is older than what compaction kept; refetch from the start."""
+
+
+def change_feed_supported():
+    # The log is written by SQLite triggers; other databases have none.
+    return db.engine.dialect.name == 'sqlite'
+
+
+def latest_seq():
+    return db.session.query(func.max(ChangeLog.seq)).scalar() or 0
+
+
+def change_horizon():
+    return db.session.execute(
+        text('SELECT version FROM data_version WHERE id = :id'), {'id': CHANGE_HORIZON_ID}).scalar() or 0
+
+
+def changes_since(since, limit):
+    """Current state of every row changed after seq since, oldest change first.
+
+    A row written several times appears once, at its latest seq, with its
+    present data; a row that is gone is a tombstone (deleted, no data),
+    marked archived when utils.archive moved it rather than a delete.
+    Returns (changes, last_seq, has_more); pass last_seq as the next since.
+    """
+    if since and since < change_horizon():
+        raise CursorExpired('Cursor expired, refetch from the start')
+
+    latest = func.max(ChangeLog.seq).label('seq')
+    # SQLite takes the bare op column from the row holding the MAX().
+    rows = (
+        db.session.query(ChangeLog.table_name, ChangeLog.row_id, latest, ChangeLog.op)
+        .filter(ChangeLog.seq > since)
+        .group_by(ChangeLog.table_name, ChangeLog.row_id)
+        .order_by(latest)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    current = {}
+    for table_name, model in FEED_MODELS.items():
+        ids = [row_id for name, row_id, _, _ in rows if name == table_name]
+        if ids:
+            key = model.__mapper__.primary_key[0]
+            current[table_name] = {getattr(obj, key.key): obj for obj in model.query.filter(key.in_(ids))}
+
+    changes = []
+    for table_name, row_id, seq, op in rows:
+        obj = current.get(table_name, {}).get(row_id)
+        changes.append({
+            'seq': seq,
+            'type': table_name,
+            'id': row_id,
+            'deleted': obj is None,
+            'archived': obj is None and op == 'archive',
+            'data': obj.to_dict() if obj is not None else None,
+        })
+    return changes, rows[-1][2] if rows else since, has_more
+
+
+def compact_changes(conn, tombstone_days=30):
+    """Shrink the log to one entry per row, dropping tombstones older than tombstone_days.
+
+    A feed only needs the latest entry of each row, so older ones go
+    whatever their age. Clients whose cursor predates a dropped tombstone
+    could miss that delete; their cursors now raise CursorExpired.
+    Returns the number of entries removed.
+    """
+    removed = conn.execute(text(
+        'DELETE FROM change_log WHERE seq NOT IN ('
+        'SELECT MAX(seq) FROM change_log GROUP BY table_name, row_id)'
+    )).rowcount
+    cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+    horizon = conn.execute(text(
+        "SELECT MAX(seq) FROM change_log WHERE op IN ('delete', 'archive') AND changed_at < :cutoff"
+    ), {'cutoff': cutoff}).scalar()
+    if horizon is not None:
+        removed += conn.execute(text(
+            "DELETE FROM change_log WHERE op IN ('delete', 'archive') AND seq <= :horizon"
+        ), {'horizon': horizon}).rowcount
+        conn.execute(text(
+            'UPDATE data_version SET version = MAX(version, :horizon) WHERE id = :id'
+        ), {'horizon': horizon, 'id': CHANGE_HORIZON_ID})
+    return removed
+
+
+def sse(event, data, event_id=None):
+    lines = [f'event: {event}', f'data: {json.dumps(data)}']
+    if event_id is not None:
+        lines.insert(0, f'id: {event_id}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class ChangeStream:
+    """State of one Server-Sent Events stream of the change feed.
+
+    poll() does one round of database work and returns the text to send
+    (possibly empty); the server loop sleeps `interval` between polls and
+    stops once `done`. Sync and async servers drive it the same way. Each
+    message carries a page of changes with its cursor as the event id, so
+    a reconnecting EventSource resumes from Last-Event-ID.
+    """
+
+    def __init__(self, cursor, encode, page_size=500, interval=1.0, heartbeat=15.0, max_seconds=300.0):
+        self.cursor = cursor
+        self.encode = encode
+        self.page_size = page_size
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.deadline = time.monotonic() + max_seconds
+        self.done = False
+        self._last_sent = None
+
+    def poll(self):
+        now = time.monotonic()
+        if self._last_sent is None:
+            # First poll: the reconnect delay, and the head's cursor when the
+            # client brought none (it only wants what changes from now on).
+            self._last_sent = now
+            preamble = f'retry: {int(self.interval * 1000)}\n\n'
+            if self.cursor is None:
+                self.cursor = latest_seq()
+                cursor = self.encode(self.cursor)
+                preamble += sse('ready', {'cursor': cursor}, cursor)
+            return preamble + self.poll()
+        if now >= self.deadline:
+            self.done = True
+            return ''
+        messages = []
+        if latest_seq() > self.cursor:
+            try:
+                has_more = True
+                while has_more:
+                    changes, self.cursor, has_more = changes_since(self.cursor, self.page_size)
+                    if changes:
+                        cursor = self.encode(self.cursor)
+                        messages.append(sse('changes', {'changes': changes, 'cursor': cursor}, cursor))
+            except CursorExpired as e:
+                self.done = True
+                messages.append(sse('reset', {'message': str(e)}))
+        if not messages and now - self._last_sent >= self.heartbeat:
+            messages.append(': keepalive\n\n')
+        if messages:
+            self._last_sent = now
+        return ''.join(messages)
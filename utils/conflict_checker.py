@@ -1,19 +1,470 @@
-from models import Event, EventResourceAllocation
+import bisect
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import repeat
+from operator import sub
 
-def has_resource_conflict(resource_id, start_time, end_time):
-    allocations = EventResourceAllocation.query.all()
+from flask import current_app
+from sqlalchemy import text
+from models import db, Event, EventResourceAllocation
+from utils.archive import event_sources, reaches_archive
+from utils.recurrence import Recurrence, overlaps_window
 
-    for allocation in allocations:
-        if allocation.resource_id != resource_id:
-            continue
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
 
-        event = Event.query.get(allocation.event_id)
-        if not event:
-            continue
 
-   
-        if start_time < event.end_time and end_time > event.start_time:
+def to_micros(moment):
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+class _ResourceBookings:
+    """One resource's bookings as parallel arrays sorted by start.
+
+    Times are int64 microseconds since the epoch, so a booking costs 32
+    bytes (with its length) and lookups compare plain integers.
+    """
+
+    __slots__ = ('starts', 'ends', 'event_ids', 'lengths', 'series')
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.event_ids = array('q')
+        # Booking lengths, sorted, so the longest is still known after it
+        # is removed.
+        self.lengths = array('q')
+        # Recurring series are few per resource and checked by expansion.
+        self.series = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def max_length(self):
+        return self.lengths[-1] if self.lengths else 0
+
+    def append(self, start_time, end_time, event_id):
+        # Loading only: rows have to arrive in start order, then finish_loading().
+        start, end = to_micros(start_time), to_micros(end_time)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.event_ids.append(event_id)
+        self.lengths.append(end - start)
+
+    def finish_loading(self):
+        self.lengths = array('q', sorted(self.lengths))
+
+    def add(self, start_time, end_time, event_id):
+        start, end = to_micros(start_time), to_micros(end_time)
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.event_ids.insert(i, event_id)
+        bisect.insort(self.lengths, end - start)
+
+    def add_series(self, recurrence, event_id):
+        self.series[event_id] = recurrence
+
+    def remove(self, start_time, end_time, event_id):
+        self.series.pop(event_id, None)
+        start, end = to_micros(start_time), to_micros(end_time)
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ends[i] == end and self.event_ids[i] == event_id:
+                del self.starts[i]
+                del self.ends[i]
+                del self.event_ids[i]
+                del self.lengths[bisect.bisect_left(self.lengths, end - start)]
+                return
+            i += 1
+
+    def _candidates(self, start, end):
+        # Only bookings starting in [start - max_length, end) can overlap.
+        return (
+            bisect.bisect_left(self.starts, start - self.max_length),
+            bisect.bisect_left(self.starts, end)
+        )
+
+    def overlapping(self, start_time, end_time, exclude_event_id=None):
+        start, end = to_micros(start_time), to_micros(end_time)
+        lo, hi = self._candidates(start, end)
+        ends, event_ids = self.ends, self.event_ids
+        for i in range(lo, hi):
+            if ends[i] > start and event_ids[i] != exclude_event_id:
+                return event_ids[i]
+        for event_id, recurrence in self.series.items():
+            if event_id != exclude_event_id and recurrence.first_overlap(start_time, end_time):
+                return event_id
+        return None
+
+    def window(self, window_start, window_end):
+        """(start, end, event_id) overlapping the window, series expanded, by start."""
+        start, end = to_micros(window_start), to_micros(window_end)
+        lo, hi = self._candidates(start, end)
+        bookings = [
+            (from_micros(self.starts[i]), from_micros(self.ends[i]), self.event_ids[i])
+            for i in range(lo, hi) if self.ends[i] > start
+        ]
+        if self.series:
+            for event_id, recurrence in self.series.items():
+                bookings.extend(
+                    (s, e, event_id) for s, e in recurrence.occurrences(window_start, window_end)
+                )
+            bookings.sort()
+        return bookings
+
+    def booked_seconds(self, window_start, window_end):
+        """Booked time inside the window, each booking clipped to it."""
+        start, end = to_micros(window_start), to_micros(window_end)
+        lo, hi = self._candidates(start, end)
+        # Clip with C-level map() over the array slices: max(0, min(e, end) - max(s, start)).
+        clipped = map(sub, map(min, self.ends[lo:hi], repeat(end)), map(max, self.starts[lo:hi], repeat(start)))
+        micros = sum(map(max, clipped, repeat(0)))
+        seconds = micros / 1_000_000
+        for recurrence in self.series.values():
+            for s, e in recurrence.occurrences(window_start, window_end):
+                seconds += (min(e, window_end) - max(s, window_start)).total_seconds()
+        return seconds
+
+    def nbytes(self):
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self.starts) + sys.getsizeof(self.ends)
+            + sys.getsizeof(self.event_ids) + sys.getsizeof(self.lengths) + sys.getsizeof(self.series)
+        )
+
+
+def resource_stamp():
+    """Latest resource_version stamp; None without its triggers (non-SQLite)."""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    return db.session.execute(text('SELECT COALESCE(MAX(version), 0) FROM resource_version')).scalar()
+
+
+def changed_resources(since):
+    """(resource ids whose bookings changed after stamp since, latest stamp seen)."""
+    rows = db.session.execute(
+        text('SELECT resource_id, version FROM resource_version WHERE version > :since'), {'since': since}
+    ).all()
+    return [resource_id for resource_id, _ in rows], max((version for _, version in rows), default=since)
+
+
+class ResourceIntervalIndex:
+    """In-process snapshot of bookings per resource.
+
+    Resources are loaded with one query, all at once by load() or lazily
+    the first time they are asked about, and are then kept in sync by the
+    routes that allocate, remove or move bookings (index_allocation,
+    unindex_allocation, unindex_event, reindex_event). Conflict checks,
+    free-slot lookups and booked-time sums then run without the ORM.
+    Recurring series are kept whole and expanded on lookup.
+
+    Those routes only reach their own process's index. With several
+    worker processes, sync() catches up on the others' writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._resources = {}
+        self._stamp = None
+        self._checked = float('-inf')
+
+    def load(self, resource_ids=None):
+        """Load resource_ids (every resource when None) that are not loaded yet."""
+        with self._lock:
+            rows = db.session.query(
+                EventResourceAllocation.resource_id, Event.start_time, Event.end_time, Event.event_id,
+                Event.recurrence_rule, Event.recurrence_exceptions
+            ).join(Event, Event.event_id == EventResourceAllocation.event_id)
+            if resource_ids is not None:
+                missing = [r for r in resource_ids if r not in self._resources]
+                if not missing:
+                    return
+                rows = rows.filter(EventResourceAllocation.resource_id.in_(missing))
+                for resource_id in missing:
+                    self._resources[resource_id] = _ResourceBookings()
+            else:
+                self._resources.clear()
+                # Read first: a write landing during the load moves it again.
+                self._stamp = resource_stamp()
+            loaded = {}
+            for resource_id, start_time, end_time, event_id, rule, exceptions in (
+                rows.order_by(EventResourceAllocation.resource_id, Event.start_time).yield_per(10000)
+            ):
+                bookings = loaded.get(resource_id)
+                if bookings is None:
+                    bookings = loaded[resource_id] = _ResourceBookings()
+                if rule:
+                    bookings.add_series(Recurrence(start_time, end_time, rule, exceptions), event_id)
+                else:
+                    bookings.append(start_time, end_time, event_id)
+            for bookings in loaded.values():
+                bookings.finish_loading()
+            self._resources.update(loaded)
+
+    def _bookings(self, resource_id):
+        if resource_id not in self._resources:
+            self.load([resource_id])
+        return self._resources[resource_id]
+
+    def find_conflict(self, resource_id, start_time, end_time, exclude_event_id=None):
+        with self._lock:
+            return self._bookings(resource_id).overlapping(start_time, end_time, exclude_event_id)
+
+    def window(self, resource_ids, window_start, window_end):
+        """{resource_id: [(start, end, event_id), ...]} like bookings_in_window."""
+        with self._lock:
+            self.load(resource_ids)
+            return {r: self._resources[r].window(window_start, window_end) for r in resource_ids}
+
+    def booked_seconds(self, resource_ids, window_start, window_end):
+        with self._lock:
+            self.load(resource_ids)
+            return {r: self._resources[r].booked_seconds(window_start, window_end) for r in resource_ids}
+
+    def add(self, resource_id, event_id, start_time, end_time, recurrence=None):
+        with self._lock:
+            # Unloaded resources pick the booking up from the database later.
+            if resource_id in self._resources:
+                if recurrence is not None:
+                    self._resources[resource_id].add_series(recurrence, event_id)
+                else:
+                    self._resources[resource_id].add(start_time, end_time, event_id)
+
+    def remove(self, resource_id, event_id, start_time, end_time):
+        with self._lock:
+            if resource_id in self._resources:
+                self._resources[resource_id].remove(start_time, end_time, event_id)
+
+    def sync(self, interval):
+        """Drop loaded resources whose bookings changed since the last check.
+
+        Polls the resource_version stamps, which triggers move on every
+        allocation write and every event move or delete, at most every
+        interval seconds. Only the resources stamped since the last check
+        are dropped, this process's writes included, and are reloaded on
+        next use. Without the triggers (non-SQLite) this does nothing.
+        """
+        now = time.monotonic()
+        if now - self._checked < interval:
+            return
+        self._checked = now
+        if self._stamp is None:
+            # First check: what is loaded was read after this stamp.
+            stamp = resource_stamp()
+            with self._lock:
+                if self._stamp is None:
+                    self._stamp = stamp
+            return
+        changed, stamp = changed_resources(self._stamp)
+        with self._lock:
+            for resource_id in changed:
+                self._resources.pop(resource_id, None)
+            self._stamp = max(self._stamp, stamp)
+
+    def invalidate(self, resource_id=None):
+        with self._lock:
+            if resource_id is None:
+                self._resources.clear()
+            else:
+                self._resources.pop(resource_id, None)
+
+    def stats(self):
+        """Loaded resources, bookings, series and memory, with bytes per 100k bookings."""
+        with self._lock:
+            bookings = sum(len(b) for b in self._resources.values())
+            series = sum(len(b.series) for b in self._resources.values())
+            nbytes = sys.getsizeof(self._resources) + sum(b.nbytes() for b in self._resources.values())
+        return {
+            'resources': len(self._resources),
+            'bookings': bookings,
+            'series': series,
+            'bytes': nbytes,
+            'bytes_per_100k_bookings': round(nbytes / bookings * 100_000) if bookings else None,
+        }
+
+
+def get_conflict_index():
+    index = current_app.extensions.setdefault('conflict_index', ResourceIntervalIndex())
+    interval = current_app.config.get('CONFLICT_INDEX_SYNC_SECONDS', 0)
+    if interval:
+        index.sync(interval)
+    return index
+
+
+def _allocated_events(resource_id, range_start, exclude_event_id=None):
+    # (query, events entity); archived bookings count when range_start reaches them.
+    events, allocations = event_sources(range_start)
+    query = (
+        db.session.query(events)
+        .join(allocations, allocations.event_id == events.event_id)
+        .filter(allocations.resource_id == resource_id)
+    )
+    if exclude_event_id is not None:
+        query = query.filter(events.event_id != exclude_event_id)
+    return query, events
+
+
+def find_conflict_sql(resource_id, start_time, end_time, exclude_event_id=None):
+    allocated, events = _allocated_events(resource_id, start_time, exclude_event_id)
+    conflict = (
+        allocated
+        .filter(events.recurrence_rule.is_(None), events.start_time < end_time, events.end_time > start_time)
+        .first()
+    )
+    if conflict is not None:
+        return conflict
+    series = (
+        allocated
+        .filter(events.recurrence_rule.isnot(None), overlaps_window(start_time, end_time, events=events))
+        .order_by(events.start_time)
+    )
+    for event in series:
+        if Recurrence.for_event(event).first_overlap(start_time, end_time):
             return event
+    return None
+
+
+def find_event_conflict(resource_id, event):
+    """Booking on resource_id that overlaps any occurrence of event, or None."""
+    if not event.recurrence_rule:
+        return find_conflict_sql(resource_id, event.start_time, event.end_time)
 
+    recurrence = Recurrence.for_event(event)
+    allocated, events = _allocated_events(resource_id, event.start_time)
+    candidates = (
+        allocated
+        .filter(overlaps_window(event.start_time, recurrence.series_end(), events=events))
+        .order_by(events.start_time)
+    )
+    for candidate in candidates:
+        if Recurrence.for_event(candidate).conflicts_with(recurrence):
+            return candidate
     return None
 
+
+def bookings_in_window(resource_ids, window_start, window_end):
+    """{resource_id: [(start, end, event_id), ...]} sorted by start, in one query.
+
+    Recurring series contribute their occurrences inside the window.
+    """
+    bookings = defaultdict(list)
+    events, allocations = event_sources(window_start)
+    rows = (
+        db.session.query(
+            allocations.resource_id, events.start_time, events.end_time, events.event_id,
+            events.recurrence_rule, events.recurrence_exceptions
+        )
+        .join(events, events.event_id == allocations.event_id)
+        .filter(
+            allocations.resource_id.in_(list(resource_ids)),
+            overlaps_window(window_start, window_end, events=events)
+        )
+        .order_by(allocations.resource_id, events.start_time)
+    )
+    expanded = set()
+    for resource_id, start_time, end_time, event_id, rule, exceptions in rows:
+        if not rule:
+            bookings[resource_id].append((start_time, end_time, event_id))
+            continue
+        recurrence = Recurrence(start_time, end_time, rule, exceptions)
+        bookings[resource_id].extend(
+            (start, end, event_id) for start, end in recurrence.occurrences(window_start, window_end)
+        )
+        expanded.add(resource_id)
+    for resource_id in expanded:
+        bookings[resource_id].sort()
+    return bookings
+
+
+def merged_bookings(bookings):
+    # Collapse overlapping (start, end, event_id) bookings into disjoint blocks.
+    blocks = []
+    for start_time, end_time, event_id in bookings:
+        if blocks and start_time < blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], end_time)
+        else:
+            blocks.append([start_time, end_time, event_id])
+    return blocks
+
+
+def sweep_conflicts(requests):
+    """Check many (key, resource_id, start_time, end_time) booking requests at once.
+
+    Existing bookings of the requested resources are read with one query,
+    then each resource is swept in start order. Returns {key: (kind, ref)}
+    for rejected requests, where kind is 'existing' (ref is the booked
+    event_id) or 'batch' (ref is the key of an earlier accepted request).
+    """
+    if not requests:
+        return {}
+
+    by_resource = defaultdict(list)
+    for request in requests:
+        by_resource[request[1]].append(request)
+
+    existing = bookings_in_window(by_resource, min(r[2] for r in requests), max(r[3] for r in requests))
+
+    conflicts = {}
+    for resource_id, resource_requests in by_resource.items():
+        resource_requests.sort(key=lambda r: (r[2], r[3]))
+        blocks = merged_bookings(existing[resource_id])
+        i = 0
+        last_end = last_key = None
+        for key, _, start_time, end_time in resource_requests:
+            while i < len(blocks) and blocks[i][1] <= start_time:
+                i += 1
+            if i < len(blocks) and blocks[i][0] < end_time:
+                conflicts[key] = ('existing', blocks[i][2])
+            elif last_end is not None and start_time < last_end:
+                conflicts[key] = ('batch', last_key)
+            else:
+                last_end, last_key = end_time, key
+    return conflicts
+
+
+def has_resource_conflict(resource_id, start_time, end_time, exclude_event_id=None):
+    if not current_app.config.get('CONFLICT_INDEX_ENABLED', True):
+        return find_conflict_sql(resource_id, start_time, end_time, exclude_event_id)
+
+    event_id = get_conflict_index().find_conflict(resource_id, start_time, end_time, exclude_event_id)
+    event = db.session.get(Event, event_id) if event_id is not None else None
+    if event is None and (event_id is not None or reaches_archive(start_time)):
+        # The snapshot holds live bookings only, and may predate the last
+        # archival run; older bookings are checked in the database.
+        return find_conflict_sql(resource_id, start_time, end_time, exclude_event_id)
+    return event
+
+
+def _recurrence_of(event):
+    return Recurrence.for_event(event) if event.recurrence_rule else None
+
+
+def index_allocation(resource_id, event):
+    get_conflict_index().add(resource_id, event.event_id, event.start_time, event.end_time, _recurrence_of(event))
+
+
+def unindex_allocation(resource_id, event):
+    get_conflict_index().remove(resource_id, event.event_id, event.start_time, event.end_time)
+
+
+def unindex_event(event_id, start_time, end_time, resource_ids):
+    index = get_conflict_index()
+    for resource_id in resource_ids:
+        index.remove(resource_id, event_id, start_time, end_time)
+
+
+def reindex_event(event, old_start, old_end, resource_ids):
+    index = get_conflict_index()
+    recurrence = _recurrence_of(event)
+    for resource_id in resource_ids:
+        index.remove(resource_id, event.event_id, old_start, old_end)
+        index.add(resource_id, event.event_id, event.start_time, event.end_time, recurrence)
@@ -0,0 +1,132 @@
+import os
+import weakref
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+READER_BIND = 'reader'
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+}
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of GET requests to the reader engine.
+
+    Flushes, explicit binds and requests other than GET/HEAD keep using
+    the primary engine, so a GET handler that does write still works.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('read_only_db'):
+            reader = self._db.engines.get(READER_BIND)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_file_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """Pool sizing for SQLALCHEMY_ENGINE_OPTIONS, read from config."""
+    uri = config.get('SQLALCHEMY_DATABASE_URI', '')
+    if uri and make_url(uri).get_backend_name() == 'sqlite' and not _is_file_sqlite(uri):
+        # In-memory databases live in one connection; leave their pool alone.
+        return {}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def read_database_uri(config):
+    """The reader's URI: READ_DATABASE_URI, else the primary file for SQLite."""
+    if not config.get('DB_READ_ROUTING', True):
+        return None
+    uri = config.get('SQLALCHEMY_READ_DATABASE_URI')
+    if uri:
+        return uri
+    primary = config.get('SQLALCHEMY_DATABASE_URI', '')
+    # WAL lets a second pool of readers run alongside the writer.
+    return primary if _is_file_sqlite(primary) else None
+
+
+def _set_pragmas(pragmas, read_only):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+    return on_connect
+
+
+def _route_reads():
+    if request.method in ('GET', 'HEAD'):
+        g.read_only_db = True
+
+
+def init_database(app, db):
+    """Configure engines from app.config, then init db on the app.
+
+    Every new SQLite connection gets the SQLITE_PRAGMAS profile (WAL,
+    synchronous=NORMAL, busy_timeout, mmap_size, cache_size), pools are
+    sized from DB_POOL_*, and when a reader is available GET requests
+    read through it. A process forked after this (a pre-fork server's
+    worker) starts with empty pools.
+    """
+    config = app.config
+    options = engine_options(config)
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', options)
+    reader_uri = read_database_uri(config)
+    if reader_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(READER_BIND, {'url': reader_uri, **options})
+        config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **config.get('SQLITE_PRAGMAS', {})}
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _set_pragmas(pragmas, read_only=bind_key == READER_BIND))
+    if reader_uri:
+        app.before_request(_route_reads)
+    if hasattr(os, 'register_at_fork'):
+        app_ref = weakref.ref(app)
+        os.register_at_fork(after_in_child=lambda: _dispose_after_fork(app_ref, db))
+
+
+def _dispose_after_fork(app_ref, db):
+    """Give a forked worker fresh pools instead of its parent's connections."""
+    app = app_ref()
+    if app is None:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the parent still owns those connections.
+            engine.dispose(close=False)
+
+
+def sqlite_settings(engine):
+    """Current values of the tuning pragmas on one connection of engine."""
+    with engine.connect() as conn:
+        return {
+            name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in list(DEFAULT_SQLITE_PRAGMAS) + ['query_only']
+        }
@@ -0,0 +1,49 @@
+import csv
+import io
+import itertools
+import json
+import zlib
+
+
+def _buffered(lines, chunk_size):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_chunks(header, rows, chunk_size=64 * 1024):
+    """Yield CSV text in chunks of roughly chunk_size characters."""
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def lines():
+        for values in itertools.chain([header], rows):
+            writer.writerow(values)
+            text = line.getvalue()
+            line.seek(0)
+            line.truncate()
+            yield text
+
+    return _buffered(lines(), chunk_size)
+
+
+def ndjson_chunks(rows, chunk_size=64 * 1024):
+    """Yield one JSON document per line, in chunks of roughly chunk_size characters."""
+    return _buffered((json.dumps(row, default=str) + '\n' for row in rows), chunk_size)
+
+
+def gzip_chunks(chunks, encoding='utf-8'):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
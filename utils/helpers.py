@@ -1,28 +1,36 @@
 
 from functools import wraps
 from flask import request, jsonify, g
-from config import Config
-from models import User
+from utils.auth import authenticate_token
 
 
 
+def bearer_token(auth_header):
+    """The token of an Authorization header value, None without one.
+
+    Raises ValueError when the header is not '<scheme> <token>'.
+    """
+    if auth_header is None:
+        return None
+    parts = auth_header.split(' ')
+    if len(parts) < 2:
+        raise ValueError('Invalid authorization header format!')
+    return parts[1]
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-
-        if 'Authorization' in request.headers:
-            try:
-                auth_header = request.headers['Authorization']
-                token = auth_header.split(' ')[1]
-            except Exception:
-                return jsonify({'message': 'Invalid authorization header format!'}), 401
+        try:
+            token = bearer_token(request.headers.get('Authorization'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 401
 
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            user = User.verify_auth_token(token, Config.JWT_SECRET_KEY)
+            user = authenticate_token(token)
             if not user:
                 return jsonify({'message': 'Invalid token!'}), 401
             g.current_user = user
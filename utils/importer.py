@@ -0,0 +1,325 @@
+import csv
+import io
+import json
+from datetime import datetime, date, timezone
+
+from sqlalchemy import insert
+from models import db, Event, Resource, EventResourceAllocation
+from utils.conflict_checker import get_conflict_index, sweep_conflicts
+from utils.locking import lock_resources
+from utils.recurrence import Recurrence, format_exceptions, format_rule, parse_exceptions, parse_rule
+from utils.rollup import record_bookings
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('csv', 'json', 'ics')
+
+
+def detect_format(filename=None, content_type=None):
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if name.endswith(('.ics', '.ical')) or 'calendar' in content_type:
+        return 'ics'
+    if name.endswith(('.json', '.ndjson', '.jsonl')) or 'json' in content_type:
+        return 'json'
+    return None
+
+
+def parse_csv(stream):
+    """Yield (row_number, record) from a CSV with a header row."""
+    for row_number, record in enumerate(csv.DictReader(stream), start=1):
+        yield row_number, record
+
+
+def parse_json(stream):
+    """Yield (row_number, record) from a JSON array or newline-delimited JSON.
+
+    Arrays are decoded in one go; use NDJSON for very large files.
+    """
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        try:
+            records = json.loads(first + stream.read())
+        except ValueError as e:
+            yield 1, {'_error': f'Invalid JSON array: {e}'}
+            return
+        for row_number, record in enumerate(records, start=1):
+            yield row_number, record
+        return
+
+    # NDJSON is read line by line so large files never sit in memory.
+    lines = _prepend(first, stream)
+    for row_number, line in enumerate(lines, start=1):
+        if line.strip():
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, {'_error': f'Invalid JSON: {e}'}
+
+
+def _prepend(first, stream):
+    line = first + stream.readline() if first else ''
+    if line:
+        yield line
+    yield from stream
+
+
+def _unfold(stream):
+    current = None
+    for raw in stream:
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _ical_datetime(value, params):
+    if 'VALUE=DATE' in params or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d')
+    if value.endswith('Z'):
+        return datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+    return datetime.strptime(value, '%Y%m%dT%H%M%S')
+
+
+def parse_ics(stream):
+    """Yield (row_number, record) for each VEVENT of an iCalendar file."""
+    record = None
+    row_number = 0
+    for line in _unfold(stream):
+        name, _, value = line.partition(':')
+        name, _, params = name.partition(';')
+        name = name.upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            row_number += 1
+            record = {}
+        elif name == 'END' and value.upper() == 'VEVENT' and record is not None:
+            yield row_number, record
+            record = None
+        elif record is not None:
+            try:
+                if name == 'SUMMARY':
+                    record['title'] = _ical_text(value)
+                elif name == 'DESCRIPTION':
+                    record['description'] = _ical_text(value)
+                elif name == 'DTSTART':
+                    record['start_time'] = _ical_datetime(value, params.upper())
+                elif name == 'DTEND':
+                    record['end_time'] = _ical_datetime(value, params.upper())
+                elif name == 'RRULE':
+                    record['recurrence_rule'] = value
+                elif name == 'EXDATE':
+                    record.setdefault('recurrence_exceptions', []).extend(
+                        _ical_datetime(v, params.upper()) for v in value.split(',')
+                    )
+            except ValueError as e:
+                record['_error'] = f'Invalid {name}: {e}'
+
+
+def _ical_text(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+PARSERS = {'csv': parse_csv, 'json': parse_json, 'ics': parse_ics}
+
+
+def parse_records(stream, file_format):
+    """Parse a binary upload or file object in the given format."""
+    return PARSERS[file_format](io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+
+
+def _parse_datetime(value):
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_resource_ids(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, (list, tuple)):
+        return [int(v) for v in value]
+    if isinstance(value, int):
+        return [value]
+    return [int(v) for v in str(value).replace(',', ';').split(';') if v.strip()]
+
+
+def _text(record, field):
+    # JSON rows can hold any type; CSV and iCalendar ones only strings.
+    value = record.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value
+
+
+def validate_record(record, default_resource_ids=()):
+    if not isinstance(record, dict):
+        raise ValueError('Row must be an object')
+    if record.get('_error'):
+        raise ValueError(record['_error'])
+
+    title = _text(record, 'title').strip()
+    if not title:
+        raise ValueError('Missing title')
+    if len(title) > 150:
+        raise ValueError('Title is longer than 150 characters')
+    if not record.get('start_time') or not record.get('end_time'):
+        raise ValueError('Missing start_time or end_time')
+
+    start_time = _parse_datetime(record['start_time'])
+    end_time = _parse_datetime(record['end_time'])
+    if start_time >= end_time:
+        raise ValueError('End time must be after start time')
+
+    rule = exceptions = recurrence_end = None
+    if _text(record, 'recurrence_rule'):
+        rule = format_rule(*parse_rule(record['recurrence_rule']))
+        raw_exceptions = record.get('recurrence_exceptions')
+        if isinstance(raw_exceptions, str):
+            raw_exceptions = raw_exceptions.replace(';', ',').split(',')
+        exceptions = format_exceptions(_parse_datetime(e) for e in raw_exceptions or () if e)
+        recurrence_end = Recurrence(start_time, end_time, rule, parse_exceptions(exceptions)).series_end()
+
+    resource_ids = _parse_resource_ids(record.get('resource_ids')) or list(default_resource_ids)
+    return {
+        'title': title,
+        'description': _text(record, 'description'),
+        'start_time': start_time,
+        'end_time': end_time,
+        'recurrence_rule': rule,
+        'recurrence_exceptions': exceptions,
+        'recurrence_end': recurrence_end,
+        'resource_ids': list(dict.fromkeys(resource_ids))
+    }
+
+
+def _reject_conflicts(rows, report):
+    known = {r for (r,) in db.session.query(Resource.resource_id).filter(
+        Resource.resource_id.in_({rid for _, row in rows for rid in row['resource_ids']})
+    )}
+    requests = [
+        ((row_number, resource_id), resource_id, row['start_time'], row['end_time'])
+        for row_number, row in rows if not row['recurrence_rule']
+        for resource_id in row['resource_ids'] if resource_id in known
+    ]
+    conflicts = sweep_conflicts(requests)
+
+    accepted = []
+    for row_number, row in rows:
+        error = None
+        if row['recurrence_rule'] and row['resource_ids']:
+            error = 'Recurring rows cannot be allocated during import; allocate the series afterwards'
+        for resource_id in row['resource_ids']:
+            if error:
+                break
+            if resource_id not in known:
+                error = f'Resource {resource_id} not found'
+            elif (row_number, resource_id) in conflicts:
+                kind, ref = conflicts[(row_number, resource_id)]
+                if kind == 'existing':
+                    error = f'Resource {resource_id} is already booked by event {ref}'
+                else:
+                    error = f'Resource {resource_id} is already booked by row {ref[0]}'
+        if error:
+            report['failed'].append({'row': row_number, 'error': error})
+        else:
+            accepted.append((row_number, row))
+    return accepted
+
+
+def _import_batch(rows, user_id, allocate, report):
+    try:
+        if allocate:
+            lock_resources({rid for _, row in rows for rid in row['resource_ids']})
+            rows = _reject_conflicts(rows, report)
+        if not rows:
+            db.session.rollback()
+            return
+
+        event_ids = db.session.scalars(
+            insert(Event).returning(Event.event_id, sort_by_parameter_order=True),
+            [{
+                'title': row['title'],
+                'description': row['description'],
+                'start_time': row['start_time'],
+                'end_time': row['end_time'],
+                'recurrence_rule': row['recurrence_rule'],
+                'recurrence_exceptions': row['recurrence_exceptions'],
+                'recurrence_end': row['recurrence_end'],
+                'user_id': user_id
+            } for _, row in rows]
+        ).all()
+
+        bookings = []
+        if allocate:
+            bookings = [
+                (resource_id, event_id, row['start_time'], row['end_time'])
+                for event_id, (_, row) in zip(event_ids, rows) for resource_id in row['resource_ids']
+            ]
+            if bookings:
+                db.session.execute(insert(EventResourceAllocation), [
+                    {'event_id': event_id, 'resource_id': resource_id}
+                    for resource_id, event_id, _, _ in bookings
+                ])
+                record_bookings((resource_id, start, end) for resource_id, _, start, end in bookings)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        report['failed'].extend({'row': row_number, 'error': f'Batch failed: {e}'} for row_number, _ in rows)
+        return
+
+    index = get_conflict_index()
+    for resource_id, event_id, start_time, end_time in bookings:
+        index.add(resource_id, event_id, start_time, end_time)
+
+    report['imported'] += len(event_ids)
+    report['allocated'] += len(bookings)
+
+
+def _readable(records, report):
+    # A parser error ends the input, not the import: rows read before it
+    # are still inserted, and everything is reported.
+    row_number = 0
+    try:
+        for row_number, record in records:
+            yield row_number, record
+    except (ValueError, csv.Error) as e:
+        report['failed'].append({'row': row_number + 1, 'error': f'Unreadable input: {e}'})
+
+
+def import_events(records, user_id=None, allocate=False, default_resource_ids=(), batch_size=DEFAULT_BATCH_SIZE):
+    """Validate and insert (row_number, record) pairs in batches.
+
+    With allocate=True each event is also given its resource_ids (or
+    default_resource_ids); rows whose bookings overlap existing bookings
+    or earlier rows of the same batch are rejected. Failures are reported
+    per row and never stop the import.
+    """
+    report = {'imported': 0, 'allocated': 0, 'failed': []}
+    batch = []
+    for row_number, record in _readable(records, report):
+        try:
+            batch.append((row_number, validate_record(record, default_resource_ids)))
+        except (ValueError, TypeError) as e:
+            report['failed'].append({'row': row_number, 'error': str(e)})
+        if len(batch) >= batch_size:
+            _import_batch(batch, user_id, allocate, report)
+            batch = []
+    if batch:
+        _import_batch(batch, user_id, allocate, report)
+    report['failed'].sort(key=lambda failure: failure['row'])
+    return report
@@ -0,0 +1,257 @@
+import hmac
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from utils.helpers import bearer_token
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SLOWEST_PER_REQUEST = 5
+MAX_TRACKED_STATEMENTS = 500
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """Per-process request and query statistics behind /metrics.
+
+    Each worker keeps its own numbers; Prometheus scrapes them per
+    instance and sums across instances as usual.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.db_seconds = {}
+        self.requests = {}
+        self.statements = {}
+
+    def observe_request(self, method, route, status, seconds, query_count, db_seconds):
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(LATENCY_BUCKETS, seconds)
+            self.queries.setdefault(key, _Histogram(QUERY_BUCKETS)).observe(QUERY_BUCKETS, query_count)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + db_seconds
+            count_key = (method, route, status)
+            self.requests[count_key] = self.requests.get(count_key, 0) + 1
+
+    def observe_statement(self, statement, seconds, route):
+        with self._lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                if len(self.statements) >= MAX_TRACKED_STATEMENTS:
+                    return
+                stats = self.statements[statement] = {'count': 0, 'total': 0.0, 'max': 0.0, 'route': route}
+            stats['count'] += 1
+            stats['total'] += seconds
+            if seconds >= stats['max']:
+                stats['max'] = seconds
+                stats['route'] = route
+
+    def slowest_statements(self, limit=20):
+        with self._lock:
+            items = sorted(self.statements.items(), key=lambda item: item[1]['max'], reverse=True)[:limit]
+            return [
+                {
+                    'statement': statement,
+                    'count': stats['count'],
+                    'total_ms': round(stats['total'] * 1000, 3),
+                    'mean_ms': round(stats['total'] / stats['count'] * 1000, 3),
+                    'max_ms': round(stats['max'] * 1000, 3),
+                    'route': stats['route'],
+                }
+                for statement, stats in items
+            ]
+
+    def render(self):
+        """The metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += _histogram_lines(
+                'http_request_duration_seconds', 'Request latency by route.', LATENCY_BUCKETS, self.latency)
+            lines += _histogram_lines(
+                'db_queries_per_request', 'SQL statements issued per request.', QUERY_BUCKETS, self.queries)
+            lines.append('# HELP db_query_seconds_total Time spent in SQL statements by route.')
+            lines.append('# TYPE db_query_seconds_total counter')
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'db_query_seconds_total{_labels(method=method, route=route)} {seconds:.6f}')
+            lines.append('# HELP http_requests_total Requests by route and status.')
+            lines.append('# TYPE http_requests_total counter')
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{_labels(method=method, route=route, status=status)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, help_text, buckets, histograms):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for (method, route), histogram in sorted(histograms.items()):
+        for bound, count in zip(buckets, histogram.counts):
+            lines.append(f'{name}_bucket{_labels(method=method, route=route, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(method=method, route=route, le="+Inf")} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(method=method, route=route)} {histogram.total:.6f}')
+        lines.append(f'{name}_count{_labels(method=method, route=route)} {histogram.count}')
+    return lines
+
+
+def get_metrics():
+    return current_app.extensions.setdefault('metrics', Metrics())
+
+
+def query_budget(limit):
+    """Override QUERY_BUDGET for one view."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None or not has_request_context():
+        return
+    elapsed = time.perf_counter() - started
+    stats = g.get('db_stats')
+    if stats is None:
+        stats = g.db_stats = {'count': 0, 'seconds': 0.0, 'slowest': []}
+    stats['count'] += 1
+    stats['seconds'] += elapsed
+    slowest = stats['slowest']
+    if len(slowest) < SLOWEST_PER_REQUEST or elapsed > slowest[-1][0]:
+        slowest.append((elapsed, statement))
+        slowest.sort(key=lambda item: item[0], reverse=True)
+        del slowest[SLOWEST_PER_REQUEST:]
+    get_metrics().observe_statement(statement, elapsed, _route())
+
+    slow_ms = current_app.config.get('SLOW_QUERY_MS', 0)
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        current_app.logger.warning('slow query (%.1f ms) on %s %s: %s',
+                                   elapsed * 1000, request.method, _route(), statement)
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+    # g outlives the request when an app context was already pushed (tests).
+    g.pop('db_stats', None)
+
+
+def _record_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    stats = g.get('db_stats') or {'count': 0, 'seconds': 0.0, 'slowest': []}
+    route = _route()
+    get_metrics().observe_request(
+        request.method, route, response.status_code, elapsed, stats['count'], stats['seconds'])
+
+    if current_app.config.get('SERVER_TIMING_ENABLED', True):
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats["seconds"] * 1000:.2f};desc="{stats["count"]} queries", app;dur={elapsed * 1000:.2f}'
+        )
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = current_app.config.get('QUERY_BUDGET', 0)
+    if budget and stats['count'] > budget:
+        message = (f'{request.method} {route} ran {stats["count"]} queries (budget {budget}); slowest: '
+                   + '; '.join(f'{seconds * 1000:.1f} ms {statement}' for seconds, statement in stats['slowest']))
+        if current_app.config.get('QUERY_BUDGET_ACTION', 'log') == 'raise':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def metrics_token_required(view):
+    """Require METRICS_TOKEN as a bearer token when one is configured."""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        expected = current_app.config.get('METRICS_TOKEN')
+        if expected:
+            try:
+                token = bearer_token(request.headers.get('Authorization'))
+            except ValueError:
+                token = None
+            if not token or not hmac.compare_digest(token.encode(), expected.encode()):
+                return jsonify({'message': 'Metrics token required!'}), 401
+        return view(*args, **kwargs)
+    return decorated
+
+
+@metrics_token_required
+def metrics_view():
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+
+@metrics_token_required
+def slow_queries_view():
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(get_metrics().slowest_statements(limit))
+
+
+def init_instrumentation(app, db):
+    """Time every SQL statement and request of app.
+
+    Adds a Server-Timing header (DB time, statement count, total time) to
+    each response, serves Prometheus metrics at /metrics and the slowest
+    statements seen so far at /metrics/queries, and checks each request
+    against QUERY_BUDGET (or a view's @query_budget). Over budget it logs,
+    or raises QueryBudgetExceeded when QUERY_BUDGET_ACTION is 'raise',
+    which is what a test suite wants. Statements run while a streamed
+    response body is sent are not counted. The two endpoints exist only
+    with METRICS_ENDPOINT_ENABLED, and /metrics/queries shows SQL text,
+    so set METRICS_TOKEN unless they are reachable from trusted hosts only.
+    """
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    if app.config.get('METRICS_ENDPOINT_ENABLED', False):
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+        app.add_url_rule('/metrics/queries', 'metrics_queries', slow_queries_view)
+
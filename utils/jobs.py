@@ -0,0 +1,196 @@
+import hashlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text, update
+from models import db, Job
+from utils.reporting import iter_resource_utilization, report_chunks, resource_utilization
+
+PENDING = ('queued', 'running')
+
+# kind -> function(params) returning (content_type, filename, body bytes).
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def _dates(params):
+    return date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date'])
+
+
+@job_handler('report')
+def _report_job(params):
+    start_date, end_date = _dates(params)
+    rows, totals = resource_utilization(start_date, end_date)
+    body = json.dumps({'rows': rows, 'totals': totals}).encode()
+    return 'application/json', f'resource_report_{start_date}_{end_date}.json', body
+
+
+@job_handler('export')
+def _export_job(params):
+    start_date, end_date = _dates(params)
+    chunks, mimetype, extension = report_chunks(
+        iter_resource_utilization(start_date, end_date), params.get('format', 'csv'))
+    body = ''.join(chunks).encode()
+    return mimetype, f'resource_report_{start_date}_{end_date}.{extension}', body
+
+
+def data_version():
+    """Counter bumped by triggers on every event/resource/allocation write.
+
+    None where the triggers are not installed (non-SQLite databases), in
+    which case results are never reused.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    return db.session.execute(text('SELECT version FROM data_version WHERE id = 1')).scalar()
+
+
+def _cache_key(kind, params, version):
+    return hashlib.sha1(f'{kind}:{params}:{version}'.encode()).hexdigest()
+
+
+class JobQueue:
+    """Thread pool that runs queued jobs in an app context.
+
+    The job table is the source of truth: a job is claimed by moving it
+    from queued to running in one UPDATE, so several processes sharing the
+    database never run the same job twice.
+    """
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+
+    def enqueue(self, job_id):
+        self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                run_job(job_id)
+            finally:
+                db.session.remove()
+
+    def recover(self):
+        """Fail jobs stuck past JOB_TIMEOUT and pick up ones left queued."""
+        timeout = self.app.config.get('JOB_TIMEOUT', 3600)
+        Job.query.filter(
+            Job.status == 'running', Job.started_at < datetime.utcnow() - timedelta(seconds=timeout)
+        ).update({'status': 'failed', 'error': 'Interrupted', 'finished_at': datetime.utcnow()})
+        db.session.commit()
+        for (job_id,) in db.session.query(Job.job_id).filter_by(status='queued'):
+            self.enqueue(job_id)
+
+
+def get_job_queue():
+    extensions = current_app.extensions
+    if 'job_queue' not in extensions:
+        queue = JobQueue(current_app._get_current_object(), current_app.config.get('JOB_WORKERS', 2))
+        extensions['job_queue'] = queue
+        queue.recover()
+    return extensions['job_queue']
+
+
+def _compute(job):
+    # Read before computing: a write landing mid-run makes the stored
+    # key older than the data, never newer.
+    version = data_version()
+    job.content_type, job.filename, job.result = JOB_HANDLERS[job.kind](json.loads(job.params))
+    job.cache_key = _cache_key(job.kind, job.params, version) if version is not None else None
+    job.status = 'done'
+
+
+def _run_inline(kind, params):
+    # An unsaved Job: nobody else polls for it, so nothing is written.
+    now = datetime.utcnow()
+    job = Job(job_id=uuid.uuid4().hex, kind=kind, params=params, status='running', created_at=now, started_at=now)
+    try:
+        _compute(job)
+    except Exception as e:
+        current_app.logger.exception('inline job (%s) failed', kind)
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'
+    job.finished_at = datetime.utcnow()
+    return job
+
+
+def run_job(job_id):
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.job_id == job_id, Job.status == 'queued')
+        .values(status='running', started_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+
+    job = db.session.get(Job, job_id)
+    try:
+        _compute(job)
+    except Exception as e:
+        current_app.logger.exception('job %s (%s) failed', job_id, job.kind)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def cached_job(kind, params):
+    """A finished job for the same request against the current data, or None."""
+    version = data_version()
+    if version is None:
+        return None
+    ttl = current_app.config.get('JOB_RESULT_TTL', 300)
+    return (
+        Job.query
+        .filter(
+            Job.cache_key == _cache_key(kind, params, version),
+            Job.status == 'done',
+            Job.finished_at >= datetime.utcnow() - timedelta(seconds=ttl)
+        )
+        .order_by(Job.finished_at.desc())
+        .first()
+    )
+
+
+def submit_job(kind, params, wait=False):
+    """Queue a job, or return an equivalent one that is cached or in flight.
+
+    With wait=True a cache miss runs in the calling thread and comes back
+    as an unsaved Job, so an inline request writes nothing. Results are
+    reused while the data version is unchanged and they are younger than
+    JOB_RESULT_TTL; the TTL bounds how stale "upcoming" counts can get.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    params = json.dumps(params, sort_keys=True, default=str)
+
+    job = cached_job(kind, params)
+    if job is not None:
+        return job
+    if wait:
+        return _run_inline(kind, params)
+    job = Job.query.filter(Job.kind == kind, Job.params == params, Job.status.in_(PENDING)).first()
+    if job is not None:
+        return job
+
+    retention = current_app.config.get('JOB_RETENTION_HOURS', 24)
+    Job.query.filter(Job.finished_at < datetime.utcnow() - timedelta(hours=retention)).delete()
+    job = Job(job_id=uuid.uuid4().hex, kind=kind, params=params, status='queued', created_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    get_job_queue().enqueue(job.job_id)
+    return job
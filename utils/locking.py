@@ -0,0 +1,48 @@
+import random
+import time
+
+from sqlalchemy.exc import OperationalError
+from models import db, Resource
+
+# SQLSTATEs PostgreSQL uses for serialization failures and deadlocks.
+RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+
+
+def lock_resources(resource_ids):
+    """Hold a write lock covering resource_ids until the session's transaction ends.
+
+    SQLite has no row locks, so the transaction is started with
+    BEGIN IMMEDIATE, which takes the database's single write lock up front
+    instead of on the first INSERT. Other databases lock the resource rows
+    with SELECT ... FOR UPDATE, in id order to avoid deadlocks.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        if not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        return
+    (
+        db.session.query(Resource.resource_id)
+        .filter(Resource.resource_id.in_(sorted(set(resource_ids))))
+        .order_by(Resource.resource_id)
+        .with_for_update()
+        .all()
+    )
+
+
+def is_lock_error(error):
+    if getattr(error.orig, 'pgcode', None) in RETRYABLE_PGCODES:
+        return True
+    return 'database is locked' in str(error.orig) or 'database is busy' in str(error.orig)
+
+
+def with_lock_retry(func, *args, retries=5, delay=0.05, **kwargs):
+    """Call func, rolling back and retrying with backoff when it loses a lock race."""
+    for attempt in range(retries):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == retries - 1 or not is_lock_error(e):
+                raise
+            time.sleep(delay * (2 ** attempt) * (1 + random.random()))
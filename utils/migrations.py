@@ -0,0 +1,353 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+from models import (
+    db, ChangeLog, Event, EventArchive, EventResourceAllocation, EventResourceAllocationArchive, ResourceDailyUsage,
+    Job
+)
+from utils.rollup import rebuild_rollup
+
+
+class DuplicateAllocations(RuntimeError):
+    """Raised when the unique allocation index cannot be built."""
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        listed = ', '.join(f'event {event_id}/resource {resource_id} ({count} rows)'
+                           for event_id, resource_id, count in pairs[:10])
+        more = f' and {len(pairs) - 10} more' if len(pairs) > 10 else ''
+        super().__init__(
+            f'{len(pairs)} event/resource pairs are allocated more than once: {listed}{more}. '
+            'Remove the extra event_resource_allocation rows and run the upgrade again.'
+        )
+
+
+def _add_lookup_indexes(conn):
+    # A unique index cannot be built over duplicate pairs. Which copy to keep
+    # is the operator's call, so stop and list them instead of deleting any.
+    duplicates = conn.execute(text(
+        'SELECT event_id, resource_id, COUNT(*) FROM event_resource_allocation '
+        'GROUP BY event_id, resource_id HAVING COUNT(*) > 1 ORDER BY event_id, resource_id'
+    )).fetchall()
+    if duplicates:
+        raise DuplicateAllocations([tuple(row) for row in duplicates])
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_event_start_end ON event (start_time, end_time)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_event_user_id ON event (user_id)'))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_allocation_resource_event '
+        'ON event_resource_allocation (resource_id, event_id)'
+    ))
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_allocation_event_resource '
+        'ON event_resource_allocation (event_id, resource_id)'
+    ))
+
+
+def _add_daily_usage_rollup(conn):
+    ResourceDailyUsage.__table__.create(conn, checkfirst=True)
+    rebuild_rollup(conn, has_series=False)
+
+
+def _add_recurrence_columns(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('event')}
+    for name, ddl in (
+        ('recurrence_rule', 'VARCHAR(200)'),
+        ('recurrence_end', 'DATETIME'),
+        ('recurrence_exceptions', 'TEXT'),
+    ):
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE event ADD COLUMN {name} {ddl}'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_event_recurrence_end ON event (recurrence_end)'))
+
+
+# Tables whose changes can alter a report; see utils.jobs.data_version.
+VERSIONED_TABLES = ('event', 'resource', 'event_resource_allocation')
+
+
+def _add_job_queue(conn):
+    Job.__table__.create(conn, checkfirst=True)
+    conn.execute(text('CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'))
+    if not conn.execute(text('SELECT COUNT(*) FROM data_version')).scalar():
+        conn.execute(text('INSERT INTO data_version (id, version) VALUES (1, 0)'))
+    if conn.dialect.name != 'sqlite':
+        return
+    # Triggers see ORM and bulk Core writes alike.
+    for table in VERSIONED_TABLES:
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version '
+                f'AFTER {operation} ON {table} '
+                'BEGIN UPDATE data_version SET version = version + 1 WHERE id = 1; END'
+            ))
+
+
+def _add_calendar_indexes(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    # MAX() over this is a single index seek; see utils.calendar_view.
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_event_duration '
+        'ON event ((julianday(end_time) - julianday(start_time))) WHERE recurrence_rule IS NULL'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_event_series_start ON event (start_time) WHERE recurrence_rule IS NOT NULL'
+    ))
+
+
+def _add_event_search(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    try:
+        # External content: the index stores no copy of the text.
+        conn.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS event_search USING fts5('
+            "title, description, content='event', content_rowid='event_id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    except OperationalError:
+        # SQLite built without FTS5; utils.search falls back to LIKE.
+        return
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS trg_event_search_insert AFTER INSERT ON event BEGIN '
+        'INSERT INTO event_search (rowid, title, description) VALUES (new.event_id, new.title, new.description); '
+        'END'
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS trg_event_search_delete AFTER DELETE ON event BEGIN '
+        "INSERT INTO event_search (event_search, rowid, title, description) "
+        "VALUES ('delete', old.event_id, old.title, old.description); "
+        'END'
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS trg_event_search_update AFTER UPDATE OF title, description ON event BEGIN '
+        "INSERT INTO event_search (event_search, rowid, title, description) "
+        "VALUES ('delete', old.event_id, old.title, old.description); "
+        'INSERT INTO event_search (rowid, title, description) VALUES (new.event_id, new.title, new.description); '
+        'END'
+    ))
+    conn.execute(text("INSERT INTO event_search (event_search) VALUES ('rebuild')"))
+
+
+# Row of data_version bumped when users are deleted or change password.
+AUTH_VERSION_ID = 2
+
+
+def _add_auth_version(conn):
+    if not conn.execute(text('SELECT COUNT(*) FROM data_version WHERE id = :id'), {'id': AUTH_VERSION_ID}).scalar():
+        conn.execute(text('INSERT INTO data_version (id, version) VALUES (:id, 0)'), {'id': AUTH_VERSION_ID})
+    if conn.dialect.name != 'sqlite':
+        return
+    for name, event in (('delete', 'DELETE'), ('password', 'UPDATE OF password_hash')):
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS trg_user_{name}_auth_version AFTER {event} ON user '
+            f'BEGIN UPDATE data_version SET version = version + 1 WHERE id = {AUTH_VERSION_ID}; END'
+        ))
+
+
+# Tables in the change feed and their primary keys; see utils.changes.
+CHANGE_FEED_TABLES = {
+    'event': 'event_id',
+    'resource': 'resource_id',
+    'event_resource_allocation': 'allocation_id',
+}
+# Row of data_version holding the highest seq compaction has dropped.
+CHANGE_HORIZON_ID = 3
+
+
+def _add_change_feed(conn):
+    now = datetime.utcnow()
+    for table in CHANGE_FEED_TABLES:
+        columns = {column['name'] for column in inspect(conn).get_columns(table)}
+        if 'updated_at' not in columns:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN updated_at DATETIME'))
+        conn.execute(text(f'UPDATE {table} SET updated_at = :now WHERE updated_at IS NULL'), {'now': now})
+
+    ChangeLog.__table__.create(conn, checkfirst=True)
+    # Existing rows enter the log once, so a feed read from the start is a full copy.
+    if not conn.execute(text('SELECT COUNT(*) FROM change_log')).scalar():
+        for table, key in CHANGE_FEED_TABLES.items():
+            conn.execute(text(
+                'INSERT INTO change_log (table_name, row_id, op, changed_at) '
+                f"SELECT '{table}', {key}, 'upsert', :now FROM {table} ORDER BY {key}"
+            ), {'now': now})
+    if not conn.execute(text('SELECT COUNT(*) FROM data_version WHERE id = :id'), {'id': CHANGE_HORIZON_ID}).scalar():
+        conn.execute(text('INSERT INTO data_version (id, version) VALUES (:id, 0)'), {'id': CHANGE_HORIZON_ID})
+
+    if conn.dialect.name != 'sqlite':
+        return
+    for table, key in CHANGE_FEED_TABLES.items():
+        for operation, row, op in (('INSERT', 'new', 'upsert'), ('UPDATE', 'new', 'upsert'), ('DELETE', 'old', 'delete')):
+            conn.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_change_log '
+                f'AFTER {operation} ON {table} BEGIN '
+                'INSERT INTO change_log (table_name, row_id, op, changed_at) '
+                f"VALUES ('{table}', {row}.{key}, '{op}', strftime('%Y-%m-%d %H:%M:%f', 'now')); "
+                'END'
+            ))
+
+
+# Row of data_version holding the archive cutoff, in seconds since the epoch.
+ARCHIVE_CUTOFF_ID = 4
+
+
+def _add_event_archive(conn):
+    EventArchive.__table__.create(conn, checkfirst=True)
+    EventResourceAllocationArchive.__table__.create(conn, checkfirst=True)
+    if not conn.execute(text('SELECT COUNT(*) FROM data_version WHERE id = :id'), {'id': ARCHIVE_CUTOFF_ID}).scalar():
+        conn.execute(text('INSERT INTO data_version (id, version) VALUES (:id, 0)'), {'id': ARCHIVE_CUTOFF_ID})
+    if conn.dialect.name != 'sqlite':
+        return
+    # Same as ix_event_duration, for longest_single_event() over the archive.
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_event_archive_duration '
+        'ON event_archive ((julianday(end_time) - julianday(start_time))) WHERE recurrence_rule IS NULL'
+    ))
+
+
+# Bumps a resource's stamp past every other one; see ResourceIntervalIndex.sync.
+_STAMP_RESOURCE = (
+    'INSERT OR REPLACE INTO resource_version (resource_id, version) '
+    'SELECT resource_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM resource_version) FROM ({})'
+)
+
+
+def _add_resource_versions(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS resource_version (resource_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_resource_version_version ON resource_version (version)'))
+    allocated = 'SELECT resource_id FROM event_resource_allocation WHERE event_id = {}.event_id'
+    for name, trigger, resources in (
+        ('allocation_insert', 'AFTER INSERT ON event_resource_allocation', ['SELECT new.resource_id AS resource_id']),
+        ('allocation_delete', 'AFTER DELETE ON event_resource_allocation', ['SELECT old.resource_id AS resource_id']),
+        ('allocation_update', 'AFTER UPDATE OF event_id, resource_id ON event_resource_allocation',
+         ['SELECT old.resource_id AS resource_id', 'SELECT new.resource_id AS resource_id']),
+        ('event_update', 'AFTER UPDATE OF start_time, end_time, recurrence_rule, recurrence_exceptions ON event',
+         [allocated.format('new')]),
+        ('event_delete', 'AFTER DELETE ON event', [allocated.format('old')]),
+    ):
+        statements = ' '.join(_STAMP_RESOURCE.format(select) + ';' for select in resources)
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS trg_{name}_resource_version {trigger} BEGIN {statements} END'))
+
+
+def _autoincrement_ids(conn):
+    # Without AUTOINCREMENT SQLite hands out max(id) + 1, which is an
+    # archived id again once the newest rows are archived or deleted.
+    if conn.dialect.name != 'sqlite':
+        return
+    # Keep references to the rebuilt tables in other tables' triggers as written.
+    conn.exec_driver_sql('PRAGMA legacy_alter_table = ON')
+    try:
+        for model, archive_model in ((Event, EventArchive), (EventResourceAllocation, EventResourceAllocationArchive)):
+            table = model.__tablename__
+            key = model.__mapper__.primary_key[0].key
+            schema_sql = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}).scalar()
+            if 'AUTOINCREMENT' not in schema_sql.upper():
+                # The documented rebuild: copy into a new table, swap it in, restore indexes and triggers.
+                dependents = conn.execute(text(
+                    "SELECT sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') "
+                    "AND sql IS NOT NULL ORDER BY type, name"
+                ), {'name': table}).scalars().all()
+                create = str(CreateTable(model.__table__).compile(dialect=conn.dialect))
+                conn.exec_driver_sql(create.replace(f'CREATE TABLE {table} ', f'CREATE TABLE {table}_rebuild ', 1))
+                columns = ', '.join(column.key for column in model.__table__.c)
+                conn.exec_driver_sql(f'INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}')
+                conn.exec_driver_sql(f'DROP TABLE {table}')
+                conn.exec_driver_sql(f'ALTER TABLE {table}_rebuild RENAME TO {table}')
+                for sql in dependents:
+                    conn.exec_driver_sql(sql)
+            # Start past every id in use, archived ones included.
+            conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table})
+            conn.execute(text(
+                f'INSERT INTO sqlite_sequence (name, seq) SELECT :name, MAX(COALESCE((SELECT MAX({key}) FROM {table}), 0), '
+                f'COALESCE((SELECT MAX({key}) FROM {archive_model.__tablename__}), 0))'
+            ), {'name': table})
+    finally:
+        conn.exec_driver_sql('PRAGMA legacy_alter_table = OFF')
+
+
+# (version, name, upgrade function). Append only, never renumber.
+MIGRATIONS = [
+    (1, 'time-range and allocation lookup indexes', _add_lookup_indexes),
+    (2, 'per-resource daily utilization rollup', _add_daily_usage_rollup),
+    (3, 'recurring event series', _add_recurrence_columns),
+    (4, 'background jobs and data version', _add_job_queue),
+    (5, 'calendar window indexes', _add_calendar_indexes),
+    (6, 'full-text event search', _add_event_search),
+    (7, 'token cache invalidation', _add_auth_version),
+    (8, 'change feed', _add_change_feed),
+    (9, 'event archive', _add_event_archive),
+    (10, 'per-resource booking versions', _add_resource_versions),
+    (11, 'never reuse event and allocation ids', _autoincrement_ids),
+]
+
+
+# Queries whose plans are printed before and after an upgrade.
+QUERY_PLANS = {
+    'allocation conflict': (
+        'SELECT event.event_id FROM event '
+        'JOIN event_resource_allocation ON event_resource_allocation.event_id = event.event_id '
+        'WHERE event_resource_allocation.resource_id = :resource_id '
+        'AND event.start_time < :end_time AND event.end_time > :start_time LIMIT 1',
+        {'resource_id': 1, 'start_time': '2024-01-01 09:00:00', 'end_time': '2024-01-01 10:00:00'}
+    ),
+    'events in date range': (
+        'SELECT event_id FROM event WHERE start_time >= :start AND start_time <= :end ORDER BY start_time',
+        {'start': '2024-01-01 00:00:00', 'end': '2024-02-01 00:00:00'}
+    ),
+    'events by owner': (
+        'SELECT event_id FROM event WHERE user_id = :user_id',
+        {'user_id': 1}
+    ),
+    'allocations of event': (
+        'SELECT allocation_id FROM event_resource_allocation WHERE event_id = :event_id',
+        {'event_id': 1}
+    ),
+}
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at DATETIME NOT NULL)'
+    ))
+
+
+def current_version():
+    with db.engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')).scalar()
+
+
+def pending_migrations():
+    version = current_version()
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def upgrade(target=None):
+    """Apply pending migrations in order, each in its own transaction."""
+    applied = []
+    for version, name, migrate in pending_migrations():
+        if target is not None and version > target:
+            break
+        with db.engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+                {'v': version, 'n': name, 't': datetime.utcnow()}
+            )
+        applied.append((version, name))
+    return applied
+
+
+def query_plans():
+    plans = {}
+    with db.engine.connect() as conn:
+        for label, (sql, params) in QUERY_PLANS.items():
+            rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+            plans[label] = [row[-1] for row in rows]
+    return plans
@@ -0,0 +1,67 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row on a page into an opaque token."""
+    packed = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(packed).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, length=2):
+    """The values encode_cursor packed; ValueError unless they are length plain values."""
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        packed = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(packed, list) or len(packed) != length:
+        raise ValueError('Invalid cursor')
+    values = []
+    for value in packed:
+        if isinstance(value, dict):
+            if set(value) != {'dt'} or not isinstance(value['dt'], str):
+                raise ValueError('Invalid cursor')
+            value = datetime.fromisoformat(value['dt'])
+            if value.tzinfo is not None:
+                # Stored times are naive UTC; an offset would not compare with them.
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        elif not isinstance(value, (str, int, float)):
+            raise ValueError('Invalid cursor')
+        values.append(value)
+    return values
+
+
+def keyset_filter(sort_column, id_column, sort_value, last_id, descending=False):
+    """Rows strictly after (sort_value, last_id) in (sort_column, id_column) order."""
+    if descending:
+        return or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < last_id))
+    return or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > last_id))
+
+
+class CountCache:
+    """Short-lived cache of COUNT(*) results keyed on the query's filters."""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def get_or_count(self, key, count):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        value = count()
+        with self._lock:
+            if len(self._counts) >= self.max_entries:
+                self._counts.clear()
+            self._counts[key] = (value, now + self.ttl)
+        return value
@@ -0,0 +1,325 @@
+import calendar
+from datetime import datetime, timedelta
+from math import gcd
+
+from sqlalchemy import and_, or_
+from models import db, Event
+from utils.archive import event_sources
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+RULE_PARTS = ('FREQ', 'INTERVAL', 'COUNT', 'UNTIL')
+
+# Bounds on what a rule may ask for, so expanding one stays cheap.
+MAX_COUNT = 10000
+MAX_UNTIL = datetime(9999, 1, 1)
+# Months _add_months can reach from year 1 before leaving the calendar.
+MAX_MONTHS = 12 * 10000
+
+# Longest window event_occurrences will expand in one call.
+MAX_OCCURRENCE_WINDOW = timedelta(days=366)
+
+# The Gregorian calendar repeats every 400 years, so two open-ended series
+# that do not collide within that span never will.
+GREGORIAN_CYCLE = timedelta(days=146097)
+
+
+def parse_rule(rule):
+    """Parse an RRULE subset: FREQ=DAILY|WEEKLY|MONTHLY;INTERVAL=n;COUNT=n|UNTIL=dt.
+
+    Any other part (BYDAY, BYMONTHDAY, ...) is rejected rather than
+    dropped, since ignoring it would expand to different occurrences.
+    """
+    parts = {}
+    for part in rule.strip().upper().removeprefix('RRULE:').split(';'):
+        if part:
+            key, _, value = part.partition('=')
+            key = key.strip()
+            if key not in RULE_PARTS:
+                raise ValueError(f'Unsupported rule part {key}; only {", ".join(RULE_PARTS)} are supported')
+            parts[key] = value.strip()
+
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError(f'FREQ must be one of {", ".join(FREQUENCIES)}')
+    interval = int(parts.get('INTERVAL', 1))
+    if interval < 1:
+        raise ValueError('INTERVAL must be positive')
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    if count is not None and not 1 <= count <= MAX_COUNT:
+        raise ValueError(f'COUNT must be between 1 and {MAX_COUNT}')
+    until = _parse_until(parts['UNTIL']) if 'UNTIL' in parts else None
+    if until is not None and until >= MAX_UNTIL:
+        raise ValueError(f'UNTIL must be before {MAX_UNTIL.year}')
+    if count is not None and until is not None:
+        raise ValueError('COUNT and UNTIL cannot both be set')
+    return freq, interval, count, until
+
+
+def _parse_until(value):
+    value = value.rstrip('Z')
+    for fmt in ('%Y%m%dT%H%M%S', '%Y%m%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value)
+
+
+def format_rule(freq, interval=1, count=None, until=None):
+    parts = [f'FREQ={freq}']
+    if interval != 1:
+        parts.append(f'INTERVAL={interval}')
+    if count:
+        parts.append(f'COUNT={count}')
+    if until:
+        parts.append(f'UNTIL={until.strftime("%Y%m%dT%H%M%S")}')
+    return ';'.join(parts)
+
+
+def parse_exceptions(value):
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.split(',')
+    return frozenset(v if isinstance(v, datetime) else datetime.fromisoformat(v.strip()) for v in value if v)
+
+
+def format_exceptions(exceptions):
+    return ','.join(sorted(e.isoformat() for e in exceptions)) or None
+
+
+def _add_months(moment, months):
+    index = moment.month - 1 + months
+    year, month = moment.year + index // 12, index % 12 + 1
+    if year > 9999 or moment.day > calendar.monthrange(year, month)[1]:
+        return None
+    return moment.replace(year=year, month=month)
+
+
+class Recurrence:
+    """Occurrences of one event or series, generated lazily within a window.
+
+    A plain event is a recurrence with a single occurrence, so callers can
+    treat every booking the same way.
+    """
+
+    __slots__ = ('start', 'duration', 'freq', 'interval', 'count', 'until', 'exceptions', '_last_index')
+
+    def __init__(self, start_time, end_time, rule=None, exceptions=()):
+        self.start = start_time
+        self.duration = end_time - start_time
+        self.exceptions = parse_exceptions(exceptions)
+        if rule:
+            self.freq, self.interval, self.count, self.until = parse_rule(rule)
+        else:
+            self.freq, self.interval, self.count, self.until = None, 1, 1, None
+        self._last_index = self._compute_last_index()
+
+    @classmethod
+    def for_event(cls, event):
+        return cls(event.start_time, event.end_time, event.recurrence_rule, event.recurrence_exceptions)
+
+    @property
+    def period(self):
+        """Fixed spacing between occurrences, or None for single and monthly."""
+        if self.freq == 'DAILY':
+            return timedelta(days=self.interval)
+        if self.freq == 'WEEKLY':
+            return timedelta(weeks=self.interval)
+        return None
+
+    @property
+    def spacing(self):
+        # Rough spacing, only used to pick the sparser side of a comparison.
+        if self.freq is None:
+            return timedelta.max
+        return self.period or timedelta(days=30 * self.interval)
+
+    def _nth_start(self, k):
+        try:
+            if self.freq == 'MONTHLY':
+                return _add_months(self.start, k * self.interval)
+            return self.start + k * (self.period or timedelta(0))
+        except OverflowError:
+            return None
+
+    def _compute_last_index(self):
+        if self.freq is None:
+            return 0
+        if self.count is not None:
+            if self.freq != 'MONTHLY' or self.start.day <= 28:
+                return self.count - 1
+            # Months without this day are skipped, so count the real ones.
+            k = seen = 0
+            while k * self.interval < MAX_MONTHS:
+                if self._nth_start(k) is not None:
+                    seen += 1
+                    if seen == self.count:
+                        return k
+                k += 1
+            raise ValueError('The series would run past the year 9999')
+        if self.until is not None:
+            if self.until < self.start:
+                return 0
+            if self.period:
+                return (self.until - self.start) // self.period
+            months = (self.until.year - self.start.year) * 12 + self.until.month - self.start.month
+            return months // self.interval
+        return None
+
+    def _first_index(self, window_start):
+        if window_start is None or window_start <= self.start:
+            return 0
+        if self.period:
+            return max(0, (window_start - self.duration - self.start) // self.period + 1)
+        months = (window_start.year - self.start.year) * 12 + window_start.month - self.start.month
+        months_back = self.duration.days // 28 + 2
+        return max(0, (months - months_back) // self.interval)
+
+    def series_end(self):
+        """End of the last occurrence, or None if the series never ends.
+
+        Raises ValueError when that end is past the last representable
+        moment. Only a monthly series ending at UNTIL steps back, over
+        months missing the start day or past UNTIL; a leap day recurs
+        within 400 steps.
+        """
+        if self._last_index is None:
+            return None
+        for k in range(self._last_index, max(self._last_index - 400, 0) - 1, -1):
+            start = self._nth_start(k)
+            if start is None and self.until is None:
+                # Every index up to a COUNT exists unless it is past the calendar.
+                break
+            if start is not None and (k == 0 or self.until is None or start <= self.until):
+                try:
+                    return start + self.duration
+                except OverflowError:
+                    break
+        raise ValueError('The series would run past the year 9999')
+
+    def occurrences(self, window_start=None, window_end=None):
+        """Yield (start, end) of each occurrence overlapping [window_start, window_end)."""
+        k = self._first_index(window_start)
+        while self._last_index is None or k <= self._last_index:
+            start = self._nth_start(k)
+            k += 1
+            if start is None:
+                if self.freq == 'MONTHLY' and k * self.interval < MAX_MONTHS:
+                    continue
+                return
+            if window_end is not None and start >= window_end:
+                return
+            if self.until is not None and start > self.until:
+                return
+            try:
+                end = start + self.duration
+            except OverflowError:
+                return
+            if (window_start is None or end > window_start) and start not in self.exceptions:
+                yield start, end
+
+    def first_overlap(self, start_time, end_time):
+        return next(self.occurrences(start_time, end_time), None)
+
+    def conflicts_with(self, other):
+        """True if any occurrence of self overlaps any occurrence of other.
+
+        Only the sparser side is walked, and only across the span both
+        series share; two fixed-period series are first ruled out in O(1)
+        when their start offsets can never line up.
+        """
+        lo = max(self.start, other.start)
+        ends = [end for end in (self.series_end(), other.series_end()) if end is not None]
+        hi = min(ends) if ends else None
+        if hi is not None and hi <= lo:
+            return False
+
+        repeats = len(self.exceptions) + len(other.exceptions) + 1
+        if self.period and other.period:
+            a, b = _micros(self.period), _micros(other.period)
+            step = gcd(a, b)
+            offset = _micros(other.start - self.start) % step
+            if offset >= _micros(self.duration) and step - offset >= _micros(other.duration):
+                return False
+        try:
+            if self.period and other.period:
+                # Each lcm-long cycle has a collision; exceptions can hide one per cycle.
+                cap = lo + timedelta(microseconds=a // step * b) * repeats + self.duration + other.duration
+            else:
+                cap = lo + GREGORIAN_CYCLE * repeats
+        except OverflowError:
+            # Beyond the last representable moment, so it cuts nothing off.
+            cap = datetime.max
+        hi = cap if hi is None else min(hi, cap)
+
+        sparse, dense = (self, other) if self.spacing >= other.spacing else (other, self)
+        for start, end in sparse.occurrences(lo - sparse.duration, hi):
+            if dense.first_overlap(start, end):
+                return True
+        return False
+
+
+def _micros(delta):
+    return delta // timedelta(microseconds=1)
+
+
+def apply_recurrence(event, rule=None, exceptions=None):
+    """Validate and store a recurrence on event, keeping recurrence_end in sync."""
+    if rule is not None:
+        event.recurrence_rule = format_rule(*parse_rule(rule)) if rule else None
+    if exceptions is not None:
+        event.recurrence_exceptions = format_exceptions(parse_exceptions(exceptions))
+    if event.recurrence_rule:
+        event.recurrence_end = Recurrence.for_event(event).series_end()
+    else:
+        event.recurrence_end = None
+        event.recurrence_exceptions = None
+
+
+def overlaps_window(window_start, window_end, longest=None, events=Event):
+    """Filter for events with an occurrence that may fall in the window.
+
+    Single events are matched exactly; series are matched on their whole
+    span and have to be expanded to be sure. Either bound may be None.
+    longest, an upper bound on single event duration, turns the single
+    event match into a bounded range on the start_time index. events is
+    the entity filtered, Event or the archive union of event_sources().
+    """
+    single = [events.recurrence_rule.is_(None)]
+    series = [events.recurrence_rule.isnot(None)]
+    if window_end is not None:
+        single.append(events.start_time < window_end)
+        series.append(events.start_time < window_end)
+    if window_start is not None:
+        single.append(events.end_time > window_start)
+        if longest is not None:
+            single.append(events.start_time >= window_start - longest)
+        series.append(or_(events.recurrence_end.is_(None), events.recurrence_end > window_start))
+    return or_(and_(*single), and_(*series))
+
+
+def event_occurrences(window_start, window_end, query=None, longest=None, events=Event):
+    """(start, end, event) for every occurrence inside the window, by start.
+
+    Series are expanded only across the window; pass query to narrow the
+    events considered (e.g. to one owner), with events the entity it
+    selects, and longest as in overlaps_window. Without a query, archived
+    events are included when the window reaches back before the cutoff.
+    """
+    if window_end - window_start > MAX_OCCURRENCE_WINDOW:
+        raise ValueError(f'Window is longer than {MAX_OCCURRENCE_WINDOW.days} days')
+    if query is None:
+        events, _ = event_sources(window_start)
+        query = db.session.query(events)
+    query = query.filter(overlaps_window(window_start, window_end, longest, events))
+    occurrences = []
+    for event in query:
+        if event.recurrence_rule:
+            occurrences.extend(
+                (start, end, event) for start, end in Recurrence.for_event(event).occurrences(window_start, window_end)
+            )
+        else:
+            occurrences.append((event.start_time, event.end_time, event))
+    occurrences.sort(key=lambda o: (o[0], o[2].event_id))
+    return occurrences
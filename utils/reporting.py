@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, func, literal
+from models import db, Event, Resource, EventResourceAllocation, ResourceDailyUsage
+from utils.archive import event_sources
+from utils.recurrence import Recurrence
+from utils.exporting import csv_chunks, ndjson_chunks
+
+
+def date_range_bounds(start_date, end_date):
+    """Turn an inclusive (start_date, end_date) pair into [start, end) datetimes."""
+    range_start = datetime.combine(start_date, time.min) if start_date else None
+    range_end = datetime.combine(end_date + timedelta(days=1), time.min) if end_date else None
+    return range_start, range_end
+
+
+def _seconds_between(start, end):
+    if db.engine.dialect.name == 'sqlite':
+        return (func.julianday(end) - func.julianday(start)) * 86400
+    return func.extract('epoch', end - start)
+
+
+def _utilization_query(range_start, range_end, now):
+    events, allocations = event_sources(range_start)
+    clipped_start = events.start_time
+    clipped_end = events.end_time
+    # Series are expanded separately by _series_usage.
+    single = events.recurrence_rule.is_(None)
+    overlaps = [single, events.end_time > events.start_time]
+    starts_in_range = [single, events.event_id.isnot(None)]
+
+    if range_start is not None:
+        bound = literal(range_start, db.DateTime)
+        clipped_start = case((events.start_time < bound, bound), else_=events.start_time)
+        overlaps.append(events.end_time > bound)
+        starts_in_range.append(events.start_time >= bound)
+    if range_end is not None:
+        bound = literal(range_end, db.DateTime)
+        clipped_end = case((events.end_time > bound, bound), else_=events.end_time)
+        overlaps.append(events.start_time < bound)
+        starts_in_range.append(events.start_time < bound)
+
+    seconds = case((and_(*overlaps), _seconds_between(clipped_start, clipped_end)), else_=0)
+    bookings = case((and_(*starts_in_range), 1), else_=0)
+    upcoming = case((and_(single, events.start_time > now), 1), else_=0)
+
+    return (
+        db.session.query(
+            Resource.resource_id,
+            Resource.resource_name,
+            Resource.resource_type,
+            func.coalesce(func.sum(seconds), 0),
+            func.coalesce(func.sum(bookings), 0),
+            func.coalesce(func.sum(upcoming), 0)
+        )
+        .outerjoin(allocations, allocations.resource_id == Resource.resource_id)
+        .outerjoin(events, events.event_id == allocations.event_id)
+        .group_by(Resource.resource_id, Resource.resource_name, Resource.resource_type)
+        .order_by(Resource.resource_id)
+    )
+
+
+def _rollup_query(start_date, end_date, now):
+    usage = db.session.query(
+        ResourceDailyUsage.resource_id,
+        func.sum(ResourceDailyUsage.booked_seconds).label('seconds'),
+        func.sum(ResourceDailyUsage.bookings).label('bookings')
+    )
+    if start_date:
+        usage = usage.filter(ResourceDailyUsage.day >= start_date)
+    if end_date:
+        usage = usage.filter(ResourceDailyUsage.day <= end_date)
+    usage = usage.group_by(ResourceDailyUsage.resource_id).subquery()
+
+    upcoming = (
+        db.session.query(EventResourceAllocation.resource_id, func.count().label('upcoming'))
+        .join(Event, Event.event_id == EventResourceAllocation.event_id)
+        .filter(Event.start_time > now, Event.recurrence_rule.is_(None))
+        .group_by(EventResourceAllocation.resource_id)
+        .subquery()
+    )
+
+    return (
+        db.session.query(
+            Resource.resource_id,
+            Resource.resource_name,
+            Resource.resource_type,
+            func.coalesce(usage.c.seconds, 0),
+            func.coalesce(usage.c.bookings, 0),
+            func.coalesce(upcoming.c.upcoming, 0)
+        )
+        .outerjoin(usage, usage.c.resource_id == Resource.resource_id)
+        .outerjoin(upcoming, upcoming.c.resource_id == Resource.resource_id)
+        .order_by(Resource.resource_id)
+    )
+
+
+def _series_usage(range_start, range_end, now):
+    """{resource_id: [seconds, bookings, upcoming]} from allocated recurring series.
+
+    Only occurrences inside the range are generated. Each occurrence
+    starting in the range is a booking, and a series with an occurrence
+    still to come counts once as upcoming. Without an end bound, open-ended
+    series stop at now.
+    """
+    usage = defaultdict(lambda: [0, 0, 0])
+    events, allocations = event_sources(range_start)
+    rows = (
+        db.session.query(
+            allocations.resource_id, events.start_time, events.end_time,
+            events.recurrence_rule, events.recurrence_exceptions
+        )
+        .join(events, events.event_id == allocations.event_id)
+        .filter(events.recurrence_rule.isnot(None))
+    )
+    for resource_id, start_time, end_time, rule, exceptions in rows:
+        recurrence = Recurrence(start_time, end_time, rule, exceptions)
+        window_end = range_end or recurrence.series_end() or now
+        totals = usage[resource_id]
+        for start, end in recurrence.occurrences(range_start, window_end):
+            clipped_start = max(start, range_start) if range_start else start
+            totals[0] += (min(end, window_end) - clipped_start).total_seconds()
+            if range_start is None or start >= range_start:
+                totals[1] += 1
+        if any(start > now for start, _ in recurrence.occurrences(now)):
+            totals[2] += 1
+    return usage
+
+
+def _report_row(row, range_hours):
+    resource_id, name, resource_type, seconds, bookings, upcoming = row
+    hours = round(float(seconds) / 3600, 2)
+    return {
+        'resource_id': resource_id,
+        'name': name,
+        'type': resource_type,
+        'hours': hours,
+        'bookings': int(bookings),
+        'upcoming': int(upcoming),
+        'percent': round(hours / range_hours * 100, 2) if range_hours else None
+    }
+
+
+def report_chunks(rows, export_format='csv'):
+    """(chunks, mimetype, extension) to write report rows as CSV or NDJSON."""
+    if export_format == 'ndjson':
+        return ndjson_chunks(rows), 'application/x-ndjson', 'ndjson'
+    chunks = csv_chunks(
+        ['Resource', 'Type', 'Total Hours Used', 'Percent of Range', 'Bookings', 'Upcoming'],
+        ([r['name'], r['type'], r['hours'], r['percent'], r['bookings'], r['upcoming']] for r in rows)
+    )
+    return chunks, 'text/csv', 'csv'
+
+
+def _range_hours(start_date, end_date):
+    if start_date and end_date:
+        return max(((end_date - start_date).days + 1) * 24, 1)
+    return None
+
+
+def iter_resource_utilization(start_date=None, end_date=None, batch_size=500, use_rollup=None):
+    """Yield report rows as they are fetched, batch_size rows at a time.
+
+    Reads the daily rollup table unless UTILIZATION_ROLLUP_ENABLED is off
+    or use_rollup=False asks for the raw event/allocation aggregation.
+    """
+    if use_rollup is None:
+        use_rollup = current_app.config.get('UTILIZATION_ROLLUP_ENABLED', True)
+    range_hours = _range_hours(start_date, end_date)
+
+    now = datetime.now()
+    range_start, range_end = date_range_bounds(start_date, end_date)
+    if use_rollup:
+        query = _rollup_query(start_date, end_date, now)
+    else:
+        query = _utilization_query(range_start, range_end, now)
+    series = _series_usage(range_start, range_end, now)
+
+    query = query.yield_per(batch_size)
+    for row in query:
+        if row[0] in series:
+            seconds, bookings, upcoming = series[row[0]]
+            row = (*row[:3], float(row[3]) + seconds, row[4] + bookings, row[5] + upcoming)
+        yield _report_row(row, range_hours)
+
+
+def resource_utilization(start_date=None, end_date=None, use_rollup=None):
+    """Per-resource utilization for an inclusive date range in one query.
+
+    Hours are clipped to the range, bookings count allocations whose event
+    starts inside the range and upcoming counts allocations starting after
+    now. Either bound may be None for an open-ended range.
+    """
+    report = list(iter_resource_utilization(start_date, end_date, use_rollup=use_rollup))
+
+    totals = {'hours': 0.0, 'bookings': 0, 'upcoming': 0}
+    for row in report:
+        totals['hours'] += row['hours']
+        totals['bookings'] += row['bookings']
+        totals['upcoming'] += row['upcoming']
+    totals['hours'] = round(totals['hours'], 2)
+
+    return report, totals
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import delete, inspect, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import (
+    db, Event, EventArchive, EventResourceAllocation, EventResourceAllocationArchive, ResourceDailyUsage
+)
+
+
+def day_slices(start_time, end_time):
+    """Split [start_time, end_time) into (day, whole seconds) pieces."""
+    day = start_time.date()
+    while True:
+        day_start = datetime.combine(day, time.min)
+        next_day = day_start + timedelta(days=1)
+        seconds = int((min(end_time, next_day) - max(start_time, day_start)).total_seconds())
+        if seconds > 0:
+            yield day, seconds
+        if end_time <= next_day:
+            break
+        day += timedelta(days=1)
+
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE.
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def record_booking(resource_id, start_time, end_time, sign=1):
+    """Add (sign=1) or subtract (sign=-1) one booking in the current session."""
+    record_bookings([(resource_id, start_time, end_time)], sign)
+
+
+def record_bookings(bookings, sign=1):
+    """Apply many (resource_id, start_time, end_time) bookings, one row update per resource-day.
+
+    Each row is changed by adding to it in the database (an upsert), not
+    read and written back, so writers that hold no resource lock (removals,
+    edits, deletes) cannot lose each other's updates.
+    """
+    seconds = defaultdict(int)
+    counts = defaultdict(int)
+    for resource_id, start_time, end_time in bookings:
+        counts[(resource_id, start_time.date())] += sign
+        for day, day_seconds in day_slices(start_time, end_time):
+            seconds[(resource_id, day)] += sign * day_seconds
+    rows = [
+        {'resource_id': resource_id, 'day': day,
+         'booked_seconds': seconds[(resource_id, day)], 'bookings': counts[(resource_id, day)]}
+        for resource_id, day in sorted(set(seconds) | set(counts))
+    ]
+    if rows:
+        _add_usage(rows)
+
+
+def _add_usage(rows):
+    upsert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    if upsert is None:
+        # No upsert: read-modify-write, safe only under the resource lock.
+        for row in rows:
+            usage = db.session.get(ResourceDailyUsage, (row['resource_id'], row['day']))
+            if usage is None:
+                db.session.add(ResourceDailyUsage(**row))
+            else:
+                usage.booked_seconds += row['booked_seconds']
+                usage.bookings += row['bookings']
+        return
+    statement = upsert(ResourceDailyUsage)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['resource_id', 'day'],
+        set_={
+            'booked_seconds': ResourceDailyUsage.booked_seconds + statement.excluded.booked_seconds,
+            'bookings': ResourceDailyUsage.bookings + statement.excluded.bookings,
+        },
+    ), rows)
+
+
+# Recurring series are left out of the rollup; reports expand them per range.
+
+def record_allocation(resource_id, event, sign=1):
+    if not event.recurrence_rule:
+        record_booking(resource_id, event.start_time, event.end_time, sign)
+
+
+def record_event_move(event, old_start, old_end, resource_ids, was_recurring=False):
+    recurring = bool(event.recurrence_rule)
+    if recurring == was_recurring and (recurring or (old_start, old_end) == (event.start_time, event.end_time)):
+        return
+    for resource_id in resource_ids:
+        if not was_recurring:
+            record_booking(resource_id, old_start, old_end, -1)
+        if not recurring:
+            record_booking(resource_id, event.start_time, event.end_time, 1)
+
+
+def forget_resource(resource_id):
+    ResourceDailyUsage.query.filter_by(resource_id=resource_id).delete()
+
+
+def rebuild_rollup(conn, has_series=True):
+    """Recompute every rollup row from the allocations, on an open connection.
+
+    Archived allocations count too. has_series=False is for schemas that
+    predate recurring events.
+    """
+    seconds = defaultdict(int)
+    bookings = defaultdict(int)
+    sources = [(Event, EventResourceAllocation)]
+    if inspect(conn).has_table(EventArchive.__tablename__):
+        sources.append((EventArchive, EventResourceAllocationArchive))
+    queries = []
+    for events, allocations in sources:
+        query = (
+            select(allocations.resource_id, events.start_time, events.end_time)
+            .join(events, events.event_id == allocations.event_id)
+        )
+        if has_series:
+            query = query.where(events.recurrence_rule.is_(None))
+        queries.append(query)
+    query = queries[0].union_all(*queries[1:]) if len(queries) > 1 else queries[0]
+    rows = conn.execute(query.execution_options(yield_per=1000))
+    for resource_id, start_time, end_time in rows:
+        bookings[(resource_id, start_time.date())] += 1
+        for day, day_seconds in day_slices(start_time, end_time):
+            seconds[(resource_id, day)] += day_seconds
+
+    conn.execute(delete(ResourceDailyUsage))
+    keys = set(seconds) | set(bookings)
+    if keys:
+        conn.execute(insert(ResourceDailyUsage), [
+            {'resource_id': resource_id, 'day': day,
+             'booked_seconds': seconds[(resource_id, day)], 'bookings': bookings[(resource_id, day)]}
+            for resource_id, day in sorted(keys)
+        ])
+    return len(keys)
@@ -0,0 +1,95 @@
+import re
+
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import and_, column, func, literal_column, or_, table, text
+from models import db, Event
+from utils.calendar_view import longest_single_event
+from utils.recurrence import overlaps_window
+
+SEARCH_TABLE = 'event_search'
+# bm25 weight of each indexed column, in index order.
+COLUMN_WEIGHTS = (10.0, 1.0)
+_WORD = re.compile(r'\w+')
+# Control characters cannot occur in tokens, so they mark highlights safely.
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+event_search = table(SEARCH_TABLE, column('rowid'), column('title'), column('description'))
+
+
+def search_terms(q):
+    """The words of a free-text query; punctuation and FTS syntax are dropped."""
+    return _WORD.findall(q or '')
+
+
+def match_expression(terms):
+    """FTS5 MATCH string: every term has to match, each as a prefix."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def fts_available():
+    extensions = current_app.extensions
+    if 'event_search' not in extensions:
+        extensions['event_search'] = db.engine.dialect.name == 'sqlite' and bool(db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': SEARCH_TABLE}
+        ).scalar())
+    return extensions['event_search']
+
+
+def search_filter(q, events=Event):
+    """Filter on events (Event or the archive union) for rows matching q.
+
+    The full-text index covers live events only, so the archive union is
+    matched by substring.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return None
+    if events is Event and fts_available():
+        matches = db.session.query(event_search.c.rowid).filter(
+            literal_column(SEARCH_TABLE).op('MATCH')(match_expression(terms)))
+        return Event.event_id.in_(matches.scalar_subquery())
+    return and_(*(
+        or_(events.title.ilike(f'%{term}%'), events.description.ilike(f'%{term}%')) for term in terms
+    ))
+
+
+def _highlight(snippet):
+    return str(escape(snippet)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search_events(q, window_start=None, window_end=None, limit=20, offset=0):
+    """[(event, snippet_html)] for events matching q, best match first.
+
+    Matches on title weigh more than on description. Each word may be a
+    prefix ("proj rev" finds "project review"). Either window bound limits
+    results to events with an occurrence in the window. Without FTS5 this
+    falls back to substring matching ordered by start time.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    window = None
+    if window_start is not None or window_end is not None:
+        longest = longest_single_event() if window_start is not None else None
+        window = overlaps_window(window_start, window_end, longest)
+
+    if not fts_available():
+        query = Event.query.filter(search_filter(q))
+        if window is not None:
+            query = query.filter(window)
+        events = query.order_by(Event.start_time).offset(offset).limit(limit).all()
+        return [(event, str(escape((event.description or event.title)[:120]))) for event in events]
+
+    search = literal_column(SEARCH_TABLE)
+    rank = func.bm25(search, *COLUMN_WEIGHTS)
+    snippet = func.snippet(search, -1, _MARK_START, _MARK_END, '…', 12)
+    query = (
+        db.session.query(Event, snippet)
+        .join(event_search, event_search.c.rowid == Event.event_id)
+        .filter(search.op('MATCH')(match_expression(terms)))
+    )
+    if window is not None:
+        query = query.filter(window)
+    rows = query.order_by(rank, Event.start_time).offset(offset).limit(limit).all()
+    return [(event, _highlight(fragment)) for event, fragment in rows]
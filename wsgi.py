@@ -0,0 +1,10 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Run `python migrate.py` before starting; workers never change the schema.
+"""
+from app import create_app, preload
+
+app = create_app()
+preload(app)